@@ -2,6 +2,8 @@
 # -*- coding: utf-8 -*-
 from src.asset_selector import AssetSelector, AssetValidationException
 from broker.broker import Broker
+from broker.async_broker import AsyncBroker
+from broker.bars import widen
 from argparse import Namespace
 from broker import BrokerException
 from util import time_from_datetime
@@ -10,6 +12,7 @@ from datetime import datetime, timedelta
 from pytz import timezone
 import pandas as pd
 import statistics
+import asyncio
 import time
 
 
@@ -31,10 +34,10 @@ class Algorithm(AssetSelector, BaseAlgo):
         total_value = 0
         formatted_date = time_from_datetime(date)
 
-        barset = self.broker.api.get_barset(symbols=positions.keys(), timeframe='day', limit=2, end=formatted_date)
+        barset = self.broker.get_assets_df(list(positions.keys()), 'day', limit=2, end=formatted_date)
         for symbol in positions:
-            close = barset[symbol][0].c
-            open = barset[symbol][-1].o
+            close = barset[symbol]['close'].iloc[0]
+            open = barset[symbol]['open'].iloc[-1]
             change = float(open - close)
             positions[symbol] = {"shares": positions[symbol], "value": positions[symbol] * open, "change": change}
             total_value += positions[symbol]["value"]
@@ -69,65 +72,74 @@ class Algorithm(AssetSelector, BaseAlgo):
         Per Medium article:
             Rating = Number of volume standard deviations * momentum.
 
-        :param algo_time:
+        :param algo_time: time to rate at when backtesting, None to rate on the latest bars
         :param window_size:
         :return:
         """
-        if not algo_time or algo_time is None:
-            raise ValueError("[!] Invalid algo_time.")
-
         ratings = pd.DataFrame(columns=["symbol", "rating", "price"])
-        index = 0
         window_size = window_size
-        formatted_time = None
-        if algo_time is not None:
+        symbols = [asset.symbol for asset in self.portfolio]
+        if algo_time is None:
+            # live mode, rate on the latest bars
+            algo_time = datetime.now(timezone("EST"))
+            if self.broker.stream is not None:
+                barset = self.broker.stream.frames(symbols)
+            else:
+                barset = self.broker.get_assets_df(symbols, "day", limit=window_size)
+        else:
             # TODO: Consolidate these time usages
             formatted_time = algo_time.date().strftime("%Y-%m-%dT%H:%M:%S.%f-04:00")
-
-        symbols = [asset.symbol for asset in self.portfolio]
-        while index < len(symbols):
-            barset = self.broker.api.get_barset(
-                symbols=symbols,
-                timeframe="day",
-                limit=window_size,
-                end=formatted_time
-            )
-
-            for symbol in symbols:
-                bars = barset[symbol]
-                if len(bars) == window_size:
-                    # make sure we aren"t missing the most recent data.
-                    latest_bar = bars[-1].t.to_pydatetime().astimezone(
-                        timezone("EST")
-                    )
-                    gap_from_present = algo_time - latest_bar
-                    if gap_from_present.days > 1:
-                        continue
-
-                    price = bars[-1].c
-                    price_change = price - bars[0].c
-                    # calculate standard deviation of previous volumes
-                    past_volumes = [bar.v for bar in bars[:-1]]
-                    volume_stdev = statistics.stdev(past_volumes)
-                    if volume_stdev == 0:
-                        # data for the stock might be low quality.
-                        continue
-                    # compare it to the change in volume since yesterday.
-                    volume_change = bars[-1].v - bars[-2].v
-                    volume_factor = volume_change / volume_stdev
-                    rating = price_change/bars[0].c * volume_factor
-                    if rating > 0:
-                        ratings = ratings.append({
-                            "symbol": symbol,
-                            "rating": rating,
-                            "price": price
-                        }, ignore_index=True)
-            index += 200
+            barset = self.broker.get_assets_df(symbols, "day", limit=window_size, end=formatted_time)
+
+        trading_calendar = self.broker.get_trading_calendar()
+        for symbol in symbols:
+            bars = barset[symbol]
+            if bars is not None:
+                # volume differences below go negative, which compact unsigned volumes can't hold
+                bars = widen(bars.iloc[-window_size:])
+            if bars is not None and len(bars) == window_size:
+                # make sure we aren"t missing the most recent data.
+                if trading_calendar.sessions_between(bars.index[-1], algo_time) > 1:
+                    continue
+
+                closes = bars["close"]
+                volumes = bars["volume"]
+                price = closes.iloc[-1]
+                price_change = price - closes.iloc[0]
+                # calculate standard deviation of previous volumes
+                past_volumes = volumes.iloc[:-1].tolist()
+                volume_stdev = statistics.stdev(past_volumes)
+                if volume_stdev == 0:
+                    # data for the stock might be low quality.
+                    continue
+                # compare it to the change in volume since yesterday.
+                volume_change = volumes.iloc[-1] - volumes.iloc[-2]
+                volume_factor = volume_change / volume_stdev
+                rating = price_change/closes.iloc[0] * volume_factor
+                if rating > 0:
+                    ratings = ratings.append({
+                        "symbol": symbol,
+                        "rating": rating,
+                        "price": price
+                    }, ignore_index=True)
         ratings = ratings.sort_values("rating", ascending=False)
         ratings = ratings.reset_index(drop=True)
         return ratings
 
 
+async def submit_orders(async_broker: AsyncBroker, shares: dict, side: str) -> list:
+    """Submit a market order for every symbol at once and wait for all of them.
+
+    :param async_broker:
+    :param shares: dict of symbol -> number of shares
+    :param side: buy or sell
+    :return: list of orders
+    """
+    return await asyncio.gather(*[
+        async_broker.submit_order(symbol, qty, side, "market", "day")
+        for symbol, qty in shares.items() if qty > 0])
+
+
 def run(broker: Broker, args: Namespace):
 
     if not broker or broker is None:
@@ -159,15 +171,15 @@ def run(broker: Broker, args: Namespace):
         # TODO: Make all time usages consistent
         now = datetime.now(timezone("EST"))
         beginning = now - timedelta(days=args.testperiods)
-        calendars = broker.get_calendar(start_date=beginning.strftime("%Y-%m-%d"), end_date=now.strftime("%Y-%m-%d"))
+        calendars = broker.get_trading_calendar(start=beginning).sessions(beginning.date(), now).tz_localize(None)
         portfolio = {}
         cal_index = 0
 
-        for calendar in calendars:
+        for date in calendars:
             # see how much we got back by holding the last day's picks overnight
-            positions, asset_value = algorithm.total_asset_value(portfolio, calendar.date)
+            positions, asset_value = algorithm.total_asset_value(portfolio, date)
             cash += asset_value
-            print("[*] Cash account value on {}: ${}".format(calendar.date.strftime("%Y-%m-%d"), round(cash, 2)),
+            print("[*] Cash account value on {}: ${}".format(date.strftime("%Y-%m-%d"), round(cash, 2)),
                 "Risk amount: ${}".format(round(risk_amount, 2)))
 
             if cash <= 0:
@@ -185,7 +197,7 @@ def run(broker: Broker, args: Namespace):
                 break
 
             # calculate position size based on volume/momentum rating
-            ratings = algorithm.get_ratings(algo_time=timezone("EST").localize(calendar.date), window_size=10)
+            ratings = algorithm.get_ratings(algo_time=timezone("EST").localize(date), window_size=10)
             portfolio = algorithm.portfolio_allocation(ratings, risk_amount)
 
             for _, row in ratings.iterrows():
@@ -200,51 +212,63 @@ def run(broker: Broker, args: Namespace):
         cash = float(broker.cash)
         starting_amount = cash
         cycle = 0
-        bought_today = False
-        sold_today = False
+        async_broker = AsyncBroker(broker)
+        loop = asyncio.new_event_loop()
         try:
-            orders = broker.get_orders(after=time_from_datetime(datetime.today() - timedelta(days=1)), limit=400, status="all")
-        except BrokerException:
-            # We don't have any orders, so we've obviously not done anything today.
-            pass
-        else:
-            for order in orders:
-                if order.side == "buy":
-                    bought_today = True
-                    # This handles an edge case where the script is restarted right before the market closes.
-                    sold_today = True
-                    break
-                else:
-                    sold_today = True
-
-        while True:
-            # wait until the market's open to do anything.
-            clock = broker.get_clock()
-            if clock.is_open and not bought_today:
-                if sold_today:
-                    time_until_close = clock.next_close - clock.timestamp
-                    if time_until_close.seconds <= 120:
-                        print("[+] Buying position(s).")
-                        cash = float(broker.api.get_account().cash)
-                        ratings = algorithm.get_ratings(window_size=10)
-                        portfolio = algorithm.portfolio_allocation(ratings, risk_amount)
-                        for symbol in portfolio:
-                            broker.api.submit_order(symbol=symbol, qty=portfolio[symbol], side="buy", type="market",
-                                time_in_force="day")
-                        print("[*] Position(s) bought.")
+            if broker.stream is not None:
+                # seed the rolling windows once, the stream keeps them current from here on
+                seed = broker.get_assets_df(symbols, broker.stream.period, limit=broker.stream.size)
+                broker.stream.subscribe(symbols, seed=seed)
+                broker.stream.start()
+            bought_today = False
+            sold_today = False
+            try:
+                orders = broker.get_orders(after=time_from_datetime(datetime.today() - timedelta(days=1)), limit=400, status="all")
+            except BrokerException:
+                # We don't have any orders, so we've obviously not done anything today.
+                pass
+            else:
+                for order in orders:
+                    if order.side == "buy":
                         bought_today = True
+                        # This handles an edge case where the script is restarted right before the market closes.
+                        sold_today = True
+                        break
+                    else:
+                        sold_today = True
+
+            while True:
+                # wait until the market's open to do anything.
+                trading_calendar = broker.get_trading_calendar()
+                now = pd.Timestamp.now(tz="America/New_York")
+                if trading_calendar.is_open(now) and not bought_today:
+                    if sold_today:
+                        time_until_close = trading_calendar.next_close(now) - now
+                        if time_until_close.seconds <= 120:
+                            print("[+] Buying position(s).")
+                            # recent round trips per endpoint, to tell whether the buys can make it in before the close
+                            print(broker.latency.report())
+                            cash = float(broker.cash)
+                            ratings = algorithm.get_ratings(window_size=10)
+                            portfolio = algorithm.portfolio_allocation(ratings, risk_amount)
+                            loop.run_until_complete(submit_orders(async_broker, portfolio, "buy"))
+                            print("[*] Position(s) bought.")
+                            bought_today = True
+                    else:
+                        # sell our old positions before buying new ones.
+                        time_after_open = now - trading_calendar.previous_open(now)
+                        if time_after_open.seconds >= 60:
+                            print("[-] Liquidating positions.")
+                            broker.close_all_positions()
+                        sold_today = True
                 else:
-                    # sell our old positions before buying new ones.
-                    time_after_open = clock.next_open - clock.timestamp
-                    if time_after_open.seconds >= 60:
-                        print("[-] Liquidating positions.")
-                        broker.api.close_all_positions()
-                    sold_today = True
-            else:
-                bought_today = False
-                sold_today = False
-                if cycle % 10 == 0:
-                    print("[*] Waiting for next market day...")
-                    print("[-] Cash: {}".format(cash))
-            time.sleep(30)
-            cycle += 1
+                    bought_today = False
+                    sold_today = False
+                    if cycle % 10 == 0:
+                        print("[*] Waiting for next market day...")
+                        print("[-] Cash: {}".format(cash))
+                time.sleep(30)
+                cycle += 1
+        finally:
+            async_broker.close()
+            loop.close()
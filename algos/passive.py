@@ -29,7 +29,7 @@ def run(broker, args):
         raise BrokerException('[!] A broker instance is required.')
 
     """Trade example ganked from https://github.com/alpacahq/example-portfolio-manager and implemented here."""
-    manager = PortfolioManager(broker.api)
+    manager = PortfolioManager(broker)
     # Hedging SPY with GLD 1:1
     manager.add_items([
         ['SPY', 0.5],
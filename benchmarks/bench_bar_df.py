@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Micro-benchmark for Broker._bar_df against the per-column list comprehension path it replaced.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_bar_df
+"""
+from alpaca_trade_api.entity import Bars
+from broker.broker import Broker
+import numpy as np
+import pandas as pd
+import timeit
+
+
+def synthetic_bars(length: int = 1000, seed: int = 7) -> Bars:
+    """Build a Bars entity from a random walk shaped like the raw bars endpoint payload.
+
+    :param length:
+    :param seed:
+    :return:
+    """
+    rng = np.random.RandomState(seed)
+    close = 20 + np.cumsum(rng.normal(0, .25, length))
+    start = 1546300800
+    raw = [{
+        't': start + i * 86400,
+        'o': float(close[i] + rng.normal(0, .1)),
+        'h': float(close[i] + abs(rng.normal(0, .3))),
+        'l': float(close[i] - abs(rng.normal(0, .3))),
+        'c': float(close[i]),
+        'v': int(rng.randint(1000, 1000000)),
+    } for i in range(length)]
+    return Bars(raw)
+
+
+def legacy_bar_df(bars: Bars) -> pd.DataFrame:
+    if bars is None or bars.df.empty:
+        raise ValueError('[!] Bars cannot be none')
+
+    data            = pd.DataFrame(index=[bar.t for bar in bars if bar is not None])
+    data['open']    = [bar.o for bar in bars if bar is not None]
+    data['high']    = [bar.h for bar in bars if bar is not None]
+    data['low']     = [bar.l for bar in bars if bar is not None]
+    data['close']   = [bar.c for bar in bars if bar is not None]
+    data['volume']  = [bar.v for bar in bars if bar is not None]
+    return data
+
+
+def main(lengths=(100, 1000), number=20):
+    for length in lengths:
+        # Bars caches its own .df, so every timed call gets a fresh entity
+        legacy = timeit.timeit(lambda: legacy_bar_df(synthetic_bars(length)), number=number)
+        columnar = timeit.timeit(lambda: Broker._bar_df(synthetic_bars(length)), number=number)
+        baseline = timeit.timeit(lambda: synthetic_bars(length), number=number)
+        legacy, columnar = legacy - baseline, columnar - baseline
+        print('[*] {} bars: legacy {:.2f} ms, columnar {:.2f} ms, speedup {:.1f}x'.format(
+            length, legacy / number * 1000, columnar / number * 1000, legacy / columnar))
+
+
+if __name__ == '__main__':
+    main()
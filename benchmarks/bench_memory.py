@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Memory held by a screening batch of bar frames, default versus compact, and what compact costs in precision.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_memory
+"""
+from benchmarks.bench_bar_df import synthetic_bars
+from broker.bars import compact, widen
+from broker.broker import Broker
+from finta import TA
+import numpy as np
+
+
+def frames(symbols: int, length: int) -> list:
+    return [Broker._bar_df(synthetic_bars(length, seed=seed)) for seed in range(symbols)]
+
+
+def megabytes(dfs: list) -> float:
+    return sum(df.memory_usage(deep=True).sum() for df in dfs) / 2. ** 20
+
+
+def main(universe=(100, 1000, 5000), length=1000):
+    for symbols in universe:
+        wide = frames(symbols, length)
+        narrow = [compact(df) for df in wide]
+        print('[*] {} symbols x {} bars: default {:.1f} MB, compact {:.1f} MB, {:.0%} of default'.format(
+            symbols, length, megabytes(wide), megabytes(narrow), megabytes(narrow) / megabytes(wide)))
+
+    # quoted prices are whole cents
+    wide = [df.round({'open': 2, 'high': 2, 'low': 2, 'close': 2}) for df in frames(100, length)]
+    narrow = [widen(compact(df)) for df in wide]
+    price_error = max(np.abs(n['close'].values - w['close'].values).max() for w, n in zip(wide, narrow))
+    cents = all((np.round(n['close'].values, 2) == np.round(w['close'].values, 2)).all() for w, n in zip(wide, narrow))
+    rsi_error = max(np.nanmax(np.abs(TA.RSI(n).values - TA.RSI(w).values)) for w, n in zip(wide, narrow))
+    print('[*] largest close error {:.2e}, cents preserved: {}, largest RSI error {:.2e}'.format(
+        price_error, cents, rsi_error))
+
+
+if __name__ == '__main__':
+    main()
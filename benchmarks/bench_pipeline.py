@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Throughput benchmark of the trading pipeline against the local fake Alpaca server.
+
+Nothing leaves the machine, so runs are reproducible and can be repeated on an air-gapped box. Run from the repository
+root, e.g. with 50ms of simulated latency:
+
+    python -m benchmarks.bench_pipeline --symbols 1000 --latency .05
+"""
+from testing.fake_alpaca import FakeAlpacaServer
+from broker.async_broker import AsyncBroker
+from broker.bar_cache import BarCache
+from broker.scheduler import RequestScheduler
+from broker.broker import Broker
+from argparse import ArgumentParser, Namespace
+import asyncio
+import time
+
+
+class Stage:
+
+    def __init__(self, server: FakeAlpacaServer, name: str):
+        self.server = server
+        self.name = name
+
+    def __enter__(self):
+        self.requests = sum(self.server.stats()['requests'].values())
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.started
+        requests = sum(self.server.stats()['requests'].values()) - self.requests
+        print('[*] {:<28} {:>8.3f} s {:>6} requests {:>8.1f} req/s'.format(
+            self.name, elapsed, requests, requests / elapsed if elapsed else 0.))
+
+
+async def submit_all(async_broker: AsyncBroker, symbols: list, side: str) -> list:
+    return await asyncio.gather(*[async_broker.submit_order(symbol, 1, side, 'market', 'day') for symbol in symbols])
+
+
+def bench(server: FakeAlpacaServer, orders: int, backtest: bool) -> None:
+    # pace requests to the server's limit rather than the real account's, with some headroom for requests that
+    # reach the server in a different order than they left the scheduler
+    if server.rate_limit:
+        scheduler = RequestScheduler(capacity=server.rate_limit * .9, rate=server.rate_limit * .9 / 60.)
+    else:
+        scheduler = RequestScheduler(capacity=1e9, rate=1e9)
+
+    with Stage(server, 'broker startup'):
+        # no bar cache, so every stage pays for its own requests
+        broker = Broker(server.rest(), bar_cache=BarCache(max_bytes=0), scheduler=scheduler)
+
+    with Stage(server, 'list assets'):
+        symbols = [asset.symbol for asset in broker.get_assets()]
+
+    with Stage(server, 'bars, one request per symbol'):
+        for symbol in symbols:
+            broker.get_asset_df(symbol, 'day', limit=100)
+
+    with Stage(server, 'bars, batched'):
+        broker.get_assets_df(symbols, 'day', limit=100)
+
+    with Stage(server, 'bars, batched, 4 workers'):
+        broker.get_assets_df(symbols, 'day', limit=100, chunk_size=50, max_workers=4)
+
+    async_broker = AsyncBroker(broker)
+    loop = asyncio.new_event_loop()
+    with Stage(server, 'bars, async'):
+        loop.run_until_complete(async_broker.get_assets_df(symbols, 'day', limit=100, chunk_size=50))
+
+    with Stage(server, 'orders, serial'):
+        for symbol in symbols[:orders]:
+            broker.submit_order(symbol, 1, 'buy', 'market', 'day')
+
+    with Stage(server, 'orders, async'):
+        loop.run_until_complete(submit_all(async_broker, symbols[:orders], 'sell'))
+    async_broker.close()
+    loop.close()
+
+    if backtest:
+        try:
+            from algos import bullish_hold
+        except ImportError as error:
+            print('[!] Skipping the backtest, {}.'.format(error))
+            return
+        args = Namespace(algorithm='bullish_hold', backtest=True, testperiods=30, crypto=False, forex=False,
+                         period=None, base=None, max=None, min=None, poolsize=None, cash=None, risk_pct=None)
+        with Stage(server, 'bullish_hold backtest'):
+            bullish_hold.run(broker, args)
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('--symbols', type=int, default=500, help='Size of the synthetic universe')
+    parser.add_argument('--latency', type=float, default=.02, help='Seconds added to every request')
+    parser.add_argument('--jitter', type=float, default=0., help='Up to this many more seconds per request')
+    parser.add_argument('--rate-limit', type=int, default=None, help='Requests per minute the server accepts')
+    parser.add_argument('--orders', type=int, default=20, help='Orders to submit in the order stages')
+    parser.add_argument('--backtest', action='store_true', help='Also run the bullish_hold backtest')
+    args = parser.parse_args()
+
+    with FakeAlpacaServer(universe_size=args.symbols, latency=args.latency, jitter=args.jitter,
+                          rate_limit=args.rate_limit, as_of='2020-06-30') as server:
+        print('[*] {} symbols, {:.0f}ms latency, serving on {}'.format(args.symbols, args.latency * 1000, server.url))
+        bench(server, args.orders, args.backtest)
+        print('[*] {} requests answered with 429'.format(server.stats()['throttled']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Screening signals symbol by symbol with finta versus the whole universe at once with the signal engine.
+
+Per symbol, the indicators behind the five signals are computed with finta the way py_trade_signal does. That is
+timed on a sample of the universe and scaled to its size, since finta's row by row MFI and DMI make the full run take
+minutes.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_signals
+"""
+from benchmarks.bench_bar_df import synthetic_bars
+from src.signal_engine import signal_frame
+from broker.broker import Broker
+from finta import TA
+import time
+
+
+def frames(symbols: int, length: int) -> dict:
+    bars = Broker._bar_df(synthetic_bars(length, seed=0))
+    # the same walk shifted per symbol, building thousands of distinct walks would dominate the run
+    return {'S{:05d}'.format(i): bars + i % 97 for i in range(symbols)}
+
+
+def per_symbol(df) -> None:
+    TA.MACD(df)
+    TA.MFI(df)
+    TA.OBV(df.copy())
+    TA.RSI(df)
+    TA.VZO(df)
+    TA.ADX(df.copy())
+    TA.DMI(df.copy())
+    TA.EMA(df, 60)
+
+
+def main(universe=(100, 1000, 5000), length=1000, sample=20):
+    for symbols in universe:
+        batch = frames(symbols, length)
+
+        started = time.perf_counter()
+        for df in list(batch.values())[:sample]:
+            per_symbol(df)
+        looped = (time.perf_counter() - started) / min(sample, symbols) * symbols
+
+        started = time.perf_counter()
+        signal_frame(batch, 'buy')
+        batched = time.perf_counter() - started
+
+        print('[*] {} symbols x {} bars: per symbol {:.1f}s (from {} symbols), batched {:.2f}s, {:.0f}x faster'.format(
+            symbols, length, looped, min(sample, symbols), batched, looped / batched))
+
+
+if __name__ == '__main__':
+    main()
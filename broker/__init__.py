@@ -7,5 +7,9 @@ class BrokerException(HTTPError, Exception):
     pass
 
 
+class BrokerTimeoutException(BrokerException):
+    pass
+
+
 class BrokerValidationException(ValueError):
     pass
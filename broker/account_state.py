@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from broker import BrokerValidationException
+import threading
+import time
+
+# order statuses after which an order cannot fill any further
+DONE_STATUSES = ('filled', 'canceled', 'expired', 'replaced', 'rejected', 'suspended', 'done_for_day')
+
+
+class AccountState:
+
+    def __init__(self, get_account, get_positions, ttl: float = 15.):
+        """A local view of the account and its open positions.
+
+        Reads are served from memory. The account and the positions are requested again once they are older than
+        `ttl` seconds, or on the next read after something may have changed them: an order being sent, replaced or
+        canceled, a position being closed, or an order seen with more filled shares than the last time. Concurrent
+        readers of a stale view wait for a single refresh instead of each making the request.
+
+        :param get_account: callable requesting the account
+        :param get_positions: callable requesting the list of open positions
+        :param ttl: seconds a view is read from memory before it is requested again
+        """
+        if ttl < 0:
+            raise BrokerValidationException('[!] ttl cannot be negative.')
+
+        self.get_account = get_account
+        self.get_positions = get_positions
+        self.ttl = ttl
+        self.hits = 0
+        self.refreshes = 0
+        # name -> (value, monotonic time it expires at)
+        self._views = dict()
+        # bumped by every invalidation, a refresh that started before one is not kept
+        self._generation = 0
+        # order id -> filled quantity last seen
+        self._filled = dict()
+        self._lock = threading.Lock()
+        self._refresh_locks = {'account': threading.Lock(), 'positions': threading.Lock()}
+
+    def _view(self, name: str, fetch):
+        with self._lock:
+            view = self._views.get(name)
+            if view is not None and view[1] > time.monotonic():
+                self.hits += 1
+                return view[0]
+
+        with self._refresh_locks[name]:
+            # someone else may have refreshed it while we waited
+            with self._lock:
+                view = self._views.get(name)
+                if view is not None and view[1] > time.monotonic():
+                    self.hits += 1
+                    return view[0]
+                generation = self._generation
+            value = fetch()
+            with self._lock:
+                if generation == self._generation:
+                    self._views[name] = (value, time.monotonic() + self.ttl)
+                self.refreshes += 1
+            return value
+
+    def account(self):
+        """The account, requested at most every ttl seconds.
+
+        :return:
+        """
+        return self._view('account', self.get_account)
+
+    def positions(self) -> dict:
+        """The open positions, requested at most every ttl seconds.
+
+        :return: symbol -> position
+        """
+        return self._view('positions', lambda: {position.symbol: position for position in self.get_positions()})
+
+    def position(self, symbol: str):
+        """The open position in a symbol.
+
+        :param symbol:
+        :return: the position, or None if there is none
+        """
+        return self.positions().get(symbol)
+
+    def put_account(self, account) -> None:
+        """Keep an account that was just requested anyway, so the next read does not request it again.
+
+        :param account:
+        :return:
+        """
+        with self._lock:
+            self._views['account'] = (account, time.monotonic() + self.ttl)
+
+    def invalidate(self) -> None:
+        """Have the next read request the account and positions again.
+
+        :return:
+        """
+        with self._lock:
+            self._views.clear()
+            self._generation += 1
+
+    def order_update(self, order, sent: bool = False) -> None:
+        """Note an order from an API response, invalidating when it may have moved cash or positions.
+
+        Orders that were just sent always invalidate, they may have filled right away. Orders read back later only
+        invalidate when more of them has filled since they were last seen.
+
+        :param order: an order entity, or None for calls that change orders without returning one
+        :param sent: the order was just submitted or replaced
+        :return:
+        """
+        if order is None:
+            self.invalidate()
+            return
+
+        filled = getattr(order, 'filled_qty', None)
+        with self._lock:
+            tracked = order.id in self._filled
+            changed = tracked and self._filled[order.id] != filled
+            if getattr(order, 'status', None) in DONE_STATUSES:
+                self._filled.pop(order.id, None)
+            elif sent or tracked:
+                self._filled[order.id] = filled
+        if sent or changed:
+            self.invalidate()
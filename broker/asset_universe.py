@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from alpaca_trade_api.entity import Asset
+import numpy as np
+import tempfile
+import time
+import os
+
+FLAGS = ('tradable', 'marginable', 'shortable', 'easy_to_borrow')
+LABELS = ('id', 'class', 'exchange', 'status')
+
+
+class AssetUniverse:
+
+    def __init__(self, path: str = None, max_age: float = 86400.):
+        """A columnar snapshot of the tradeable universe.
+
+        Symbols are kept in one string array next to one boolean array per flag (tradable, marginable, shortable,
+        easy_to_borrow), so screening the ~10k active assets is a handful of vectorized masks instead of attribute
+        lookups on every Asset entity. With a path, the snapshot is saved and reused across restarts until it is
+        older than max_age.
+
+        :param path: optional .npz file to keep the snapshot in
+        :param max_age: seconds a snapshot is used before the assets are requested again
+        """
+        self.path = path
+        self.max_age = max_age
+        self.fetched_at = None
+        self.symbols = np.array([], dtype='U1')
+        self.flags = {flag: np.zeros(0, dtype=bool) for flag in FLAGS}
+        self.labels = {label: np.array([], dtype='U1') for label in LABELS}
+
+    def __len__(self):
+        return len(self.symbols)
+
+    @property
+    def fresh(self) -> bool:
+        return self.fetched_at is not None and time.time() - self.fetched_at < self.max_age
+
+    def load(self) -> bool:
+        """Read the saved snapshot.
+
+        :return: True if a snapshot was read and is still fresh
+        """
+        if self.path is None or not os.path.exists(self.path):
+            return False
+
+        with np.load(self.path, allow_pickle=False) as data:
+            self.fetched_at = float(data['__fetched_at__'])
+            self.symbols = data['symbol']
+            self.flags = {flag: data[flag] for flag in FLAGS}
+            self.labels = {label: data[label] for label in LABELS}
+        return self.fresh
+
+    def refresh(self, assets: list) -> None:
+        """Rebuild the snapshot from Asset entities, and save it if there is a path.
+
+        :param assets: list of Asset entities, e.g. from Broker.get_assets
+        :return:
+        """
+        raw = [asset._raw for asset in assets]
+        self.symbols = np.array([a['symbol'] for a in raw], dtype='U')
+        self.flags = {flag: np.array([bool(a.get(flag)) for a in raw], dtype=bool) for flag in FLAGS}
+        self.labels = {label: np.array([a.get(label) or '' for a in raw], dtype='U') for label in LABELS}
+        self.fetched_at = time.time()
+
+        if self.path is not None:
+            self._save()
+
+    def _save(self) -> None:
+        arrays = dict(symbol=self.symbols, __fetched_at__=np.array(self.fetched_at), **self.flags, **self.labels)
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+
+        handle, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as fh:
+                np.savez_compressed(fh, **arrays)
+            os.replace(tmp, self.path)
+        except OSError as error:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise error
+
+    def mask(self, **flags) -> np.ndarray:
+        """Boolean mask of the assets whose flags have the given values.
+
+        e.g. universe.mask(tradable=True, shortable=True, easy_to_borrow=True)
+
+        :param flags: flag name -> wanted value
+        :return:
+        """
+        mask = np.ones(len(self.symbols), dtype=bool)
+        for flag, value in flags.items():
+            mask &= self.flags[flag] == value
+        return mask
+
+    def select(self, mask: np.ndarray) -> list:
+        """Asset entities for the masked rows, in snapshot order.
+
+        :param mask: boolean mask, e.g. from mask()
+        :return:
+        """
+        rows = np.flatnonzero(mask)
+        return [Asset(dict(
+            {'symbol': str(self.symbols[i])},
+            **{flag: bool(self.flags[flag][i]) for flag in FLAGS},
+            **{label: str(self.labels[label][i]) for label in LABELS})) for i in rows]
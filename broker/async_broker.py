@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from broker import BrokerValidationException
+from broker.broker import Broker, BARSET_MAX_SYMBOLS
+from broker.client_pool import ClientPool, _mount
+from broker.asset_universe import AssetUniverse
+from broker.trading_calendar import TradingCalendar
+from alpaca_trade_api.entity import Account, Clock, Asset, Position, Order, Watchlist
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+import pandas as pd
+import functools
+import asyncio
+
+
+class AsyncBroker:
+
+    def __init__(self, broker: Broker, concurrency: int = 16):
+        """Coroutine counterpart of Broker.
+
+        Each call runs the matching Broker method on a pool of at most `concurrency` worker threads, so validation,
+        the bar cache and the bar store behave exactly as they do for Broker. The underlying HTTP session, or the session
+        of every client when the broker calls through a ClientPool, is given a connection pool of the same size so
+        concurrent calls reuse keep-alive connections instead of opening and discarding sockets.
+
+        :param broker: Broker to run calls through
+        :param concurrency: maximum number of API calls in flight at once
+        """
+        if not broker or broker is None:
+            raise BrokerValidationException('[!] Broker instance required.')
+
+        if concurrency < 1:
+            raise BrokerValidationException('[!] concurrency must be at least 1.')
+
+        self.broker = broker
+        self.concurrency = concurrency
+        self._executor = ThreadPoolExecutor(max_workers=concurrency)
+
+        adapter = functools.partial(HTTPAdapter, pool_connections=concurrency, pool_maxsize=concurrency)
+        if isinstance(broker.api, ClientPool):
+            broker.api.mount(adapter)
+        else:
+            _mount(broker.api, adapter)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        # waiting for in-flight calls here would block the event loop, wait on one of its default threads instead
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    def close(self) -> None:
+        """Shut down the worker threads once in-flight calls are done, blocking until they are.
+
+        Use `async with` from a coroutine, which waits without blocking the event loop.
+
+        :return:
+        """
+        self._executor.shutdown(wait=True)
+
+    async def _run(self, method, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(method, *args, **kwargs))
+
+    """Data grabbing methods"""
+    async def get_account(self) -> Account:
+        return await self._run(self.broker.get_account)
+
+    async def get_clock(self) -> Clock:
+        return await self._run(self.broker.get_clock)
+
+    async def get_calendar(self, start_date: str, end_date: str) -> list:
+        return await self._run(self.broker.get_calendar, start_date, end_date)
+
+    async def get_trading_calendar(self, start: str = None) -> TradingCalendar:
+        return await self._run(self.broker.get_trading_calendar, start)
+
+    async def get_assets(self) -> list:
+        return await self._run(self.broker.get_assets)
+
+    async def get_universe(self) -> AssetUniverse:
+        return await self._run(self.broker.get_universe)
+
+    async def get_asset(self, symbol: str) -> Asset:
+        return await self._run(self.broker.get_asset, symbol)
+
+    async def get_positions(self) -> list:
+        return await self._run(self.broker.get_positions)
+
+    async def get_position(self, symbol: str) -> Position:
+        return await self._run(self.broker.get_position, symbol)
+
+    async def close_all_positions(self) -> list:
+        return await self._run(self.broker.close_all_positions)
+
+    async def close_position(self, symbol: str) -> Order:
+        return await self._run(self.broker.close_position, symbol)
+
+    async def get_orders(self, status: str = 'open', limit: int = 50, after: str = None, until: str = None, direction: str = 'desc') -> list:
+        return await self._run(self.broker.get_orders, status=status, limit=limit, after=after, until=until, direction=direction)
+
+    async def get_order(self, order_id: str, client_order_id: str = None) -> Order:
+        return await self._run(self.broker.get_order, order_id, client_order_id=client_order_id)
+
+    async def submit_order(self,
+                           symbol: str,
+                           quantity: int,
+                           transaction_side: str,
+                           transaction_type: str,
+                           time_in_force: str,
+                           limit_price: float = None,
+                           stop_price: float = None,
+                           extended_hours: bool = False,
+                           client_order_id: str = None) -> Order:
+        return await self._run(self.broker.submit_order, symbol, quantity, transaction_side, transaction_type,
+                               time_in_force, limit_price=limit_price, stop_price=stop_price,
+                               extended_hours=extended_hours, client_order_id=client_order_id)
+
+    async def replace_order(self,
+                            order_id: str,
+                            quantity: int = None,
+                            time_in_force: str = None,
+                            limit_price: float = None,
+                            stop_price: float = None,
+                            client_order_id: str = None) -> Order:
+        return await self._run(self.broker.replace_order, order_id, quantity=quantity, time_in_force=time_in_force,
+                               limit_price=limit_price, stop_price=stop_price, client_order_id=client_order_id)
+
+    async def cancel_all_orders(self) -> None:
+        return await self._run(self.broker.cancel_all_orders)
+
+    async def cancel_order(self, order_id: str) -> None:
+        return await self._run(self.broker.cancel_order, order_id)
+
+    async def get_asset_df(self, symbol: str, period: str, limit: int = 1000, start: str = None, end: str = None, base: str = None) -> pd.DataFrame or None:
+        return await self._run(self.broker.get_asset_df, symbol, period, limit=limit, start=start, end=end, base=base)
+
+    async def get_assets_df(self,
+                            symbols: list,
+                            period: str,
+                            limit: int = 1000,
+                            start: str = None,
+                            end: str = None,
+                            chunk_size: int = BARSET_MAX_SYMBOLS,
+                            base: str = None) -> dict:
+        """Get bars for many symbols, requesting every chunk of symbols at once and awaiting them together.
+
+        :param symbols:
+        :param period:
+        :param limit:
+        :param start:
+        :param end:
+        :param chunk_size: symbols per request, the API accepts at most 200
+        :param base: finer period to request and build the bars from locally
+        :return: dict of symbol -> dataframe, or None if the API returned no bars for that symbol
+        """
+        if not symbols or symbols is None:
+            raise BrokerValidationException('[!] At least one symbol is required.')
+
+        symbols = list(symbols)
+        chunks = [symbols[i:i + chunk_size] for i in range(0, len(symbols), chunk_size)]
+        frames = await asyncio.gather(*[
+            self._run(self.broker.get_assets_df, chunk, period, limit=limit, start=start, end=end, chunk_size=chunk_size,
+                      base=base)
+            for chunk in chunks])
+
+        result = dict()
+        for chunk_frames in frames:
+            result.update(chunk_frames)
+        return result
+
+    async def get_assets_multi_df(self,
+                                  symbols: list,
+                                  periods: list,
+                                  limit: int = 1000,
+                                  start: str = None,
+                                  end: str = None,
+                                  base: str = None) -> dict:
+        return await self._run(self.broker.get_assets_multi_df, symbols, periods, limit=limit, start=start, end=end, base=base)
+
+    async def bars_for(self, symbols: list, period: str = 'day', limit: int = 1000, start: str = None, end: str = None,
+                       base: str = None) -> dict:
+        return await self._run(self.broker.bars_for, symbols, period, limit=limit, start=start, end=end, base=base)
+
+    async def latest_quotes(self, symbols: list) -> pd.DataFrame:
+        return await self._run(self.broker.latest_quotes, symbols)
+
+    async def get_watchlists(self) -> list:
+        return await self._run(self.broker.get_watchlists)
+
+    async def get_watchlist(self, watchlist_id: str) -> Watchlist:
+        return await self._run(self.broker.get_watchlist, watchlist_id)
+
+    async def add_watchlist(self, watchlist_name: str) -> Watchlist:
+        return await self._run(self.broker.add_watchlist, watchlist_name)
+
+    async def add_to_watchlist(self, watchlist_id: str, symbol: str) -> Watchlist:
+        return await self._run(self.broker.add_to_watchlist, watchlist_id, symbol)
+
+    async def clear_watchlist(self, watchlist_id: str) -> Watchlist:
+        return await self._run(self.broker.clear_watchlist, watchlist_id)
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from collections import OrderedDict
+import pandas as pd
+import threading
+import time
+
+
+class BarCache:
+
+    def __init__(self, max_bytes: int = 256 * 1024 ** 2, live_ttl: float = 30.):
+        """An in-process LRU cache of bar dataframes, bounded by their memory footprint.
+
+        Entries can carry a time to live. Windows that reach the current, still forming bar should be put with
+        live_ttl so they are refetched soon, historical windows never change and are kept until evicted.
+
+        :param max_bytes: size cap for all cached frames, least recently used entries are evicted past it
+        :param live_ttl: seconds to keep windows that include the current bar
+        """
+        self.max_bytes = max_bytes
+        self.live_ttl = live_ttl
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: tuple) -> tuple:
+        """Look up a cached frame. Returns a copy, callers are free to add columns to it.
+
+        :param key:
+        :return: a (found, dataframe) tuple, the dataframe may be None if the API had no bars for the key
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] is not None and entry[2] <= time.monotonic():
+                self._drop(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        df = entry[0]
+        return True, None if df is None else df.copy()
+
+    def put(self, key: tuple, df: pd.DataFrame or None, ttl: float = None) -> None:
+        """Cache a frame, evicting least recently used entries until it fits.
+
+        :param key:
+        :param df:
+        :param ttl: seconds until the entry expires, or None to keep it until evicted
+        :return:
+        """
+        nbytes = 0 if df is None else int(df.memory_usage(index=True, deep=True).sum())
+        if nbytes > self.max_bytes:
+            return
+        expires = None if ttl is None else time.monotonic() + ttl
+
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            while self._entries and self.size + nbytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+            self._entries[key] = (df, nbytes, expires)
+            self.size += nbytes
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self) -> dict:
+        """Counters for reporting cache effectiveness.
+
+        :return:
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries':      len(self._entries),
+                'bytes':        self.size,
+                'hits':         self.hits,
+                'misses':       self.misses,
+                'hit_rate':     self.hits / lookups if lookups else 0.,
+                'evictions':    self.evictions,
+                'expirations':  self.expirations,
+            }
+
+    def _drop(self, key: tuple) -> None:
+        _, nbytes, _ = self._entries.pop(key)
+        self.size -= nbytes
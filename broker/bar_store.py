@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from broker import BrokerValidationException
+from broker.bars import NY, to_timestamp
+import pandas as pd
+import numpy as np
+import tempfile
+import json
+import os
+
+
+class BarStore:
+
+    def __init__(self, root: str):
+        """A local bar store, one compressed columnar file per symbol and period.
+
+        Files live at <root>/<period>/<symbol>.npz and hold the bar times as int64 epoch nanoseconds plus one array
+        per column. Each file also records the window it is known to hold every bar for:
+            - covered_from: the earliest time with no missing bars after it (0 means the start of the history)
+            - synced_to: the latest time the API has been asked about
+
+        :param root: directory to keep the store in
+        """
+        if not root or root is None:
+            raise BrokerValidationException('[!] A bar store directory is required.')
+
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, symbol: str, period: str) -> str:
+        return os.path.join(self.root, period, '{}.npz'.format(symbol.replace('/', '_')))
+
+    def read(self, symbol: str, period: str) -> tuple:
+        """Read the stored bars for a symbol.
+
+        :param symbol:
+        :param period:
+        :return: a (dataframe, meta) tuple, or (None, None) if nothing is stored
+        """
+        path = self._path(symbol, period)
+        if not os.path.exists(path):
+            return None, None
+
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data['__meta__']))
+            index = pd.to_datetime(data['__index__'], utc=True).tz_convert(meta.get('tz') or NY)
+            df = pd.DataFrame({col: data['col:' + col] for col in meta['columns']}, index=index, columns=meta['columns'])
+        return df, meta
+
+    def write(self, symbol: str, period: str, df: pd.DataFrame, meta: dict = None) -> None:
+        """Replace the stored bars for a symbol. The file is swapped in atomically.
+
+        :param symbol:
+        :param period:
+        :param df: dataframe with a tz-aware datetime index
+        :param meta: extra json-serializable values to keep alongside the bars
+        :return:
+        """
+        meta = dict(meta or {})
+        meta['columns'] = [str(col) for col in df.columns]
+        meta['tz'] = str(df.index.tz) if df.index.tz is not None else None
+
+        path = self._path(symbol, period)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        arrays = {'col:' + str(col): df[col].values for col in df.columns}
+        arrays['__index__'] = df.index.values.astype('datetime64[ns]').astype('int64')
+        arrays['__meta__'] = np.array(json.dumps(meta))
+
+        handle, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as fh:
+                np.savez_compressed(fh, **arrays)
+            os.replace(tmp, path)
+        except OSError as error:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise error
+
+    @staticmethod
+    def missing(df: pd.DataFrame, meta: dict, limit: int, start: str = None, end: str = None, max_limit: int = 1000):
+        """Work out what has to be fetched from the API to answer a bars request from the store.
+
+        The API answers with the last `limit` bars between start and end, so the store can answer on its own when it
+        is synced past end and holds either `limit` bars in that window or every bar back to start.
+
+        :param df: stored bars, or None
+        :param meta: stored meta, or None
+        :param limit:
+        :param start:
+        :param end:
+        :param max_limit: largest limit the API accepts, used to catch up on the tail
+        :return: None if nothing is missing, otherwise a (start, limit) tuple for the request to make
+        """
+        if df is None or df.empty:
+            return start, limit
+
+        start_ts = to_timestamp(start)
+        end_ts = to_timestamp(end)
+        covered_from = meta['covered_from']
+
+        window = df.index if end_ts is None else df.index[df.index <= end_ts]
+        if start_ts is not None:
+            window = window[window >= start_ts]
+            head_ok = len(window) >= limit or covered_from <= start_ts.value
+        else:
+            head_ok = len(window) >= limit or covered_from == 0
+
+        if not head_ok:
+            return start, limit
+
+        if end_ts is None or end_ts.value > meta['synced_to']:
+            # re-request from the newest stored bar, it may have still been forming when it was stored
+            return df.index[-1].isoformat(), max_limit
+
+        return None
+
+    def merge(self, symbol: str, period: str, df: pd.DataFrame, meta: dict, fresh: pd.DataFrame, start: str,
+              limit: int, end: str = None) -> tuple:
+        """Fold freshly fetched bars into the stored ones and persist the result.
+
+        Fresh bars replace stored bars with the same time. If the fresh window does not touch the stored one there
+        may be a gap between them, so the fresh bars replace the store outright.
+
+        :param symbol:
+        :param period:
+        :param df: stored bars, or None
+        :param meta: stored meta, or None
+        :param fresh: bars returned by the API for (start, limit, end), or None
+        :param start: start of the request that was made
+        :param limit: limit of the request that was made
+        :param end: end of the request that was made
+        :return: the updated (dataframe, meta) tuple
+        """
+        if fresh is None or fresh.empty:
+            return df, meta
+
+        # a short answer means the API had nothing older in the requested window
+        fresh_from = fresh.index[0].value
+        if len(fresh) < limit:
+            fresh_from = 0 if start is None else min(fresh_from, to_timestamp(start).value)
+
+        end_ts = to_timestamp(end)
+        if end_ts is not None and end_ts < pd.Timestamp.now(tz='UTC'):
+            fresh_synced = end_ts.value
+        else:
+            fresh_synced = fresh.index[-1].value
+
+        if df is not None and not df.empty and fresh_from <= df.index[-1].value and fresh.index[-1].value >= meta['covered_from']:
+            merged = pd.concat([df[~df.index.isin(fresh.index)], fresh]).sort_index()
+            meta = {
+                'covered_from': min(meta['covered_from'], fresh_from),
+                'synced_to': max(meta['synced_to'], fresh_synced),
+            }
+        else:
+            merged = fresh
+            meta = {'covered_from': fresh_from, 'synced_to': fresh_synced}
+
+        self.write(symbol, period, merged, meta)
+        return merged, meta
+
+    @staticmethod
+    def select(df: pd.DataFrame, limit: int, start: str = None, end: str = None) -> pd.DataFrame or None:
+        """Answer a bars request from stored bars: the last `limit` bars between start and end.
+
+        :param df:
+        :param limit:
+        :param start:
+        :param end:
+        :return:
+        """
+        if df is None:
+            return None
+
+        start_ts = to_timestamp(start)
+        end_ts = to_timestamp(end)
+        mask = np.ones(len(df), dtype=bool)
+        if start_ts is not None:
+            mask &= df.index >= start_ts
+        if end_ts is not None:
+            mask &= df.index <= end_ts
+
+        result = df[mask].iloc[-limit:]
+        if result.empty:
+            return None
+        return result
@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from broker import BrokerException, BrokerValidationException
+from broker.rolling_bars import RollingBars
+from websocket import WebSocketException
+import pandas as pd
+import websocket
+import threading
+import json
+import time
+
+DATA_STREAM_URL = 'wss://data.alpaca.markets/stream'
+
+
+def _text(message) -> str:
+    return message.decode('utf-8') if isinstance(message, bytes) else message
+
+
+class BarStream:
+
+    def __init__(self,
+                 key_id: str,
+                 secret_key: str,
+                 url: str = DATA_STREAM_URL,
+                 size: int = 100,
+                 period: str = 'minute',
+                 record_path: str = None,
+                 retries: int = 3,
+                 retry_wait: float = 3.):
+        """Keep a rolling window of bars per symbol up to date from the Alpaca minute bar stream.
+
+        A background thread reads AM.<symbol> messages and folds each minute bar into that symbol's RollingBars, so
+        ratings and signals read local state instead of requesting bars again. With a daily period, minute bars
+        build up the current day's bar on top of windows seeded from the bars endpoint.
+
+        :param key_id:
+        :param secret_key:
+        :param url: stream endpoint, point this at a testing.fake_bar_stream.BarReplayServer to replay
+                    recorded bars
+        :param size: bars kept per symbol
+        :param period: timeframe of the windows
+        :param record_path: optional file every raw stream message is appended to, for replaying later
+        :param retries: reconnect attempts before giving up
+        :param retry_wait: seconds between reconnect attempts
+        """
+        if not key_id or not secret_key:
+            raise BrokerValidationException('[!] API credentials required.')
+
+        self.key_id = key_id
+        self.secret_key = secret_key
+        self.url = url
+        self.size = size
+        self.period = period
+        self.record_path = record_path
+        self.retries = retries
+        self.retry_wait = retry_wait
+        self.windows = dict()
+        self.messages = 0
+        self._ws = None
+        self._thread = None
+        self._running = False
+        self._send_lock = threading.Lock()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def subscribe(self, symbols: list, seed: dict = None) -> None:
+        """Start keeping windows for symbols, optionally seeded with bars from the bars endpoint.
+
+        :param symbols:
+        :param seed: dict of symbol -> OHLCV dataframe, e.g. from Broker.get_assets_df
+        :return:
+        """
+        new = []
+        for symbol in symbols:
+            if symbol not in self.windows:
+                self.windows[symbol] = RollingBars(self.size, self.period)
+                new.append(symbol)
+            if seed is not None and seed.get(symbol) is not None:
+                self.windows[symbol].seed(seed[symbol])
+
+        if new and self._ws is not None:
+            self._listen(new)
+
+    def start(self) -> None:
+        """Connect, listen to every subscribed symbol and start reading in the background.
+
+        :return:
+        """
+        self._connect()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._running = False
+        if self._ws is not None:
+            self._ws.close()
+        if self._thread is not None:
+            self._thread.join()
+        self._ws = None
+        self._thread = None
+
+    def frame(self, symbol: str) -> pd.DataFrame or None:
+        """The current window for a symbol as an OHLCV dataframe.
+
+        :param symbol:
+        :return:
+        """
+        window = self.windows.get(symbol)
+        if window is None or len(window) == 0:
+            return None
+        return window.df()
+
+    def frames(self, symbols: list) -> dict:
+        """Windows for many symbols, shaped like Broker.get_assets_df results.
+
+        :param symbols:
+        :return:
+        """
+        return {symbol: self.frame(symbol) for symbol in symbols}
+
+    def _connect(self) -> None:
+        ws = websocket.create_connection(self.url, timeout=10)
+        ws.send(json.dumps({
+            'action': 'authenticate',
+            'data': {
+                'key_id': self.key_id,
+                'secret_key': self.secret_key,
+            }
+        }))
+        msg = json.loads(_text(ws.recv()))
+        if msg.get('data', {}).get('status') != 'authorized':
+            ws.close()
+            raise BrokerException('[!] Unable to authenticate with the data stream.')
+
+        ws.settimeout(None)
+        self._ws = ws
+        if self.windows:
+            self._listen(list(self.windows))
+
+    def _listen(self, symbols: list) -> None:
+        with self._send_lock:
+            self._ws.send(json.dumps({
+                'action': 'listen',
+                'data': {'streams': ['AM.{}'.format(symbol) for symbol in symbols]},
+            }))
+
+    def _run(self) -> None:
+        while self._running:
+            try:
+                message = self._ws.recv()
+            except (WebSocketException, OSError):
+                if not self._running:
+                    return
+                self._reconnect()
+                continue
+            if message:
+                self._handle(_text(message))
+
+    def _reconnect(self) -> None:
+        for attempt in range(self.retries):
+            print(f'[!] Bar stream disconnected, reconnecting ({attempt + 1}/{self.retries}).')
+            time.sleep(self.retry_wait)
+            try:
+                self._connect()
+            except (WebSocketException, OSError, BrokerException):
+                continue
+            else:
+                return
+        print('[!] Unable to reconnect to the bar stream.')
+        self._running = False
+
+    def _handle(self, message: str) -> None:
+        if self.record_path is not None:
+            with open(self.record_path, 'a') as fh:
+                fh.write(message + '\n')
+
+        msg = json.loads(message)
+        stream = msg.get('stream', '')
+        if not stream.startswith('AM.'):
+            return
+
+        bar = msg['data']
+        window = self.windows.get(bar['T'])
+        if window is None:
+            return
+        # bar start times are epoch milliseconds
+        window.push(int(bar['s']) * 10 ** 6, bar['o'], bar['h'], bar['l'], bar['c'], bar['v'])
+        self.messages += 1
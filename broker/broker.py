@@ -1,27 +1,224 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
-from broker import BrokerException, BrokerValidationException
+from broker import BrokerException, BrokerTimeoutException, BrokerValidationException
+from broker.bars import NY, PERIOD_SECONDS, bar_records, records_df, to_timestamp, compact
+from broker.bar_store import BarStore
+from broker.bar_cache import BarCache
+from broker.scheduler import RequestScheduler, PRIORITY_ORDER, PRIORITY_ACCOUNT, PRIORITY_DATA
+from broker.single_flight import SingleFlight
+from broker.bar_stream import BarStream
+from broker.asset_universe import AssetUniverse
+from broker.trading_calendar import TradingCalendar
+from broker.resample import resample_bars, bars_per, check_base
+from broker.market_data import MarketDataProvider, normalize_bars, quotes_df
+from broker.account_state import AccountState
+from broker.circuit_breaker import CircuitBreaker, is_endpoint_failure
+from broker.latency import LatencyTracker
 from alpaca_trade_api.entity import Account, Clock, Calendar, Asset, Position, Order, Watchlist, Bars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import alpaca_trade_api as API
 import pandas as pd
-
-
-class Broker(object):
-
-    def __init__(self, api: API):
-
+import time
+
+# maximum number of symbols and bars per symbol the bars endpoint accepts per request
+BARSET_MAX_SYMBOLS = 200
+BARSET_MAX_LIMIT = 1000
+
+# API methods that only read, concurrent identical calls to these share one request
+IDEMPOTENT_PREFIXES = ('get_', 'list_')
+
+# years of sessions the trading calendar index is built for, either side of today
+CALENDAR_YEARS_BACK = 5
+CALENDAR_YEARS_AHEAD = 1
+
+# a read still running at this percentile of its endpoint's recent latencies gets a second, identical request
+HEDGE_PERCENTILE = 95
+# calls an endpoint needs on record before its reads are hedged
+HEDGE_MIN_SAMPLES = 20
+# threads that run reads with a deadline or a hedge, and their duplicates
+BOUNDED_CALL_WORKERS = 32
+
+
+class Broker(MarketDataProvider):
+
+    def __init__(self,
+                 api: API,
+                 bar_store: BarStore = None,
+                 bar_cache: BarCache = None,
+                 scheduler: RequestScheduler = None,
+                 stream: BarStream = None,
+                 universe: AssetUniverse = None,
+                 trading_calendar: TradingCalendar = None,
+                 compact: bool = False,
+                 account_state: AccountState = None,
+                 deadline: float = None,
+                 hedge: bool = False,
+                 circuit_breaker: CircuitBreaker = None,
+                 latency: LatencyTracker = None):
+        """
+        :param api: Alpaca REST API instance, or a ClientPool of them for use from many threads at once
+        :param bar_store: optional local bar store that bar requests are served from and kept up to date in
+        :param bar_cache: in-process cache for bar requests, a default sized one is used if not given
+        :param scheduler: rate limiter every API call goes through, share one between brokers using the same account
+        :param stream: optional bar stream that live algorithms read rolling bar windows from instead of the bars endpoint
+        :param universe: snapshot of the active assets, pass one with a path to reuse it across restarts
+        :param trading_calendar: session index, built from the calendar endpoint on first use if not given
+        :param compact: hand out and cache bars as float32 prices and uint32 volumes, see bars.compact
+        :param account_state: local view of the account and positions that cash, buying_power and position read from
+        :param deadline: seconds to wait for a read before giving up on it, reads wait as long as it takes if not given
+        :param hedge: send a read again once it has taken longer than HEDGE_PERCENTILE of its endpoint's recent calls,
+                      and use whichever answer comes first
+        :param circuit_breaker: refuses reads from endpoints that keep failing, a default one is used if not given
+        :param latency: round trip times per endpoint, see LatencyTracker.report
+        """
         if not api or api is None:
             raise BrokerValidationException('[!] API instance required.')
 
         self.api = api
-        self.trading_account = self.get_account()
-        self.cash = self.trading_account.cash
-        self.buying_power = self.trading_account.buying_power
+        self.scheduler = scheduler if scheduler is not None else RequestScheduler.alpaca()
+        self.single_flight = SingleFlight()
+        self.bar_store = bar_store
+        self.bar_cache = bar_cache if bar_cache is not None else BarCache()
+        self.stream = stream
+        self.universe = universe if universe is not None else AssetUniverse()
+        self.trading_calendar = trading_calendar
+        self.compact = compact
+        self.deadline = deadline
+        self.hedge = hedge
+        self.circuit_breaker = circuit_breaker if circuit_breaker is not None else CircuitBreaker()
+        self.latency = latency if latency is not None else LatencyTracker()
+        self._executor = ThreadPoolExecutor(max_workers=BOUNDED_CALL_WORKERS)
+        self.account_state = account_state if account_state is not None else AccountState(self.get_account, self.get_positions)
+        self.account_state.put_account(self.get_account())
         self.original_cash = self.cash
         self.original_buying_power = self.buying_power
-        self.trading_blocked = self.trading_account.trading_blocked
         self.clock = self.get_clock()
 
+    @property
+    def trading_account(self) -> Account:
+        return self.account_state.account()
+
+    @property
+    def cash(self) -> str:
+        return self.trading_account.cash
+
+    @property
+    def buying_power(self) -> str:
+        return self.trading_account.buying_power
+
+    @property
+    def trading_blocked(self) -> bool:
+        return self.trading_account.trading_blocked
+
+    def position(self, symbol: str) -> Position or None:
+        """The open position in a symbol, read from the account state rather than requested.
+
+        :param symbol:
+        :return: the position, or None if there is none
+        """
+        return self.account_state.position(symbol)
+
+    def _call(self, method: str, *args, priority: int = PRIORITY_DATA, deadline: float = None, **kwargs):
+        """Make an API call once the request scheduler gives it a turn.
+
+        Reads are coalesced: threads making the same read at the same time share one request and its result. Reads
+        are also bounded by a deadline and hedged, if the broker was set up to, and reads from an endpoint whose
+        circuit is open fail right away. Orders and liquidations are sent as they are, never refused, hedged or
+        given up on.
+
+        :param method: name of the API method
+        :param args:
+        :param priority: order calls preempt account lookups, which preempt data requests
+        :param deadline: seconds to wait for a read, the broker's deadline if not given
+        :param kwargs:
+        :return:
+        """
+        if method.startswith(IDEMPOTENT_PREFIXES):
+            key = (method,) + SingleFlight.key(*args, **kwargs)
+            return self.single_flight.do(key, self._guarded, method, args, kwargs, priority, deadline)
+        return self._attempt(method, args, kwargs, priority)
+
+    def _guarded(self, method: str, args: tuple, kwargs: dict, priority: int, deadline: float = None):
+        try:
+            self.circuit_breaker.before(method)
+        except BrokerException as err:
+            self.latency.count(method, 'rejected')
+            raise err
+
+        try:
+            result = self._read(method, args, kwargs, priority, deadline)
+        except Exception as err:
+            self.latency.count(method, 'errors')
+            # a 4xx answer still means the endpoint is up
+            if is_endpoint_failure(err):
+                self.circuit_breaker.failure(method)
+            else:
+                self.circuit_breaker.success(method)
+            raise err
+        else:
+            self.circuit_breaker.success(method)
+            return result
+
+    def _attempt(self, method: str, args: tuple, kwargs: dict, priority: int):
+        self.scheduler.acquire(priority=priority)
+        started = time.monotonic()
+        result = getattr(self.api, method)(*args, **kwargs)
+        self.latency.record(method, time.monotonic() - started)
+        return result
+
+    def _read(self, method: str, args: tuple, kwargs: dict, priority: int, deadline: float = None):
+        """Make a read, giving up at the deadline and sending it again if it is slower than usual.
+
+        The API client cannot be interrupted, so a read given up on keeps running on its worker thread and its
+        answer is dropped. So is the slower answer of a hedged read.
+
+        :param method:
+        :param args:
+        :param kwargs:
+        :param priority:
+        :param deadline:
+        :return:
+        """
+        deadline = self.deadline if deadline is None else deadline
+        hedge_after = self.latency.percentile(method, HEDGE_PERCENTILE, HEDGE_MIN_SAMPLES) if self.hedge else None
+        if deadline is None and hedge_after is None:
+            return self._attempt(method, args, kwargs, priority)
+
+        started = time.monotonic()
+        first = self._executor.submit(self._attempt, method, args, kwargs, priority)
+        pending = {first}
+        errors = []
+        while True:
+            now = time.monotonic()
+            waits = [started + seconds - now for seconds in (deadline, hedge_after) if seconds is not None]
+            done, pending = wait(pending, timeout=max(0., min(waits)) if waits else None, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is not first:
+                        self.latency.count(method, 'hedges_won')
+                    return future.result()
+                errors.append(future.exception())
+            if not pending:
+                raise errors[0]
+
+            now = time.monotonic()
+            if hedge_after is not None and now >= started + hedge_after:
+                pending.add(self._executor.submit(self._attempt, method, args, kwargs, priority))
+                self.latency.count(method, 'hedged')
+                hedge_after = None
+            elif deadline is not None and now >= started + deadline:
+                self.latency.count(method, 'timeouts')
+                raise BrokerTimeoutException(f'[!] {method} did not answer within {deadline} seconds.')
+
+    def close(self) -> None:
+        """Shut down the threads running bounded and hedged reads.
+
+        Reads given up on may still be waiting for their answer, they are left to finish on their own.
+
+        :return:
+        """
+        self._executor.shutdown(wait=False)
+
     def _update_position_data(self, ticker: str, timestamp, price: float):
         raise NotImplementedError
 
@@ -31,7 +228,7 @@ class Broker(object):
     """Data grabbing methods"""
     def get_account(self) -> Account:
         try:
-            result = self.api.get_account()
+            result = self._call('get_account', priority=PRIORITY_ACCOUNT)
         except BrokerException as err:
             print('[!] Unable to get account.')
             raise err
@@ -44,7 +241,7 @@ class Broker(object):
         :return:
         """
         try:
-            return self.api.get_clock()
+            return self._call('get_clock', priority=PRIORITY_ACCOUNT)
         except BrokerException as err:
             print('[!] Unable to get the clock.')
             raise err
@@ -54,33 +251,64 @@ class Broker(object):
         Requests Dates data from Alpaca and returns it as a list of Calendar objects.
         """
         try:
-            result = self.api.get_calendar(start_date, end_date)
+            result = self._call('get_calendar', start_date, end_date, priority=PRIORITY_DATA)
         except BrokerException as err:
             print('[!] Unable to get calendar.')
             raise err
         else:
             return result
 
+    def get_trading_calendar(self, start: str = None) -> TradingCalendar:
+        """Get the index of trading sessions, which answers market hours questions without calling the API.
+
+        The calendar is requested once for CALENDAR_YEARS_BACK years before today up to CALENDAR_YEARS_AHEAD years
+        after it, and again only when a question falls outside of that.
+
+        :param start: earliest time the index has to cover
+        :return:
+        """
+        calendar = self.trading_calendar
+        if calendar is None or not calendar.covers() or (start is not None and not calendar.covers(start)):
+            now = pd.Timestamp.now(tz=NY)
+            first = now - pd.DateOffset(years=CALENDAR_YEARS_BACK)
+            if start is not None:
+                first = min(first, to_timestamp(start))
+            last = now + pd.DateOffset(years=CALENDAR_YEARS_AHEAD)
+            self.trading_calendar = TradingCalendar.from_calendar(
+                self.get_calendar(first.strftime('%Y-%m-%d'), last.strftime('%Y-%m-%d')))
+        return self.trading_calendar
+
     def get_assets(self) -> list:
         """Get assets from Alpaca API.
 
         :return:
         """
         try:
-            result = self.api.list_assets(status='active')
+            result = self._call('list_assets', status='active', priority=PRIORITY_DATA)
         except BrokerException as err:
             print('[!] Unable to get assets.')
             raise err
         else:
             return result
 
+    def get_universe(self) -> AssetUniverse:
+        """Get the active assets as a columnar snapshot.
+
+        The assets are only requested from the API when there is no fresh snapshot in memory or on disk.
+
+        :return:
+        """
+        if not self.universe.fresh and not self.universe.load():
+            self.universe.refresh(self.get_assets())
+        return self.universe
+
     def get_asset(self, symbol: str) -> Asset:
         """Get an asset by ticker symbol from the Alpaca API.
 
         :return:
         """
         try:
-            result = self.api.get_asset(symbol=symbol)
+            result = self._call('get_asset', symbol=symbol, priority=PRIORITY_DATA)
         except BrokerException as err:
             print('[!] Unable to get asset.')
             raise err
@@ -93,7 +321,7 @@ class Broker(object):
         :return:
         """
         try:
-            result = self.api.list_positions()
+            result = self._call('list_positions', priority=PRIORITY_ACCOUNT)
         except BrokerException as err:
             print('[!] Unable to get open positions.')
             raise err
@@ -107,7 +335,7 @@ class Broker(object):
         :return:
         """
         try:
-            result = self.api.get_position(symbol)
+            result = self._call('get_position', symbol, priority=PRIORITY_ACCOUNT)
         except BrokerException as err:
             print(f'[!] Unable to get postion or positions for {symbol}.')
             raise err
@@ -120,11 +348,12 @@ class Broker(object):
         :return:
         """
         try:
-            result = self.api.close_all_positions()
+            result = self._call('close_all_positions', priority=PRIORITY_ORDER)
         except BrokerException as err:
             print('[!] An error occurred when liquidating posiitons.')
             raise err
         else:
+            self.account_state.invalidate()
             return result
 
     def close_position(self, symbol: str) -> Order:
@@ -133,11 +362,12 @@ class Broker(object):
         :return:
         """
         try:
-            result = self.api.close_position(symbol)
+            result = self._call('close_position', symbol, priority=PRIORITY_ORDER)
         except BrokerException as err:
             print(f'[!] An error occurred when closing {symbol} posiitons.')
             raise err
         else:
+            self.account_state.order_update(result, sent=True)
             return result
 
     def get_orders(self, status: str = 'open', limit: int = 50, after: str = None, until: str = None, direction: str = 'desc') -> list:
@@ -151,11 +381,13 @@ class Broker(object):
         :return:
         """
         try:
-            result = self.api.list_orders(status=status, limit=limit, after=after, until=until, direction=direction)
+            result = self._call('list_orders', status=status, limit=limit, after=after, until=until, direction=direction, priority=PRIORITY_ACCOUNT)
         except BrokerException as err:
             print(f'[!] Unable to get {status} orders.')
             raise err
         else:
+            for order in result:
+                self.account_state.order_update(order)
             return result
 
     def get_order(self, order_id: str, client_order_id: str = None) -> Order:
@@ -168,7 +400,7 @@ class Broker(object):
         if client_order_id is not None:
             try:
                 print('[+] Getting order by client_order_id.')
-                result = self.api.get_order_by_client_order_id(client_order_id)
+                result = self._call('get_order_by_client_order_id', client_order_id, priority=PRIORITY_ACCOUNT)
             except BrokerException as err:
                 print(f'[!] Unable to get order for client_order_id {client_order_id}.')
                 raise err
@@ -177,10 +409,11 @@ class Broker(object):
                 raise BrokerValidationException('[!] Invalid order_id.')
             try:
                 print('[+] Getting order the normal way by order_id.')
-                result = self.api.get_order(order_id)
+                result = self._call('get_order', order_id, priority=PRIORITY_ACCOUNT)
             except BrokerException as err:
                 print('[!] Unable to get order {}.'.format(order_id))
                 raise err
+        self.account_state.order_update(result)
         return result
 
     def submit_order(self,
@@ -226,7 +459,8 @@ class Broker(object):
             raise BrokerValidationException('[!] stop_price required if transaction_type is stop or stop_limit.')
 
         try:
-            result = self.api.submit_order(
+            result = self._call(
+                'submit_order',
                 symbol,
                 quantity,
                 transaction_side,
@@ -235,11 +469,13 @@ class Broker(object):
                 limit_price,
                 stop_price,
                 # extended_hours,
-                client_order_id)
+                client_order_id,
+                priority=PRIORITY_ORDER)
         except BrokerException as err:
             print(f'[!] Unable to submit {transaction_side} order for {symbol}.')
             raise err
         else:
+            self.account_state.order_update(result, sent=True)
             return result
 
     def replace_order(self,
@@ -276,11 +512,12 @@ class Broker(object):
             raise BrokerValidationException('[!] stop_price required if transaction_type is stop or stop_limit.')
 
         try:
-            result = self.api.replace_order(order_id, quantity, transaction_type, time_in_force, limit_price, stop_price, client_order_id)
+            result = self._call('replace_order', order_id, quantity, transaction_type, time_in_force, limit_price, stop_price, client_order_id, priority=PRIORITY_ORDER)
         except BrokerException as err:
             print('[!] Unable to replace order.')
             raise err
         else:
+            self.account_state.order_update(result, sent=True)
             return result
 
     def cancel_all_orders(self) -> None:
@@ -289,10 +526,13 @@ class Broker(object):
         :return:
         """
         try:
-            self.api.cancel_all_orders()
+            self._call('cancel_all_orders', priority=PRIORITY_ORDER)
         except BrokerException as err:
             print('[!] An error occurred when canceling orders.')
             raise err
+        else:
+            # a partial fill may have come in before the cancel
+            self.account_state.invalidate()
 
     def cancel_order(self, order_id: str) -> None:
         """Cancel order for a given order_id.
@@ -303,35 +543,285 @@ class Broker(object):
             raise BrokerValidationException('[!] Invalid symbol.')
 
         try:
-            self.api.close_position(order_id)
+            self._call('cancel_order', order_id, priority=PRIORITY_ORDER)
         except BrokerException as err:
             print(f'[!] An error occurred when canceling order {order_id}.')
             raise err
+        else:
+            self.account_state.invalidate()
 
     def get_asset_df(self,
                      symbol: str,
                      period: str,
                      limit: int = 1000,
                      start: str = None,
-                     end: str = None) -> pd.DataFrame or None:
+                     end: str = None,
+                     base: str = None) -> pd.DataFrame or None:
         """Get a set of bars from the API given a symbol, a time period and a starting time.
 
+        Bars are served from the bar cache, then the bar store if one is configured, and only what is missing from
+        both is requested from the API.
+
         :param symbol:
         :param period:
         :param limit:
         :param start:
         :param end:
+        :param base: finer period to request and build the bars from locally
+        :return:
+        """
+        return self.get_assets_df([symbol], period, limit=limit, start=start, end=end, base=base)[symbol]
+
+    def get_assets_df(self,
+                      symbols: list,
+                      period: str,
+                      limit: int = 1000,
+                      start: str = None,
+                      end: str = None,
+                      chunk_size: int = BARSET_MAX_SYMBOLS,
+                      max_workers: int = 1,
+                      base: str = None) -> dict:
+        """Get bars for many symbols at once, batching up to chunk_size symbols into each barset request.
+
+        Symbols found in the bar cache are not requested again. With a bar store, the remaining symbols are only
+        requested for what the store is missing, grouped by the request they need.
+
+        :param symbols: ticker symbols to get bars for
+        :param period:
+        :param limit: number of bars per symbol
+        :param start:
+        :param end:
+        :param chunk_size: symbols per request, the API accepts at most 200
+        :param max_workers: number of chunks to request concurrently
+        :param base: finer period to request and build the bars from locally, see get_assets_multi_df
+        :return: dict of symbol -> dataframe, or None if the API returned no bars for that symbol
+        """
+        if base is not None and base != period:
+            return self.get_assets_multi_df(symbols, [period], limit=limit, start=start, end=end, base=base,
+                                            chunk_size=chunk_size, max_workers=max_workers)[period]
+
+        if not symbols or symbols is None:
+            raise BrokerValidationException('[!] At least one symbol is required.')
+
+        if chunk_size < 1 or chunk_size > BARSET_MAX_SYMBOLS:
+            raise BrokerValidationException(f'[!] chunk_size must be between 1 and {BARSET_MAX_SYMBOLS}.')
+
+        symbols = list(symbols)
+
+        # serve whatever this process has already fetched
+        result = dict()
+        for symbol in symbols:
+            found, df = self.bar_cache.get((symbol, period, limit, start, end))
+            if found:
+                result[symbol] = df
+        pending = [symbol for symbol in symbols if symbol not in result]
+        if not pending:
+            return result
+
+        # group symbols by the request they need, stored symbols may only need their tail or nothing at all
+        stored = dict()
+        wanted = {(start, limit): pending}
+        if self.bar_store is not None:
+            wanted = dict()
+            for symbol in pending:
+                stored[symbol] = self.bar_store.read(symbol, period)
+                missing = self.bar_store.missing(*stored[symbol], limit, start=start, end=end, max_limit=BARSET_MAX_LIMIT)
+                if missing is not None:
+                    wanted.setdefault(missing, []).append(symbol)
+
+        jobs = []
+        for (job_start, job_limit), group in wanted.items():
+            for i in range(0, len(group), chunk_size):
+                jobs.append((group[i:i + chunk_size], job_start, job_limit))
+
+        def fetch(job):
+            return job, self._get_barset_chunk(job[0], period, job[2], job[1], end)
+
+        if max_workers > 1 and len(jobs) > 1:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                responses = list(executor.map(fetch, jobs))
+        else:
+            responses = [fetch(job) for job in jobs]
+
+        fetched = dict()
+        if self.bar_store is None:
+            for _, frames in responses:
+                fetched.update(frames)
+        else:
+            for (_, job_start, job_limit), frames in responses:
+                for symbol, fresh in frames.items():
+                    stored[symbol] = self.bar_store.merge(symbol, period, *stored[symbol], fresh, job_start, job_limit, end=end)
+            for symbol in pending:
+                fetched[symbol] = self.bar_store.select(stored[symbol][0], limit, start=start, end=end)
+
+        ttl = self._bar_ttl(period, end)
+        for symbol, df in fetched.items():
+            if self.compact:
+                # the store keeps full precision, only what is held in memory is narrowed
+                df = compact(df)
+            self.bar_cache.put((symbol, period, limit, start, end), df, ttl=ttl)
+            # hand out a copy so callers adding columns don't touch the cached frame
+            result[symbol] = None if df is None else df.copy()
+        return result
+
+    def get_assets_multi_df(self,
+                            symbols: list,
+                            periods: list,
+                            limit: int = 1000,
+                            start: str = None,
+                            end: str = None,
+                            base: str = None,
+                            chunk_size: int = BARSET_MAX_SYMBOLS,
+                            max_workers: int = 1) -> dict:
+        """Get bars for several periods from a single request of the finest one.
+
+        The base period is requested once per symbol (through the bar cache and store as usual) and every other
+        period is aggregated from it locally, aligned to the trading sessions. A request returns at most
+        BARSET_MAX_LIMIT base bars, so when limit bars of a coarse period need more, earlier pages are requested
+        ending where the previous one began, see _page_back.
+
+        :param symbols: ticker symbols to get bars for
+        :param periods: periods to return
+        :param limit: number of bars per symbol and period
+        :param start:
+        :param end:
+        :param base: period to request, the finest of periods if not given
+        :param chunk_size: symbols per request, the API accepts at most 200
+        :param max_workers: number of chunks to request concurrently
+        :return: dict of period -> dict of symbol -> dataframe, or None if the API returned no bars for that symbol
+        """
+        if not periods or periods is None:
+            raise BrokerValidationException('[!] At least one period is required.')
+
+        if base is None:
+            base = min(periods, key=lambda period: PERIOD_SECONDS.get(period, 0))
+        for period in periods:
+            check_base(period, base)
+
+        base_limit = max(limit * bars_per(period, base) for period in periods)
+        frames = self.get_assets_df(symbols, base, limit=min(BARSET_MAX_LIMIT, base_limit), start=start, end=end,
+                                    chunk_size=chunk_size, max_workers=max_workers)
+        if base_limit > BARSET_MAX_LIMIT:
+            frames = self._page_back(frames, base, base_limit, start, chunk_size, max_workers)
+
+        calendar = None
+        first = [df.index[0] for df in frames.values() if df is not None and not df.empty]
+        if first and any(PERIOD_SECONDS[period] != PERIOD_SECONDS[base] for period in periods):
+            calendar = self.get_trading_calendar(start=min(first))
+
+        result = dict()
+        for period in periods:
+            if PERIOD_SECONDS[period] == PERIOD_SECONDS[base]:
+                result[period] = {symbol: None if df is None else df.iloc[-limit:] for symbol, df in frames.items()}
+            else:
+                result[period] = {symbol: None if df is None else resample_bars(df, period, calendar).iloc[-limit:]
+                                  for symbol, df in frames.items()}
+        return result
+
+    def _page_back(self, frames: dict, period: str, limit: int, start: str, chunk_size: int, max_workers: int) -> dict:
+        """Extend frames back in time, one page of at most BARSET_MAX_LIMIT bars at a time, until each holds limit
+        bars or the API has no earlier ones.
+
+        Symbols whose frames begin at the same bar share their page requests.
+
+        :param frames: dict of symbol -> dataframe, the newest page
+        :param period:
+        :param limit: bars wanted per symbol
+        :param start:
+        :param chunk_size:
+        :param max_workers:
+        :return: dict of symbol -> dataframe
+        """
+        frames = dict(frames)
+        # a page shorter than asked for means there is nothing earlier
+        paging = {symbol for symbol, df in frames.items() if df is not None and len(df) >= BARSET_MAX_LIMIT}
+        while paging:
+            groups = dict()
+            for symbol in paging:
+                if len(frames[symbol]) < limit:
+                    groups.setdefault(frames[symbol].index[0], []).append(symbol)
+
+            paging = set()
+            for first, group in groups.items():
+                page_limit = min(BARSET_MAX_LIMIT, max(limit - len(frames[symbol]) for symbol in group))
+                page_end = (first - pd.Timedelta(seconds=1)).isoformat()
+                page = self.get_assets_df(group, period, limit=page_limit, start=start, end=page_end,
+                                          chunk_size=chunk_size, max_workers=max_workers)
+                for symbol in group:
+                    older = page.get(symbol)
+                    if older is None or older.empty:
+                        continue
+                    frames[symbol] = pd.concat([older[older.index < first], frames[symbol]])
+                    if len(older) >= page_limit:
+                        paging.add(symbol)
+        return frames
+
+    """Market data provider methods"""
+    def bars_for(self, symbols: list, period: str = 'day', limit: int = 1000, start: str = None, end: str = None,
+                 base: str = None) -> dict:
+        """Bars of many symbols in the common provider shape, see MarketDataProvider.bars_for.
+
+        Bars built from a base period are aligned to the trading sessions, see get_assets_multi_df.
+
+        :param symbols:
+        :param period:
+        :param limit:
+        :param start:
+        :param end:
+        :param base:
+        :return:
+        """
+        frames = self.get_assets_df(symbols, period, limit=limit, start=start, end=end, base=base)
+        return {symbol: normalize_bars(df) for symbol, df in frames.items()}
+
+    def _bars_for(self, symbols: list, period: str, limit: int, start: str, end: str) -> dict:
+        return self.get_assets_df(symbols, period, limit=limit, start=start, end=end)
+
+    def latest_quotes(self, symbols: list) -> pd.DataFrame:
+        """The newest price of many symbols from one bulk request of their last minute bar.
+
+        The bars endpoint has no bid or ask, so those are NaN and `last` is the close of the newest minute bar.
+
+        :param symbols:
+        :return: dataframe of QUOTE_COLUMNS indexed by symbol
+        """
+        frames = self.get_assets_df(symbols, 'minute', limit=1)
+        quotes = {symbol: (df.index[-1], float('nan'), float('nan'), float(df['close'].iloc[-1]))
+                  for symbol, df in frames.items() if df is not None and not df.empty}
+        return quotes_df(symbols, quotes)
+
+    def _bar_ttl(self, period: str, end: str) -> float or None:
+        """How long a window of bars stays valid in the bar cache.
+
+        Windows ending before the last complete bar never change. Anything reaching the current bar expires quickly.
+
+        :param period:
+        :param end:
+        :return: seconds, or None to cache until evicted
+        """
+        end_ts = to_timestamp(end)
+        if end_ts is not None:
+            bar_close = end_ts + pd.Timedelta(seconds=PERIOD_SECONDS.get(period, PERIOD_SECONDS['day']))
+            if bar_close < pd.Timestamp.now(tz='UTC'):
+                return None
+        return self.bar_cache.live_ttl
+
+    def _get_barset_chunk(self, symbols: list, period: str, limit: int, start: str, end: str) -> dict:
+        """Get one barset request worth of symbols as a dict of symbol -> dataframe.
+
+        :param symbols:
+        :param period:
+        :param limit:
+        :param start:
+        :param end:
         :return:
         """
         try:
-            result = self.api.get_barset(symbol, period, limit=limit, start=start, end=end)
+            result = self._call('get_barset', symbols, period, limit=limit, start=start, end=end, priority=PRIORITY_DATA)
         except BrokerException as err:
-            print(f'[!] Unable to get barset for {symbol}.')
+            print(f'[!] Unable to get barset for {", ".join(symbols)}.')
             raise err
-        if len(result[symbol]) == 0:
-            return None
-        else:
-            return self._bar_df(result[symbol])
+        return {symbol: self._bar_df(result[symbol]) if len(result.get(symbol, [])) > 0 else None for symbol in symbols}
 
     def get_watchlists(self) -> list:
         """Get all watchlists from the Alpaca API.
@@ -341,7 +831,7 @@ class Broker(object):
         :return:
         """
         try:
-            result = self.api.get_watchlists()
+            result = self._call('get_watchlists', priority=PRIORITY_DATA)
         except BrokerException as err:
             print('[!] Unable to get watchlists.')
             raise err
@@ -355,7 +845,7 @@ class Broker(object):
         :return:
         """
         try:
-            result = self.api.get_watchlist(watchlist_id=watchlist_id)
+            result = self._call('get_watchlist', watchlist_id=watchlist_id, priority=PRIORITY_DATA)
         except BrokerException as err:
             print(f'[!] Unable to get watchlist {watchlist_id}.')
             raise err
@@ -369,7 +859,7 @@ class Broker(object):
         :return:
         """
         try:
-            result = self.api.add_watchlist(watchlist_name=watchlist_name)
+            result = self._call('add_watchlist', watchlist_name=watchlist_name, priority=PRIORITY_DATA)
         except BrokerException as err:
             print(f'[!] Unable to add watchlist {watchlist_name}.')
             raise err
@@ -384,7 +874,7 @@ class Broker(object):
         :return:
         """
         try:
-            result = self.api.add_to_watchlist(watchlist_id=watchlist_id, symbol=symbol)
+            result = self._call('add_to_watchlist', watchlist_id=watchlist_id, symbol=symbol, priority=PRIORITY_DATA)
         except BrokerException as err:
             print(f'[!] Unable to add {symbol} to watchlist.')
             raise err
@@ -409,7 +899,7 @@ class Broker(object):
             # let's try looping through and deleting one by one
             for ass in result.assets:
                 try:
-                    self.api.delete_from_watchlist(watchlist_id, ass['symbol'])
+                    self._call('delete_from_watchlist', watchlist_id, ass['symbol'], priority=PRIORITY_DATA)
                 except BrokerException as err:
                     print('[!] Unable to remove this item from the watchlist.')
                     raise err
@@ -421,24 +911,25 @@ class Broker(object):
             return result
 
     @staticmethod
-    def _bar_df(bars: Bars):
+    def _bar_df(bars: Bars) -> pd.DataFrame:
         """Given a collection of candlestick bars, return a dataframe.
         Dataframe should contain keys:
             - time, open, high, low, close, volume
+
+        The raw bar payload is packed into typed numpy columns in one pass instead of walking the Bar
+        entities once per column.
+
         :param bars:
         :return:
         """
-        if bars is None or bars.df.empty:
+        if bars is None or len(bars) == 0:
             raise BrokerValidationException('[!] Bars cannot be none')
 
-        data            = pd.DataFrame(index=[bar.t for bar in bars if bar is not None])
-        data['open']    = [bar.o for bar in bars if bar is not None]
-        data['high']    = [bar.h for bar in bars if bar is not None]
-        data['low']     = [bar.l for bar in bars if bar is not None]
-        data['close']   = [bar.c for bar in bars if bar is not None]
-        data['volume']  = [bar.v for bar in bars if bar is not None]
+        raw = getattr(bars, '_raw', None)
+        if raw is None:
+            raw = [bar._raw for bar in bars if bar is not None]
 
-        return data
+        return records_df(bar_records(raw))
 
     @staticmethod
     def calculate_tolerable_risk(balance: float, risk_pct: float):
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from broker import BrokerException, BrokerTimeoutException, BrokerValidationException
+from requests.exceptions import ConnectionError as RequestsConnectionError, Timeout
+import threading
+import time
+
+
+def is_endpoint_failure(err: BaseException) -> bool:
+    """Whether an error says the endpoint itself is in trouble, rather than that it turned the request down.
+
+    Transport errors, timeouts, server errors and rate limiting count. An answer like 403 insufficient buying power
+    or 404 position does not exist means the endpoint is working.
+
+    :param err:
+    :return:
+    """
+    # APIError carries the status itself, requests' HTTPError on its response
+    status = getattr(err, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(err, 'response', None), 'status_code', None)
+    if status is not None:
+        return status >= 500 or status == 429
+    return isinstance(err, (BrokerTimeoutException, RequestsConnectionError, Timeout, ConnectionError, TimeoutError))
+
+
+class CircuitBreaker:
+
+    def __init__(self, failures: int = 5, reset: float = 30.):
+        """Stop calling an endpoint for a while once it keeps failing.
+
+        After `failures` calls in a row fail or time out, the endpoint's circuit opens and calls to it are refused
+        right away for `reset` seconds, instead of each one waiting out its own deadline. Then a single trial call is
+        let through: if it succeeds the circuit closes again, if it fails the circuit stays open another `reset`.
+        What counts as a failure is up to the caller, see is_endpoint_failure.
+
+        :param failures: consecutive failures that open the circuit
+        :param reset: seconds the circuit stays open
+        """
+        if failures < 1:
+            raise BrokerValidationException('[!] failures must be at least 1.')
+
+        if reset < 0:
+            raise BrokerValidationException('[!] reset cannot be negative.')
+
+        self.failures = failures
+        self.reset = reset
+        # endpoint -> [consecutive failures, monotonic time the circuit opened or None, trial call in flight]
+        self._circuits = dict()
+        self._lock = threading.Lock()
+
+    def before(self, endpoint: str) -> None:
+        """Call before calling an endpoint.
+
+        :param endpoint:
+        :return:
+        """
+        with self._lock:
+            circuit = self._circuits.get(endpoint)
+            if circuit is None or circuit[1] is None:
+                return
+            if time.monotonic() - circuit[1] < self.reset or circuit[2]:
+                raise BrokerException(f'[!] {endpoint} failed {circuit[0]} times in a row, not calling it for now.')
+            circuit[2] = True
+
+    def success(self, endpoint: str) -> None:
+        with self._lock:
+            self._circuits.pop(endpoint, None)
+
+    def failure(self, endpoint: str) -> None:
+        with self._lock:
+            circuit = self._circuits.setdefault(endpoint, [0, None, False])
+            circuit[0] += 1
+            if circuit[2] or circuit[0] >= self.failures:
+                circuit[1] = time.monotonic()
+                circuit[2] = False
+
+    def is_open(self, endpoint: str) -> bool:
+        with self._lock:
+            circuit = self._circuits.get(endpoint)
+            return circuit is not None and circuit[1] is not None
@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from broker import BrokerException, BrokerValidationException
+from contextlib import contextmanager
+from requests.adapters import HTTPAdapter
+import functools
+import threading
+import queue
+import time
+
+# seconds a caller waits for a client before giving up, all of them being checked out
+CHECKOUT_TIMEOUT = 60.
+
+
+class Nonce:
+
+    def __init__(self):
+        """A strictly increasing nonce shared by every client signing with the same API key.
+
+        krakenex uses the current time in milliseconds, so two clients signing within the same millisecond send
+        the same nonce and Kraken rejects the second request. This hands out the current time in milliseconds, or
+        one more than the last nonce if the clock has not moved on since.
+        """
+        self.last = 0
+        self._lock = threading.Lock()
+
+    def __call__(self) -> int:
+        with self._lock:
+            self.last = max(int(1000 * time.time()), self.last + 1)
+            return self.last
+
+
+def _alpaca_client(key_id, secret_key, base_url, api_version):
+    from alpaca_trade_api.rest import REST
+    return REST(key_id=key_id, secret_key=secret_key, base_url=base_url, api_version=api_version)
+
+
+def _kraken_client(key, secret, tier, nonce):
+    from pykrakenapi.pykrakenapi import KrakenAPI
+    import krakenex
+    api = krakenex.API(key=key, secret=secret)
+    api._nonce = nonce
+    return KrakenAPI(api, tier=tier)
+
+
+def _session(client):
+    """The requests session a client sends through, if it has one."""
+    for holder in (client, getattr(client, 'api', None)):
+        for name in ('_session', 'session'):
+            session = getattr(holder, name, None)
+            if session is not None and hasattr(session, 'mount'):
+                return session
+    return None
+
+
+def _mount(client, adapter) -> None:
+    """Mount a new adapter made by `adapter` on a client's session, if it has one."""
+    session = _session(client)
+    if session is not None:
+        adapter = adapter()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+
+
+class ClientPool:
+
+    def __init__(self, factory, size: int = 4, timeout: float = CHECKOUT_TIMEOUT):
+        """API clients for concurrent use, each one used by a single thread at a time.
+
+        Neither alpaca_trade_api's REST nor krakenex's API can be shared across threads: both send every request
+        through one requests session, and krakenex also signs with a nonce of its own. The pool creates up to `size`
+        clients with `factory` as they are needed and checks them out to one caller at a time. Returned clients keep
+        their sessions, so their keep-alive connections are reused by the next caller instead of opening new ones.
+
+        A pool can stand in for a single client: calling an API method on it checks out a client, makes the call and
+        returns the client, so Broker, KrakDealer and PortfolioManager take a pool wherever they take an api.
+
+        :param factory: callable creating a new client
+        :param size: maximum number of clients, and so of calls in flight at once
+        :param timeout: seconds to wait for a client when all of them are checked out
+        """
+        if factory is None or not callable(factory):
+            raise BrokerValidationException('[!] Client factory required.')
+
+        if size < 1:
+            raise BrokerValidationException('[!] size must be at least 1.')
+
+        self.factory = factory
+        self.size = size
+        self.timeout = timeout
+        self.created = 0
+        # a client is only used by one thread at a time, one connection per host is all it keeps alive
+        self._adapter = functools.partial(HTTPAdapter, pool_connections=1, pool_maxsize=1)
+        self._clients = []
+        # last in, first out: the most recently used client is the one whose connections are still open
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def alpaca(cls, key_id: str, secret_key: str, base_url: str, api_version: str = 'v2', size: int = 4):
+        """A pool of Alpaca REST clients.
+
+        :param key_id:
+        :param secret_key:
+        :param base_url:
+        :param api_version:
+        :param size:
+        :return:
+        """
+        return cls(functools.partial(_alpaca_client, key_id, secret_key, base_url, api_version), size=size)
+
+    @classmethod
+    def kraken(cls, key: str, secret: str, tier: str = 'Starter', size: int = 4):
+        """A pool of pykrakenapi clients signing with one shared Nonce.
+
+        Concurrent private calls can still reach Kraken out of order, set a nonce window on the API key to have
+        those accepted.
+
+        :param key:
+        :param secret:
+        :param tier:
+        :param size:
+        :return:
+        """
+        return cls(functools.partial(_kraken_client, key, secret, tier, Nonce()), size=size)
+
+    def _new_client(self):
+        client = self.factory()
+        # registered first, so a mount() from now on reaches this client too
+        with self._lock:
+            self._clients.append(client)
+            adapter = self._adapter
+        _mount(client, adapter)
+        return client
+
+    def mount(self, adapter) -> None:
+        """Send the requests of every client, those created later included, through an adapter of its own.
+
+        :param adapter: callable creating a new requests HTTPAdapter
+        :return:
+        """
+        with self._lock:
+            self._adapter = adapter
+            clients = list(self._clients)
+        for client in clients:
+            _mount(client, adapter)
+
+    def checkout(self):
+        """Take a client, creating one if none is idle and the pool is not full yet.
+
+        :return:
+        """
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            create = self.created < self.size
+            if create:
+                self.created += 1
+        if create:
+            try:
+                return self._new_client()
+            except BaseException as error:
+                with self._lock:
+                    self.created -= 1
+                raise error
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise BrokerException(f'[!] No API client came free within {self.timeout} seconds.')
+
+    def checkin(self, client) -> None:
+        """Give a checked out client back.
+
+        :param client:
+        :return:
+        """
+        self._idle.put(client)
+
+    @contextmanager
+    def client(self):
+        """Check out a client for the duration of a with block.
+
+        :return:
+        """
+        client = self.checkout()
+        try:
+            yield client
+        finally:
+            self.checkin(client)
+
+    def close(self) -> None:
+        """Close the sessions of the idle clients.
+
+        :return:
+        """
+        while True:
+            try:
+                client = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            session = _session(client)
+            if session is not None:
+                session.close()
+            with self._lock:
+                self._clients.remove(client)
+                self.created -= 1
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        with self.client() as client:
+            attribute = getattr(client, name)
+        if not callable(attribute):
+            # plain settings like KrakenAPI's tier limit are the same on every client
+            return attribute
+
+        @functools.wraps(attribute)
+        def call(*args, **kwargs):
+            with self.client() as client:
+                return getattr(client, name)(*args, **kwargs)
+        return call
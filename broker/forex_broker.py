@@ -1,12 +1,75 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 from broker import BrokerException, BrokerValidationException
+from broker.rolling_bars import RollingBars
+from broker.rolling_ticks import RollingTicks
+from broker.market_data import MarketDataProvider, quotes_df
+from broker.bars import PERIOD_SECONDS, to_timestamp
+from broker.bar_store import BarStore
+from concurrent.futures import ThreadPoolExecutor
+from v20.errors import V20ConnectionError, V20Timeout
+import pandas as pd
+import threading
+import json
+import time
+import v20
 
+# pricing streams are served from their own hosts
+STREAM_HOSTS = {
+    'api-fxtrade.oanda.com':    'stream-fxtrade.oanda.com',
+    'api-fxpractice.oanda.com': 'stream-fxpractice.oanda.com',
+}
 
-class ForexBroker:
+# v20 candle granularity for each bar length in seconds
+GRANULARITIES = {60: 'M1', 300: 'M5', 900: 'M15', 86400: 'D'}
 
-    def __init__(self, api, pair):
+# most candles one candles request returns
+CANDLES_MAX_COUNT = 5000
 
+
+def _nanoseconds(value: str) -> int:
+    # prices carry RFC3339 times, or unix seconds with a 9 digit fraction when the context asks for UNIX datetimes
+    if 'T' in value:
+        return pd.Timestamp(value).value
+    seconds, _, fraction = value.partition('.')
+    return int(seconds) * 10 ** 9 + int(fraction.ljust(9, '0')[:9])
+
+
+def _rfc3339(value) -> str:
+    return to_timestamp(value).tz_convert('UTC').strftime('%Y-%m-%dT%H:%M:%S.%f000Z')
+
+
+class ForexBroker(MarketDataProvider):
+
+    def __init__(self,
+                 api,
+                 pair,
+                 account_id: str = None,
+                 stream_api=None,
+                 tick_size: int = 1000,
+                 bar_size: int = 100,
+                 period: str = 'minute',
+                 record_path: str = None,
+                 retries: int = 3,
+                 retry_wait: float = 3.):
+        """Trade forex through Oanda's v20 API, with prices kept locally from the v20 pricing stream.
+
+        Once started, a background thread reads the pricing stream and pushes every price into a ring buffer of
+        ticks per instrument, and at the same time folds its mid price into rolling bars of `period`, so
+        strategies read local state instead of polling candles. Forex has no traded volume, bar volumes count ticks.
+
+        :param api: v20 Context for the REST host
+        :param pair: instrument to trade, or a list (or comma-separated string) of instruments, the first one is traded
+        :param account_id: v20 account, the first account of the token if not given
+        :param stream_api: v20 Context for the streaming host, point this at a testing.fake_oanda.PriceReplayServer to
+                           replay prices
+        :param tick_size: ticks kept per instrument
+        :param bar_size: bars kept per instrument
+        :param period: timeframe of the bars
+        :param record_path: optional file every streamed price is appended to, for replaying later
+        :param retries: reconnect attempts before giving up
+        :param retry_wait: seconds between reconnect attempts
+        """
         if not api or api is None:
             raise BrokerValidationException('[!] API instance required.')
 
@@ -14,16 +77,299 @@ class ForexBroker:
             raise BrokerValidationException('[!] Trading instrument required.')
 
         self.api = api
-        self.pair = pair
+        self.pairs = [p.strip() for p in (pair.split(',') if isinstance(pair, str) else pair) if p and p.strip()]
+        self.pair = self.pairs[0]
+        self.stream_api = stream_api if stream_api is not None else api
+        self.tick_size = tick_size
+        self.bar_size = bar_size
+        self.period = period
+        self.record_path = record_path
+        self.retries = retries
+        self.retry_wait = retry_wait
+
+        self.ticks = dict()
+        self.windows = dict()
+        self.messages = 0
+        self._thread = None
+        self._running = False
+        self.subscribe(self.pairs)
+
+        self.account_id = account_id if account_id is not None else self._default_account()
         self.trading_account = self.get_account()
         self.trade_balance = self.get_trade_balance(asset=self.pair)
         self.trading_blocked = self.is_trading_blocked()
 
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    @staticmethod
+    def _field(response, field: str):
+        if str(response.status) != '200':
+            raise BrokerException('[!] {} {} failed: {} {}.'.format(response.method, response.path, response.status,
+                                                                    response.reason))
+        return response.get(field, 200)
+
+    def _default_account(self) -> str:
+        try:
+            accounts = self._field(self.api.account.list(), 'accounts')
+        except (V20ConnectionError, V20Timeout) as error:
+            raise error
+        if len(accounts) < 1:
+            raise BrokerException('[!] No v20 account found for this token.')
+        return accounts[0].id
+
     def get_account(self):
-        raise NotImplementedError
+        """Get our trading account.
+
+        :return:
+        """
+        try:
+            result = self._field(self.api.account.get(self.account_id), 'account')
+        except (V20ConnectionError, V20Timeout) as error:
+            raise error
+        else:
+            return result
 
     def get_trade_balance(self, asset):
-        raise NotImplementedError
+        """Get the margin available to open new positions, in the account's home currency.
+
+        :param asset:
+        :return:
+        """
+        if not asset or asset is None:
+            raise BrokerValidationException("[!] Invalid asset.")
+
+        try:
+            result = self._field(self.api.account.summary(self.account_id), 'account')
+        except (V20ConnectionError, V20Timeout) as error:
+            raise error
+        else:
+            return float(result.marginAvailable)
 
     def is_trading_blocked(self):
         return True if self.trade_balance <= 0 else False
+
+    """Pricing stream"""
+    def subscribe(self, instruments: list) -> None:
+        """Start keeping ticks and bars for instruments. The stream is reopened if it is running.
+
+        :param instruments:
+        :return:
+        """
+        new = [instrument for instrument in instruments if instrument not in self.ticks]
+        for instrument in new:
+            self.ticks[instrument] = RollingTicks(self.tick_size)
+            self.windows[instrument] = RollingBars(self.bar_size, self.period)
+
+        if new and self._running:
+            self.stop()
+            self.start()
+
+    def start(self) -> None:
+        """Open the pricing stream for every subscribed instrument and start reading it in the background.
+
+        :return:
+        """
+        response = self._open()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, args=(response,), daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = None) -> None:
+        """Stop reading the stream. The reader notices at the next price or heartbeat, which Oanda sends every 5s.
+
+        :param timeout: seconds to wait for the reader, the stream timeout of the context if not given
+        :return:
+        """
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout if timeout is not None else getattr(self.stream_api, 'stream_timeout', 10))
+        self._thread = None
+
+    def quote(self, instrument: str) -> tuple or None:
+        """The newest (time, bid, ask) quote of an instrument.
+
+        :param instrument:
+        :return:
+        """
+        ticks = self.ticks.get(instrument)
+        return None if ticks is None else ticks.last()
+
+    def tick_frame(self, instrument: str) -> pd.DataFrame or None:
+        """The buffered ticks of an instrument as a dataframe of bid, ask, mid and spread.
+
+        :param instrument:
+        :return:
+        """
+        ticks = self.ticks.get(instrument)
+        if ticks is None or len(ticks) == 0:
+            return None
+        return ticks.df()
+
+    def frame(self, instrument: str) -> pd.DataFrame or None:
+        """The bars built from an instrument's mid prices as an OHLCV dataframe.
+
+        :param instrument:
+        :return:
+        """
+        window = self.windows.get(instrument)
+        if window is None or len(window) == 0:
+            return None
+        return window.df()
+
+    def frames(self, instruments: list) -> dict:
+        """Bars for many instruments, shaped like Broker.get_assets_df results.
+
+        :param instruments:
+        :return:
+        """
+        return {instrument: self.frame(instrument) for instrument in instruments}
+
+    """Market data provider methods"""
+    def _bars_for(self, symbols: list, period: str, limit: int, start: str, end: str, max_workers: int = 4) -> dict:
+        """Bars from the stream's rolling windows when it runs with this period, mid price candles otherwise.
+
+        :param symbols:
+        :param period:
+        :param limit:
+        :param start:
+        :param end:
+        :param max_workers: number of instruments to request candles for at the same time
+        :return:
+        """
+        if period not in PERIOD_SECONDS or PERIOD_SECONDS[period] not in GRANULARITIES:
+            raise BrokerValidationException(f'[!] Oanda has no {period} candles.')
+
+        if self._running and PERIOD_SECONDS[period] == PERIOD_SECONDS[self.period] and \
+                all(instrument in self.windows for instrument in symbols):
+            return {instrument: BarStore.select(self.frame(instrument), limit, start=start, end=end)
+                    for instrument in symbols}
+
+        def fetch(instrument):
+            return BarStore.select(self.get_candles(instrument, period, limit, start, end), limit, start=start, end=end)
+
+        if max_workers > 1 and len(symbols) > 1:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                frames = list(executor.map(fetch, symbols))
+        else:
+            frames = [fetch(instrument) for instrument in symbols]
+        return dict(zip(symbols, frames))
+
+    def get_candles(self, instrument: str, period: str, limit: int = 500, start: str = None, end: str = None):
+        """Mid price candles of an instrument.
+
+        :param instrument:
+        :param period: one of the bars endpoint timeframes with a v20 granularity, see GRANULARITIES
+        :param limit: number of candles, when start and end are not both given
+        :param start:
+        :param end:
+        :return: OHLCV dataframe, volumes count ticks
+        """
+        params = {'granularity': GRANULARITIES[PERIOD_SECONDS[period]], 'price': 'M'}
+        if start is not None:
+            params['fromTime'] = _rfc3339(start)
+        if end is not None:
+            params['toTime'] = _rfc3339(end)
+        if start is None or end is None:
+            params['count'] = min(limit, CANDLES_MAX_COUNT)
+
+        try:
+            candles = self._field(self.api.instrument.candles(instrument, **params), 'candles')
+        except (V20ConnectionError, V20Timeout) as error:
+            raise error
+
+        if not candles:
+            return None
+        index = pd.to_datetime([_nanoseconds(candle.time) for candle in candles], utc=True)
+        return pd.DataFrame({
+            'open':     [candle.mid.o for candle in candles],
+            'high':     [candle.mid.h for candle in candles],
+            'low':      [candle.mid.l for candle in candles],
+            'close':    [candle.mid.c for candle in candles],
+            'volume':   [candle.volume for candle in candles],
+        }, index=index, columns=['open', 'high', 'low', 'close', 'volume'])
+
+    def latest_quotes(self, symbols: list) -> pd.DataFrame:
+        """Newest quote of many instruments: from the stream's ticks where it has them, one pricing request for the rest.
+
+        :param symbols:
+        :return: dataframe of QUOTE_COLUMNS indexed by instrument, `last` is the mid price
+        """
+        quotes = {}
+        for instrument in symbols:
+            quote = self.quote(instrument)
+            if quote is not None:
+                t, bid, ask = quote
+                quotes[instrument] = (t, bid, ask, (bid + ask) / 2.)
+
+        missing = [instrument for instrument in symbols if instrument not in quotes]
+        if missing:
+            try:
+                prices = self._field(self.api.pricing.get(self.account_id, instruments=','.join(missing)), 'prices')
+            except (V20ConnectionError, V20Timeout) as error:
+                raise error
+            for price in prices:
+                bid = float(price.bids[0].price if price.bids else price.closeoutBid)
+                ask = float(price.asks[0].price if price.asks else price.closeoutAsk)
+                t = pd.Timestamp(_nanoseconds(price.time), tz='UTC')
+                quotes[price.instrument] = (t, bid, ask, (bid + ask) / 2.)
+
+        return quotes_df(symbols, quotes)
+
+    def _open(self):
+        try:
+            response = self.stream_api.pricing.stream(self.account_id, instruments=','.join(self.ticks), snapshot=True)
+        except (V20ConnectionError, V20Timeout) as error:
+            raise error
+        if str(response.status) != '200':
+            raise BrokerException('[!] Unable to open the pricing stream: {} {}.'.format(response.status, response.reason))
+        return response
+
+    def _run(self, response) -> None:
+        while self._running:
+            try:
+                for msg_type, msg in response.parts():
+                    if not self._running:
+                        return
+                    if msg_type == 'pricing.ClientPrice':
+                        self._handle(msg)
+            except (V20ConnectionError, V20Timeout):
+                pass
+            if not self._running:
+                return
+            response = self._reconnect()
+            if response is None:
+                return
+
+    def _reconnect(self):
+        for attempt in range(self.retries):
+            print(f'[!] Pricing stream disconnected, reconnecting ({attempt + 1}/{self.retries}).')
+            time.sleep(self.retry_wait)
+            try:
+                return self._open()
+            except (V20ConnectionError, V20Timeout, BrokerException):
+                continue
+        print('[!] Unable to reconnect to the pricing stream.')
+        self._running = False
+        return None
+
+    def _handle(self, price) -> None:
+        ticks = self.ticks.get(price.instrument)
+        if ticks is None:
+            return
+
+        if self.record_path is not None:
+            with open(self.record_path, 'a') as fh:
+                fh.write(json.dumps(price.dict()) + '\n')
+
+        bid = float(price.bids[0].price if price.bids else price.closeoutBid)
+        ask = float(price.asks[0].price if price.asks else price.closeoutAsk)
+        mid = (bid + ask) / 2.
+        t = _nanoseconds(price.time)
+        ticks.push(t, bid, ask)
+        self.windows[price.instrument].push(t, mid, mid, mid, mid, 1)
+        self.messages += 1
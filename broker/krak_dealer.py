@@ -2,24 +2,166 @@
 # -*- coding: utf-8 -*-
 from pykrakenapi.pykrakenapi import KrakenAPIError
 from broker import BrokerException, BrokerValidationException
+from broker.scheduler import RequestScheduler, PRIORITY_ACCOUNT, PRIORITY_DATA
+from broker.bar_store import BarStore
+from broker.order_book import OrderBook
+from broker.market_data import MarketDataProvider, normalize_bars, quotes_df
+from broker.bars import PERIOD_SECONDS
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import numpy as np
+import threading
+import math
 
+# pairs per comma-joined ticker request, keeps the query string well inside URL length limits
+TICKER_MAX_PAIRS = 100
 
-class KrakDealer:
+# the OHLC endpoint answers with at most this many candles, however far back `since` points
+OHLC_MAX_ROWS = 720
 
-    def __init__(self, api, pair):
+# candles kept per pair and interval, in memory and in the bar store, older ones are dropped
+OHLC_RETENTION_ROWS = 4 * OHLC_MAX_ROWS
 
+# candle lengths in minutes the OHLC endpoint accepts
+OHLC_INTERVALS = (1, 5, 15, 30, 60, 240, 1440, 10080, 21600)
+
+OHLC_DTYPES = {
+    'time':     'int64',
+    'open':     'float64',
+    'high':     'float64',
+    'low':      'float64',
+    'close':    'float64',
+    'vwap':     'float64',
+    'volume':   'float64',
+    'count':    'int64',
+}
+
+# the trades endpoint answers with at most this many trades per call
+TRADES_MAX_ROWS = 1000
+
+TRADE_BAR_COLUMNS = ['open', 'high', 'low', 'close', 'vwap', 'volume', 'count']
+
+# bars a trade aggregator keeps per interval, in memory and in the bar store, older ones are dropped
+TRADE_BARS_MAX_ROWS = 5000
+
+
+class KrakDealer(MarketDataProvider):
+
+    def __init__(self, api, pair, scheduler: RequestScheduler = None, public_scheduler: RequestScheduler = None,
+                 bar_store: BarStore = None, ohlc_retention: int = OHLC_RETENTION_ROWS):
+        """
+        :param api: pykrakenapi KrakenAPI instance, or a ClientPool of them for use from many threads at once
+        :param pair: pair to trade, or a list (or comma-separated string) of pairs to watch, the first one is traded
+        :param scheduler: rate limiter for private calls, defaults to the call counter of the api's tier
+        :param public_scheduler: rate limiter for public market data calls, defaults to one call per second
+        :param bar_store: optional local store the OHLC candles and their `since` cursor are kept in across restarts
+        :param ohlc_retention: newest candles kept per pair and interval, at least OHLC_MAX_ROWS
+        """
         if not api or api is None:
             raise BrokerValidationException('[!] API instance required.')
 
         if not pair or pair is None:
             raise BrokerValidationException('[!] Trading instrument required.')
 
+        if ohlc_retention < OHLC_MAX_ROWS:
+            raise BrokerValidationException(f'[!] ohlc_retention must be at least {OHLC_MAX_ROWS}.')
+
         self.api = api
-        self.pair = pair
+        self.pairs = self._pair_list(pair)
+        self.pair = self.pairs[0]
+
+        if scheduler is None:
+            # KrakenAPI keeps its tier as a counter limit and the seconds it takes the counter to drop by one
+            limit = getattr(api, 'limit', 15)
+            scheduler = RequestScheduler.kraken(
+                limit=limit if not math.isinf(limit) else 1e9,
+                decay=1. / getattr(api, 'factor', 3))
+        self.scheduler = scheduler
+        self.public_scheduler = public_scheduler if public_scheduler is not None else RequestScheduler.kraken_public()
+
+        # (pair, interval) -> (candles oldest first, `last` cursor of the OHLC endpoint)
+        self.bar_store = bar_store
+        self.ohlc_retention = ohlc_retention
+        self._ohlc = {}
+        self._ohlc_locks = {}
+
+        # pair -> local L2 book, see get_book
+        self.books = {}
+
+        # (pair, intervals) -> TradeAggregator, see get_trade_bars
+        self._aggregators = {}
+
         self.trading_account = self.get_account()
         self.trade_balance = self.get_trade_balance(asset=self.pair)
         self.trading_blocked = self.is_trading_blocked()
-        self.pairs = [p for p in self.trading_account.axes]
+
+    @staticmethod
+    def _pair_list(pairs) -> list:
+        if isinstance(pairs, str):
+            pairs = pairs.split(',')
+        return [p.strip() for p in pairs if p and p.strip()]
+
+    def add_pair(self, pair) -> None:
+        """Start watching a pair.
+
+        :param pair:
+        :return:
+        """
+        if not pair or pair is None:
+            raise BrokerValidationException("[!] Invalid asset pair.")
+
+        if pair not in self.pairs:
+            self.pairs.append(pair)
+
+    def remove_pair(self, pair) -> None:
+        """Stop watching a pair and drop what is cached for it.
+
+        :param pair:
+        :return:
+        """
+        if pair == self.pair:
+            raise BrokerValidationException('[!] Cannot stop watching the traded pair.')
+
+        if pair in self.pairs:
+            self.pairs.remove(pair)
+        self.books.pop(pair, None)
+        for key in [key for key in self._ohlc if key[0] == pair]:
+            del self._ohlc[key]
+        for key in [key for key in self._aggregators if key[0] == pair]:
+            del self._aggregators[key]
+
+    def _for_pairs(self, method, pairs, max_workers: int, **kwargs) -> dict:
+        """Run a per-pair dealer method for many pairs, max_workers at a time.
+
+        Calls still go through the public scheduler, so running them concurrently overlaps their round trips
+        without going over the call budget.
+
+        :param method: dealer method taking a pair as first argument
+        :param pairs:
+        :param max_workers:
+        :param kwargs:
+        :return: pair -> result
+        """
+        pairs = self._pair_list(pairs)
+        if max_workers > 1 and len(pairs) > 1:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                results = list(executor.map(lambda pair: method(pair, **kwargs), pairs))
+        else:
+            results = [method(pair, **kwargs) for pair in pairs]
+        return dict(zip(pairs, results))
+
+    def _call(self, method: str, *args, priority: int = PRIORITY_DATA, public: bool = True, **kwargs):
+        """Make an API call once the matching request scheduler gives it a turn.
+
+        :param method: name of the API method
+        :param args:
+        :param priority:
+        :param public: public endpoints are limited separately from private ones
+        :param kwargs:
+        :return:
+        """
+        scheduler = self.public_scheduler if public else self.scheduler
+        return scheduler.call(getattr(self.api, method), *args, priority=priority, **kwargs)
 
     def get_server_time(self):
         """Get the current time from the Kraken server.
@@ -27,7 +169,7 @@ class KrakDealer:
         :return:
         """
         try:
-            result = self.api.get_server_time()
+            result = self._call('get_server_time', priority=PRIORITY_DATA)
         except KrakenAPIError as error:
             raise error
         else:
@@ -39,7 +181,7 @@ class KrakDealer:
         :return:
         """
         try:
-            result = self.api.get_account_balance()
+            result = self._call('get_account_balance', priority=PRIORITY_ACCOUNT, public=False)
         except KrakenAPIError as error:
             raise error
         else:
@@ -55,7 +197,7 @@ class KrakDealer:
             raise BrokerValidationException("[!] Invalid asset.")
 
         try:
-            result = self.api.get_trade_balance(asset=asset)
+            result = self._call('get_trade_balance', asset=asset, priority=PRIORITY_ACCOUNT, public=False)
         except KrakenAPIError as error:
             raise error
         else:
@@ -72,47 +214,188 @@ class KrakDealer:
         :return:
         """
         try:
-            result = self.api.get_tradable_asset_pairs(info=info, pair=pair)
+            result = self._call('get_tradable_asset_pairs', info=info, pair=pair, priority=PRIORITY_DATA)
         except KrakenAPIError as error:
             raise error
         else:
             return result
 
     def get_ticker_information(self, pair):
-        """Get recent ticker info for a given asset pair.
+        """Get recent ticker info for one or more asset pairs.
 
-        :param pair:
-        :return:
+        :param pair: a pair, or a list (or comma-separated string) of pairs queried together
+        :return: dataframe with one row per pair
         """
         if not pair or pair is None:
             raise BrokerValidationException("[!] Invalid asset pair.")
 
         try:
-            result = self.api.get_ticker_information(pair=pair)
+            result = self._call('get_ticker_information', pair=','.join(self._pair_list(pair)), priority=PRIORITY_DATA)
         except KrakenAPIError as error:
             raise error
         else:
             return result
 
+    def get_tickers(self, pairs=None):
+        """Get recent ticker info for every watched pair, TICKER_MAX_PAIRS pairs per request.
+
+        :param pairs: pairs to query instead of the watched ones
+        :return: dataframe with one row per pair
+        """
+        pairs = self._pair_list(pairs if pairs is not None else self.pairs)
+        if len(pairs) < 1:
+            raise BrokerValidationException("[!] No asset pairs to query.")
+
+        frames = [self.get_ticker_information(pairs[i:i + TICKER_MAX_PAIRS])
+                  for i in range(0, len(pairs), TICKER_MAX_PAIRS)]
+        return frames[0] if len(frames) == 1 else pd.concat(frames)
+
     def get_ohlc_data(self, pair, interval=1, since=None, ascending=False):
         """Get an OHLC formatted data frame for a given asset pair.
 
+        Without `since`, candles are served from a per-pair cache that remembers the `last` cursor Kraken hands back,
+        so only candles committed since the previous call are requested. Only the most recent `ohlc_retention`
+        candles per pair and interval are kept, OHLC_RETENTION_ROWS by default, and the newest OHLC_MAX_ROWS of them
+        are returned, like the endpoint itself does.
+
         :param pair:
         :param interval:
-        :param since:
+        :param since: ask the API for candles after this unixtime directly, bypassing the cache
         :param ascending:
-        :return:
+        :return: an (ohlc, last) tuple
+        """
+        if not pair or pair is None:
+            raise BrokerValidationException("[!] Invalid asset pair.")
+
+        if since is None:
+            return self._sync_ohlc(pair, interval, ascending)
+
+        try:
+            result = self._call('get_ohlc_data', pair, interval=interval, since=since, ascending=ascending, priority=PRIORITY_DATA)
+        except KrakenAPIError as error:
+            raise error
+        else:
+            return result
+
+    def _sync_ohlc(self, pair, interval, ascending) -> tuple:
+        """Bring the cached candles of a pair up to date from the `last` cursor and return them.
+
+        The candle that is still forming is always part of the answer, so fresh candles replace cached ones with the
+        same time. If the cursor is older than the window the endpoint serves, the history keeps a gap.
+
+        :param pair:
+        :param interval:
+        :param ascending:
+        :return: an (ohlc, last) tuple
+        """
+        key = (pair, interval)
+        with self._ohlc_locks.setdefault(key, threading.Lock()):
+            df, last = self._cached_ohlc(pair, interval)
+
+            try:
+                fresh, last = self._call('get_ohlc_data', pair, interval=interval, since=last, ascending=True,
+                                         priority=PRIORITY_DATA)
+            except KrakenAPIError as error:
+                raise error
+
+            if not fresh.empty:
+                fresh = fresh.astype(OHLC_DTYPES)
+                df = fresh if df is None else pd.concat([df[~df.index.isin(fresh.index)], fresh]).sort_index()
+                # a long running dealer would otherwise hold and rewrite its whole uptime of candles
+                df = df.iloc[-self.ohlc_retention:]
+                if self.bar_store is not None:
+                    stored = df.copy()
+                    stored.index = stored.index.tz_localize('UTC')
+                    self.bar_store.write(pair, self._ohlc_period(interval), stored, {'last': last})
+            elif df is None:
+                df = fresh
+            self._ohlc[key] = (df, last)
+
+        result = df.iloc[-OHLC_MAX_ROWS:]
+        return (result if ascending else result.iloc[::-1]), last
+
+    def _cached_ohlc(self, pair, interval) -> tuple:
+        key = (pair, interval)
+        if key not in self._ohlc:
+            df, last = None, None
+            if self.bar_store is not None:
+                df, meta = self.bar_store.read(pair, self._ohlc_period(interval))
+                if df is not None:
+                    # pykrakenapi indexes candles by naive UTC time
+                    df = df.iloc[-self.ohlc_retention:]
+                    df.index = df.index.tz_convert('UTC').tz_localize(None).rename('dtime')
+                    last = meta['last']
+            self._ohlc[key] = (df, last)
+        return self._ohlc[key]
+
+    @staticmethod
+    def _ohlc_period(interval) -> str:
+        return '{}Min'.format(interval)
+
+    def refresh_ohlc(self, pairs=None, interval=1, max_workers: int = 4) -> dict:
+        """Bring the cached OHLC candles of many pairs up to date concurrently, see get_ohlc_data.
+
+        :param pairs: pairs to refresh instead of the watched ones
+        :param interval:
+        :param max_workers: number of pairs to refresh at the same time
+        :return: pair -> candles, oldest first
+        """
+        results = self._for_pairs(self.get_ohlc_data, pairs if pairs is not None else self.pairs, max_workers,
+                                  interval=interval, ascending=True)
+        return {pair: ohlc for pair, (ohlc, _) in results.items()}
+
+    def get_recent_trades(self, pair, since=None, ascending=False):
+        """Get recent trades for a given asset pair.
+
+        :param pair:
+        :param since: return trades after this cursor, the `last` value of a previous call
+        :param ascending:
+        :return: a (trades, last) tuple
         """
         if not pair or pair is None:
             raise BrokerValidationException("[!] Invalid asset pair.")
 
         try:
-            result = self.api.get_ohlc_data(pair, interval=interval, since=since, ascending=ascending)
+            result = self._call('get_recent_trades', pair, since=since, ascending=ascending, priority=PRIORITY_DATA)
         except KrakenAPIError as error:
             raise error
         else:
             return result
 
+    def get_trade_bars(self, pair, intervals=(60,)) -> dict:
+        """Bars of a pair built from its trades, brought up to date with the trades since the previous call.
+
+        :param pair:
+        :param intervals: bar lengths in seconds
+        :return: interval -> bars, see TradeAggregator
+        """
+        key = (pair, tuple(intervals))
+        if key not in self._aggregators:
+            self._aggregators[key] = TradeAggregator(self, pair, intervals=intervals, bar_store=self.bar_store)
+        return self._aggregators[key].update()
+
+    """Market data provider methods"""
+    def _bars_for(self, symbols: list, period: str, limit: int, start: str, end: str) -> dict:
+        if period not in PERIOD_SECONDS or PERIOD_SECONDS[period] // 60 not in OHLC_INTERVALS:
+            raise BrokerValidationException(f'[!] Kraken has no {period} candles.')
+
+        frames = self.refresh_ohlc(symbols, interval=PERIOD_SECONDS[period] // 60)
+        return {pair: BarStore.select(normalize_bars(df), limit, start=start, end=end) for pair, df in frames.items()}
+
+    def latest_quotes(self, symbols: list) -> pd.DataFrame:
+        """Best bid, best ask and last trade price of many pairs from comma-joined ticker requests.
+
+        Pairs are matched by the names Kraken answers with, so ask for them by those names, e.g. XXBTZUSD.
+
+        :param symbols:
+        :return: dataframe of QUOTE_COLUMNS indexed by pair, timed at the moment of the request
+        """
+        now = pd.Timestamp.now(tz='UTC')
+        tickers = self.get_tickers(symbols)
+        quotes = {pair: (now, float(row['b'][0]), float(row['a'][0]), float(row['c'][0]))
+                  for pair, row in tickers.iterrows()}
+        return quotes_df(self._pair_list(symbols), quotes)
+
     def get_order_book(self, pair, count=100, ascending=False):
         """Get the order book for a given asset pair.
 
@@ -125,12 +408,28 @@ class KrakDealer:
             raise BrokerValidationException("[!] Invalid asset pair.")
 
         try:
-            result = self.api.get_order_book(pair, count, ascending)
+            result = self._call('get_order_book', pair, count, ascending, priority=PRIORITY_DATA)
         except KrakenAPIError as error:
             raise error
         else:
             return result
 
+    def get_book(self, pair, count=100) -> OrderBook:
+        """Refresh the local order book of a pair from a snapshot of the order book endpoint.
+
+        Level deltas, e.g. from Kraken's websocket book feed, are applied to the returned book with OrderBook.apply.
+
+        :param pair:
+        :param count: number of levels on each side
+        :return:
+        """
+        asks, bids = self.get_order_book(pair, count=count)
+        book = self.books.get(pair)
+        if book is None or book.depth != count:
+            book = self.books[pair] = OrderBook(pair, depth=count)
+        book.snapshot_frames(asks, bids)
+        return book
+
     def get_recent_spread_data(self, pair, since=None, ascending=False):
         """Get recent spread data for a given asset pair.
 
@@ -143,8 +442,168 @@ class KrakDealer:
             raise BrokerValidationException("[!] Invalid asset pair.")
 
         try:
-            result = self.api.get_recent_spread_data(pair, since, ascending)
+            result = self._call('get_recent_spread_data', pair, since, ascending, priority=PRIORITY_DATA)
         except KrakenAPIError as error:
             raise error
         else:
             return result
+
+    def get_spreads(self, pairs=None, max_workers: int = 4) -> dict:
+        """Get recent spread data for many pairs concurrently. The spread endpoint only takes one pair per call.
+
+        :param pairs: pairs to query instead of the watched ones
+        :param max_workers: number of pairs to query at the same time
+        :return: pair -> (spread, last)
+        """
+        return self._for_pairs(self.get_recent_spread_data, pairs if pairs is not None else self.pairs, max_workers)
+
+
+class TradeAggregator:
+
+    def __init__(self, dealer: KrakDealer, pair: str, intervals=(60,), bar_store: BarStore = None,
+                 max_pages: int = 10, max_bars: int = TRADE_BARS_MAX_ROWS):
+        """Builds OHLCV bars of any length, from seconds to days, out of a pair's raw trades.
+
+        Each update asks the trades endpoint for the trades since the cursor of the previous one, bins them into
+        buckets of every interval at once and folds them into the bars kept so far, the newest of which may still
+        be forming. Buckets are aligned to the epoch, so day bars start at midnight UTC like Kraken's.
+
+        :param dealer:
+        :param pair:
+        :param intervals: bar lengths in seconds
+        :param bar_store: optional local store the bars and the trades cursor are kept in across restarts
+        :param max_pages: most trades requests per update when catching up, each one returns up to TRADES_MAX_ROWS
+        :param max_bars: newest bars kept per interval
+        """
+        intervals = [int(interval) for interval in intervals]
+        if len(intervals) < 1 or min(intervals) < 1:
+            raise BrokerValidationException('[!] Intervals must be whole seconds.')
+
+        if max_bars < 1:
+            raise BrokerValidationException('[!] max_bars must be at least 1.')
+
+        self.dealer = dealer
+        self.pair = pair
+        self.intervals = intervals
+        self.bar_store = bar_store
+        self.max_pages = max_pages
+        self.max_bars = max_bars
+        self._lock = threading.Lock()
+
+        # interval -> (bars, cursor of the newest trade they hold)
+        self.bars = {}
+        for interval in intervals:
+            df, last = None, None
+            if bar_store is not None:
+                df, meta = bar_store.read(pair, self.period(interval))
+                if df is not None:
+                    df = df.iloc[-max_bars:]
+                    df.index = df.index.tz_convert('UTC')
+                    last = meta['last']
+            self.bars[interval] = (df, last)
+
+    @staticmethod
+    def period(interval: int) -> str:
+        return '{}S'.format(interval)
+
+    def update(self) -> dict:
+        """Fetch the trades since the last update and aggregate them.
+
+        :return: interval -> bars, a dataframe of TRADE_BAR_COLUMNS indexed by bar start (UTC), oldest first
+        """
+        with self._lock:
+            cursors = [last for _, last in self.bars.values()]
+            since = None if any(last is None for last in cursors) else min(cursors)
+
+            frames, last = [], since
+            for _ in range(self.max_pages):
+                trades, last = self.dealer.get_recent_trades(self.pair, since=last, ascending=True)
+                if not trades.empty:
+                    frames.append(trades)
+                if len(trades) < TRADES_MAX_ROWS:
+                    break
+
+            if frames:
+                trades = pd.concat(frames)
+                t = (trades['time'].values.astype('float64') * 10 ** 9).astype('int64')
+                price = trades['price'].values.astype('float64')
+                volume = trades['volume'].values.astype('float64')
+                order = np.argsort(t, kind='mergesort')
+                t, price, volume = t[order], price[order], volume[order]
+
+                for interval in self.intervals:
+                    df, cursor = self.bars[interval]
+                    # an interval stored further along than the others already holds some of these trades
+                    keep = slice(None) if cursor is None else t > cursor
+                    fresh = self.aggregate(t[keep], price[keep], volume[keep], interval)
+                    if fresh.empty:
+                        # every trade was already in these bars, and the cursor they were stored with covers them
+                        continue
+                    df = self._fold(df, fresh).iloc[-self.max_bars:]
+                    self.bars[interval] = (df, last)
+                    if self.bar_store is not None:
+                        self.bar_store.write(self.pair, self.period(interval), df, {'last': last})
+
+        return {interval: df for interval, (df, _) in self.bars.items()}
+
+    @staticmethod
+    def aggregate(t: np.ndarray, price: np.ndarray, volume: np.ndarray, interval: int) -> pd.DataFrame:
+        """Bin trades into bars with one pass of np.*.reduceat, no per-bar Python code runs.
+
+        :param t: trade times as epoch nanoseconds, sorted
+        :param price:
+        :param volume:
+        :param interval: bar length in seconds
+        :return: dataframe of TRADE_BAR_COLUMNS indexed by bar start
+        """
+        step = interval * 10 ** 9
+        bucket = t - t % step
+        if len(bucket) == 0:
+            return pd.DataFrame({col: np.zeros(0, dtype='int64' if col == 'count' else 'float64')
+                                 for col in TRADE_BAR_COLUMNS}, index=pd.DatetimeIndex([], tz='UTC'))
+
+        starts = np.flatnonzero(np.concatenate([[True], bucket[1:] != bucket[:-1]]))
+        ends = np.concatenate([starts[1:], [len(bucket)]]) - 1
+        total = np.add.reduceat(volume, starts)
+        notional = np.add.reduceat(price * volume, starts)
+        return pd.DataFrame({
+            'open':     price[starts],
+            'high':     np.maximum.reduceat(price, starts),
+            'low':      np.minimum.reduceat(price, starts),
+            'close':    price[ends],
+            'vwap':     np.divide(notional, total, out=price[ends].copy(), where=total > 0),
+            'volume':   total,
+            'count':    ends - starts + 1,
+        }, index=pd.to_datetime(bucket[starts], utc=True), columns=TRADE_BAR_COLUMNS)
+
+    @staticmethod
+    def _fold(df: pd.DataFrame, fresh: pd.DataFrame) -> pd.DataFrame:
+        """Append fresh bars, merging the first one into the newest kept bar when they share a bucket.
+
+        :param df: bars so far, or None
+        :param fresh:
+        :return:
+        """
+        if df is None or df.empty:
+            return fresh
+        if fresh.empty:
+            return df
+
+        if fresh.index[0] == df.index[-1]:
+            old = {col: df[col].iloc[-1] for col in TRADE_BAR_COLUMNS}
+            new = {col: fresh[col].iloc[0] for col in TRADE_BAR_COLUMNS}
+            volume = old['volume'] + new['volume']
+            merged = {
+                'open':     old['open'],
+                'high':     max(old['high'], new['high']),
+                'low':      min(old['low'], new['low']),
+                'close':    new['close'],
+                'vwap':     (old['vwap'] * old['volume'] + new['vwap'] * new['volume']) / volume if volume > 0 else new['close'],
+                'volume':   volume,
+                'count':    old['count'] + new['count'],
+            }
+            fresh = fresh.copy()
+            for col, value in merged.items():
+                fresh.iloc[0, fresh.columns.get_loc(col)] = value
+            df = df.iloc[:-1]
+        return pd.concat([df, fresh])
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from broker import BrokerValidationException
+import numpy as np
+import threading
+
+PERCENTILES = (50, 95, 99)
+
+
+class LatencyTracker:
+
+    def __init__(self, window: int = 1000):
+        """Round trip times of the latest `window` calls per endpoint, with counts of what went wrong.
+
+        Samples are kept in a preallocated ring buffer per endpoint, so percentiles always describe recent calls
+        and recording one is a couple of array writes.
+
+        :param window: samples kept per endpoint
+        """
+        if window < 1:
+            raise BrokerValidationException('[!] window must be at least 1.')
+
+        self.window = window
+        # endpoint -> [samples, next slot, number recorded]
+        self._samples = dict()
+        # endpoint -> {'errors': n, 'timeouts': n, 'hedged': n, 'hedges_won': n, 'rejected': n}
+        self._counts = dict()
+        self._lock = threading.Lock()
+
+    def record(self, endpoint: str, seconds: float) -> None:
+        """Add the round trip time of a call that came back.
+
+        :param endpoint:
+        :param seconds:
+        :return:
+        """
+        with self._lock:
+            entry = self._samples.get(endpoint)
+            if entry is None:
+                entry = self._samples[endpoint] = [np.zeros(self.window, dtype='float64'), 0, 0]
+            entry[0][entry[1]] = seconds
+            entry[1] = (entry[1] + 1) % self.window
+            entry[2] += 1
+
+    def count(self, endpoint: str, event: str) -> None:
+        """Count an event of an endpoint: an error, a timeout, a hedged call, a won hedge or a rejected call.
+
+        :param endpoint:
+        :param event:
+        :return:
+        """
+        with self._lock:
+            counts = self._counts.setdefault(endpoint, dict())
+            counts[event] = counts.get(event, 0) + 1
+
+    def samples(self, endpoint: str) -> int:
+        with self._lock:
+            entry = self._samples.get(endpoint)
+            return 0 if entry is None else entry[2]
+
+    def percentile(self, endpoint: str, q: float, min_samples: int = 1) -> float or None:
+        """A percentile of an endpoint's recent round trip times.
+
+        :param endpoint:
+        :param q: between 0 and 100
+        :param min_samples: answer None until at least this many calls were recorded
+        :return: seconds
+        """
+        with self._lock:
+            entry = self._samples.get(endpoint)
+            if entry is None or entry[2] < max(min_samples, 1):
+                return None
+            samples = entry[0][:min(entry[2], self.window)].copy()
+        return float(np.percentile(samples, q))
+
+    def metrics(self) -> dict:
+        """p50, p95 and p99 round trip times and event counts per endpoint.
+
+        :return: endpoint -> {'calls': n, 'p50': s, 'p95': s, 'p99': s, 'errors': n, ...}
+        """
+        with self._lock:
+            snapshot = dict()
+            for endpoint in sorted(set(self._samples) | set(self._counts)):
+                entry = self._samples.get(endpoint)
+                recent = None if entry is None else entry[0][:min(entry[2], self.window)].copy()
+                snapshot[endpoint] = (recent, 0 if entry is None else entry[2], dict(self._counts.get(endpoint, {})))
+
+        result = dict()
+        for endpoint, (recent, calls, counts) in snapshot.items():
+            row = {'calls': calls}
+            values = np.percentile(recent, PERCENTILES) if recent is not None else [None] * len(PERCENTILES)
+            for q, value in zip(PERCENTILES, values):
+                row['p{}'.format(q)] = None if value is None else float(value)
+            row.update(counts)
+            result[endpoint] = row
+        return result
+
+    def report(self) -> str:
+        """The metrics as one line per endpoint, in milliseconds.
+
+        :return:
+        """
+        lines = []
+        for endpoint, row in self.metrics().items():
+            times = ' '.join('p{}={}'.format(q, '-' if row['p{}'.format(q)] is None else
+                                             '{:.0f}ms'.format(row['p{}'.format(q)] * 1000)) for q in PERCENTILES)
+            events = ' '.join('{}={}'.format(key, value) for key, value in sorted(row.items())
+                              if key != 'calls' and key not in ['p{}'.format(q) for q in PERCENTILES])
+            lines.append('{} calls={} {} {}'.format(endpoint, row['calls'], times, events).rstrip())
+        return '\n'.join(lines)
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from broker.bars import NY, BAR_COLUMNS, COMPACT_DTYPES
+from broker.resample import resample_bars, bars_per, check_base
+from abc import ABC, abstractmethod
+import pandas as pd
+import numpy as np
+
+# every provider hands out bars with these columns and dtypes, volumes are fractional for crypto and count ticks for forex
+BAR_DTYPES = {'open': 'float64', 'high': 'float64', 'low': 'float64', 'close': 'float64', 'volume': 'float64'}
+
+QUOTE_COLUMNS = ['time', 'bid', 'ask', 'last']
+
+
+def normalize_bars(df: pd.DataFrame or None, limit: int = None) -> pd.DataFrame or None:
+    """Bring a provider's bars to the common shape: BAR_COLUMNS with BAR_DTYPES, indexed by New York time, oldest first.
+
+    Compact frames (see bars.compact) keep their dtypes, callers widen them before computing as usual.
+
+    :param df: bars with at least BAR_COLUMNS and a tz-aware or naive UTC datetime index
+    :param limit: keep only the newest `limit` bars
+    :return:
+    """
+    if df is None or df.empty:
+        return None
+
+    df = df[BAR_COLUMNS]
+    if df.index.tz is None:
+        df.index = df.index.tz_localize('UTC').tz_convert(NY)
+    elif str(df.index.tz) != NY:
+        df.index = df.index.tz_convert(NY)
+    if not df.index.is_monotonic_increasing:
+        df = df.sort_index()
+    if limit is not None:
+        df = df.iloc[-limit:]
+
+    compact = df['close'].dtype == COMPACT_DTYPES['close']
+    if not compact and any(df[col].dtype != dtype for col, dtype in BAR_DTYPES.items()):
+        df = df.astype(BAR_DTYPES)
+    return df
+
+
+def quotes_df(symbols: list, quotes: dict) -> pd.DataFrame:
+    """The common shape of latest quotes: one row per requested symbol, NaN where a provider had nothing.
+
+    :param symbols:
+    :param quotes: symbol -> (time, bid, ask, last)
+    :return: dataframe of QUOTE_COLUMNS indexed by symbol, times in New York time
+    """
+    rows = [quotes.get(symbol, (pd.NaT, np.nan, np.nan, np.nan)) for symbol in symbols]
+    df = pd.DataFrame({
+        'time': pd.to_datetime([row[0] for row in rows], utc=True).tz_convert(NY),
+        'bid':  np.array([row[1] for row in rows], dtype='float64'),
+        'ask':  np.array([row[2] for row in rows], dtype='float64'),
+        'last': np.array([row[3] for row in rows], dtype='float64'),
+    }, index=pd.Index(symbols, name='symbol'), columns=QUOTE_COLUMNS)
+    return df
+
+
+class MarketDataProvider(ABC):
+    """Bulk market data in one shape, whichever broker it comes from.
+
+    Providers implement _bars_for and latest_quotes. A provider missing either `_bars_for` or `latest_quotes` cannot be
+    instantiated. Screening, caching and concurrency code written against bars_for and latest_quotes then works for
+    stocks, crypto and forex alike.
+    """
+
+    def bars_for(self, symbols: list, period: str = 'day', limit: int = 1000, start: str = None, end: str = None,
+                 base: str = None) -> dict:
+        """The newest `limit` bars of each symbol between start and end.
+
+        :param symbols:
+        :param period: one of the bars endpoint timeframes, see bars.PERIOD_SECONDS
+        :param limit:
+        :param start:
+        :param end:
+        :param base: build the bars from this finer period, see resample.resample_bars
+        :return: symbol -> bars in the shape of normalize_bars, or None when there are none
+        """
+        if base is not None and base != period:
+            check_base(period, base)
+            frames = self._bars_for(symbols, base, limit * bars_per(period, base), start, end)
+            return {symbol: normalize_bars(resample_bars(normalize_bars(df), period), limit)
+                    for symbol, df in frames.items()}
+
+        frames = self._bars_for(symbols, period, limit, start, end)
+        return {symbol: normalize_bars(df, limit) for symbol, df in frames.items()}
+
+    @abstractmethod
+    def _bars_for(self, symbols: list, period: str, limit: int, start: str, end: str) -> dict:
+        """Fetch bars the provider's way.
+
+        :return: symbol -> bars with at least BAR_COLUMNS, or None
+        """
+
+    @abstractmethod
+    def latest_quotes(self, symbols: list) -> pd.DataFrame:
+        """The newest quote of each symbol.
+
+        :param symbols:
+        :return: dataframe of QUOTE_COLUMNS indexed by symbol, see quotes_df
+        """
@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from broker import BrokerValidationException
+from bisect import bisect_left, bisect_right
+import numpy as np
+import threading
+import json
+
+
+class _Side:
+
+    def __init__(self, sign: int):
+        """One side of the book: price levels sorted best first, with their volumes.
+
+        Levels are kept as sorted keys, sign * price, so the best level is always at index 0 for both sides.
+
+        :param sign: 1 for asks (lowest first), -1 for bids (highest first)
+        """
+        self.sign = sign
+        self.keys = []
+        self.volumes = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def set(self, price: float, volume: float) -> None:
+        key = self.sign * price
+        if volume == 0:
+            if self.volumes.pop(key, None) is not None:
+                del self.keys[bisect_left(self.keys, key)]
+            return
+        if key not in self.volumes:
+            self.keys.insert(bisect_left(self.keys, key), key)
+        self.volumes[key] = volume
+
+    def truncate(self, depth: int) -> None:
+        for key in self.keys[depth:]:
+            del self.volumes[key]
+        del self.keys[depth:]
+
+    def clear(self) -> None:
+        self.keys = []
+        self.volumes = {}
+
+    def best(self) -> tuple or None:
+        if not self.keys:
+            return None
+        key = self.keys[0]
+        return self.sign * key, self.volumes[key]
+
+    def volume(self, price: float) -> float:
+        return self.volumes.get(self.sign * price, 0.)
+
+    def volume_to(self, price: float) -> float:
+        # every level at or better than price
+        end = bisect_right(self.keys, self.sign * price)
+        return float(sum(self.volumes[key] for key in self.keys[:end]))
+
+    def levels(self, count: int = None) -> np.ndarray:
+        keys = self.keys[:count]
+        return np.array([(self.sign * key, self.volumes[key]) for key in keys], dtype='float64').reshape(-1, 2)
+
+
+class OrderBook:
+
+    def __init__(self, pair: str, depth: int = 100):
+        """A local L2 order book for one pair, fed from a snapshot and then level deltas.
+
+        Each side keeps its price levels sorted, so a level update is a binary search, and the top of the book,
+        the volume at a price and the imbalance over the top levels are read without rebuilding any frames.
+        Levels past `depth` are dropped after every update, like Kraken does for a book subscription of that depth.
+
+        :param pair:
+        :param depth: number of levels kept on each side
+        """
+        if depth < 1:
+            raise BrokerValidationException('[!] depth must be at least 1.')
+
+        self.pair = pair
+        self.depth = depth
+        self.bids = _Side(-1)
+        self.asks = _Side(1)
+        self.updated = None
+        self._lock = threading.Lock()
+
+    def snapshot(self, bids, asks, updated: float = None) -> None:
+        """Replace the book with a snapshot.
+
+        :param bids: iterable of (price, volume, ...) levels
+        :param asks: iterable of (price, volume, ...) levels
+        :param updated: unixtime of the snapshot
+        :return:
+        """
+        with self._lock:
+            self.bids.clear()
+            self.asks.clear()
+            self._apply(bids, asks, updated)
+
+    def update(self, bids=(), asks=(), updated: float = None) -> None:
+        """Apply level deltas. A level's new volume replaces the old one, a volume of 0 removes the level.
+
+        :param bids: iterable of (price, volume, ...) levels
+        :param asks: iterable of (price, volume, ...) levels
+        :param updated: unixtime of the update
+        :return:
+        """
+        with self._lock:
+            self._apply(bids, asks, updated)
+
+    def _apply(self, bids, asks, updated) -> None:
+        for side, levels in ((self.bids, bids), (self.asks, asks)):
+            for level in levels:
+                side.set(float(level[0]), float(level[1]))
+                if updated is None and len(level) > 2:
+                    self.updated = max(self.updated or 0., float(level[2]))
+            side.truncate(self.depth)
+        if updated is not None:
+            self.updated = updated
+
+    def snapshot_frames(self, asks, bids) -> None:
+        """Replace the book with the (asks, bids) dataframes of KrakDealer.get_order_book.
+
+        :param asks:
+        :param bids:
+        :return:
+        """
+        self.snapshot(*[() if df.empty else df[['price', 'volume', 'time']].values for df in (bids, asks)])
+
+    def apply(self, message) -> None:
+        """Apply a book message from Kraken's websocket feed.
+
+        Messages are lists holding one or two payload dicts: snapshots carry `as` and `bs` levels, updates carry `a`
+        and/or `b` levels of [price, volume, timestamp] strings.
+
+        :param message:
+        :return:
+        """
+        payload = {}
+        for part in message:
+            if isinstance(part, dict):
+                payload.update(part)
+
+        if 'as' in payload or 'bs' in payload:
+            self.snapshot(payload.get('bs', ()), payload.get('as', ()))
+        else:
+            self.update(payload.get('b', ()), payload.get('a', ()))
+
+    @classmethod
+    def replay(cls, path: str, pair: str, depth: int = 100):
+        """Rebuild a book from a recorded feed: one websocket book message per line, as JSON.
+
+        :param path:
+        :param pair: messages for other pairs are skipped
+        :param depth:
+        :return:
+        """
+        book = cls(pair, depth=depth)
+        with open(path) as fh:
+            for line in fh:
+                line = line.strip()
+                if not line:
+                    continue
+                message = json.loads(line)
+                if isinstance(message, list) and message[-1] == pair:
+                    book.apply(message)
+        return book
+
+    def best_bid(self) -> tuple or None:
+        """Highest bid as a (price, volume) tuple."""
+        with self._lock:
+            return self.bids.best()
+
+    def best_ask(self) -> tuple or None:
+        """Lowest ask as a (price, volume) tuple."""
+        with self._lock:
+            return self.asks.best()
+
+    def top(self) -> tuple:
+        """Top of the book.
+
+        :return: a (bid price, bid volume, ask price, ask volume) tuple, with None for an empty side
+        """
+        with self._lock:
+            bid = self.bids.best() or (None, None)
+            ask = self.asks.best() or (None, None)
+        return bid + ask
+
+    def spread(self) -> float or None:
+        bid, _, ask, _ = self.top()
+        return None if bid is None or ask is None else ask - bid
+
+    def mid(self) -> float or None:
+        bid, _, ask, _ = self.top()
+        return None if bid is None or ask is None else (ask + bid) / 2.
+
+    def volume_at(self, price: float) -> float:
+        """Volume resting at exactly this price, on whichever side holds it.
+
+        :param price:
+        :return:
+        """
+        with self._lock:
+            return self.bids.volume(price) or self.asks.volume(price)
+
+    def depth_to(self, price: float, side: str) -> float:
+        """Volume resting at or better than a price: what a buy up to price (side='ask') or a sell down to price
+        (side='bid') could fill against.
+
+        :param price:
+        :param side: 'bid' or 'ask'
+        :return:
+        """
+        if side not in ('bid', 'ask'):
+            raise BrokerValidationException(f'[!] Invalid side {side}.')
+        with self._lock:
+            return (self.bids if side == 'bid' else self.asks).volume_to(price)
+
+    def imbalance(self, levels: int = 10) -> float:
+        """Order book imbalance over the top levels: (bid volume - ask volume) / (bid volume + ask volume).
+
+        :param levels:
+        :return: a value between -1 (all asks) and 1 (all bids), 0 for an empty book
+        """
+        with self._lock:
+            bid = sum(self.bids.volumes[key] for key in self.bids.keys[:levels])
+            ask = sum(self.asks.volumes[key] for key in self.asks.keys[:levels])
+        total = bid + ask
+        return 0. if total == 0 else (bid - ask) / total
+
+    def levels(self, side: str, count: int = None) -> np.ndarray:
+        """Price levels of one side, best first.
+
+        :param side: 'bid' or 'ask'
+        :param count: number of levels, all of them if not given
+        :return: an (n, 2) array of price, volume rows
+        """
+        if side not in ('bid', 'ask'):
+            raise BrokerValidationException(f'[!] Invalid side {side}.')
+        with self._lock:
+            return (self.bids if side == 'bid' else self.asks).levels(count)
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from broker import BrokerValidationException
+from broker.bars import NY, BAR_COLUMNS, PERIOD_SECONDS
+from broker.trading_calendar import TradingCalendar
+import pandas as pd
+import numpy as np
+
+DAY_SECONDS = PERIOD_SECONDS['day']
+# length of a regular session, a day bar holds this many seconds of intraday bars
+SESSION_SECONDS = 390 * 60
+
+
+def bars_per(period: str, base: str) -> int:
+    """How many base bars one bar of period is made of.
+
+    :param period: coarser period
+    :param base: finer period
+    :return:
+    """
+    seconds = SESSION_SECONDS if PERIOD_SECONDS[period] == DAY_SECONDS else PERIOD_SECONDS[period]
+    return int(np.ceil(seconds / float(PERIOD_SECONDS[base])))
+
+
+def check_base(period: str, base: str) -> None:
+    """Make sure bars of period can be built from bars of base.
+
+    :param period:
+    :param base:
+    :return:
+    """
+    for value in (period, base):
+        if value not in PERIOD_SECONDS:
+            raise BrokerValidationException(f'[!] Invalid period {value}.')
+
+    if PERIOD_SECONDS[period] % PERIOD_SECONDS[base] != 0:
+        raise BrokerValidationException(f'[!] {period} bars cannot be built from {base} bars.')
+
+
+def resample_bars(df: pd.DataFrame, period: str, calendar: TradingCalendar = None) -> pd.DataFrame:
+    """Aggregate OHLCV bars into coarser bars: first open, highest high, lowest low, last close, summed volume.
+
+    Bars are grouped with one pass of np.*.reduceat over the sorted index, no per-group Python code runs. With a
+    calendar, intraday buckets start at each session's open and day bars at the session date, and bars outside the
+    sessions (extended hours) are left out. Without one, buckets are aligned to the epoch and to midnight New York time.
+
+    :param df: OHLCV dataframe with a tz-aware datetime index, sorted oldest first
+    :param period: one of the bars endpoint timeframes
+    :param calendar: session index to align buckets to
+    :return: dataframe with the same columns and dtypes
+    """
+    if period not in PERIOD_SECONDS:
+        raise BrokerValidationException(f'[!] Invalid period {period}.')
+
+    if df is None or df.empty:
+        return df
+
+    t = df.index.values.astype('datetime64[ns]').astype('int64')
+    columns = {col: df[col].values for col in BAR_COLUMNS}
+    step = PERIOD_SECONDS[period] * 10 ** 9
+
+    if calendar is not None:
+        session = np.searchsorted(calendar.opens, t, side='right') - 1
+        inside = (session >= 0) & (t < calendar.closes[np.maximum(session, 0)])
+        t, session = t[inside], session[inside]
+        columns = {col: values[inside] for col, values in columns.items()}
+        if len(t) == 0:
+            return df.iloc[:0]
+        if step == DAY_SECONDS * 10 ** 9:
+            bucket = calendar.dates[session]
+        else:
+            opens = calendar.opens[session]
+            bucket = opens + (t - opens) // step * step
+    elif step == DAY_SECONDS * 10 ** 9:
+        bucket = pd.to_datetime(t, utc=True).tz_convert(NY).normalize().values.astype('datetime64[ns]').astype('int64')
+    else:
+        bucket = t - t % step
+
+    starts = np.flatnonzero(np.concatenate([[True], bucket[1:] != bucket[:-1]]))
+    ends = np.concatenate([starts[1:], [len(bucket)]]) - 1
+
+    index = pd.to_datetime(bucket[starts], utc=True).tz_convert(NY)
+    return pd.DataFrame({
+        'open':     columns['open'][starts],
+        'high':     np.maximum.reduceat(columns['high'], starts),
+        'low':      np.minimum.reduceat(columns['low'], starts),
+        'close':    columns['close'][ends],
+        'volume':   _sum_volume(columns['volume'], starts),
+    }, index=index, columns=BAR_COLUMNS)
+
+
+def _sum_volume(volume: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    # sum compact volumes in 64 bits, and only narrow them back if the totals fit
+    if volume.dtype.kind not in 'iu' or volume.dtype.itemsize == 8:
+        return np.add.reduceat(volume, starts)
+    total = np.add.reduceat(volume, starts, dtype='uint64' if volume.dtype.kind == 'u' else 'int64')
+    if total.max() <= np.iinfo(volume.dtype).max:
+        return total.astype(volume.dtype)
+    return total
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from broker import BrokerValidationException
+from broker.bars import NY, BAR_COLUMNS, PERIOD_SECONDS
+import pandas as pd
+import numpy as np
+import threading
+
+DAY_NS = 86400 * 10 ** 9
+
+
+class RollingBars:
+
+    def __init__(self, size: int, period: str = 'minute'):
+        """A fixed-size rolling window of OHLCV bars, kept in preallocated ring buffers.
+
+        Updates may be finer than the window's period: an update that falls in the same period as the newest bar is
+        merged into it (high/low extended, close replaced, volume added), otherwise it starts a new bar and the
+        oldest bar drops out once the window is full. Daily bars start at midnight New York time, like the bars
+        endpoint's day bars.
+
+        :param size: number of bars to keep
+        :param period: one of the bars endpoint timeframes
+        """
+        if size < 1:
+            raise BrokerValidationException('[!] size must be at least 1.')
+
+        if period not in PERIOD_SECONDS:
+            raise BrokerValidationException(f'[!] Invalid period {period}.')
+
+        self.size = size
+        self.period = period
+        self._period_ns = PERIOD_SECONDS[period] * 10 ** 9
+        self._t = np.zeros(size, dtype='int64')
+        self._ohlcv = np.zeros((size, 5), dtype='float64')
+        self._next = 0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def last_time(self) -> pd.Timestamp or None:
+        with self._lock:
+            if self._count == 0:
+                return None
+            return pd.Timestamp(int(self._t[self._next - 1]), tz='UTC').tz_convert(NY)
+
+    def bucket(self, t: int) -> int:
+        """Start time of the bar an epoch nanosecond time belongs to.
+
+        :param t:
+        :return:
+        """
+        if self._period_ns == DAY_NS:
+            return pd.Timestamp(t, tz='UTC').tz_convert(NY).normalize().value
+        return t - t % self._period_ns
+
+    def push(self, t: int, o: float, h: float, l: float, c: float, v: float) -> None:
+        """Fold a bar (or a finer bar, or a trade as o=h=l=c) into the window.
+
+        :param t: epoch nanoseconds
+        :param o:
+        :param h:
+        :param l:
+        :param c:
+        :param v:
+        :return:
+        """
+        start = self.bucket(t)
+        with self._lock:
+            last = self._next - 1
+            if self._count and self._t[last] == start:
+                bar = self._ohlcv[last]
+                bar[1] = max(bar[1], h)
+                bar[2] = min(bar[2], l)
+                bar[3] = c
+                bar[4] += v
+                return
+
+            if self._count and start < self._t[last]:
+                # late update for a bar that is already closed
+                return
+
+            self._t[self._next] = start
+            self._ohlcv[self._next] = (o, h, l, c, v)
+            self._next = (self._next + 1) % self.size
+            self._count = min(self._count + 1, self.size)
+
+    def seed(self, df: pd.DataFrame) -> None:
+        """Replace the window contents with the newest bars of an OHLCV dataframe.
+
+        :param df: dataframe with a datetime index and open, high, low, close, volume columns
+        :return:
+        """
+        df = df.iloc[-self.size:]
+        count = len(df)
+        with self._lock:
+            self._t[:count] = df.index.values.astype('datetime64[ns]').astype('int64')
+            self._ohlcv[:count] = df[BAR_COLUMNS].values
+            self._next = count % self.size
+            self._count = count
+
+    def df(self) -> pd.DataFrame:
+        """The window as an OHLCV dataframe, oldest bar first.
+
+        :return:
+        """
+        with self._lock:
+            order = (np.arange(self._count) + self._next - self._count) % self.size
+            t = self._t[order]
+            values = self._ohlcv[order]
+        index = pd.to_datetime(t, utc=True).tz_convert(NY)
+        return pd.DataFrame(values, index=index, columns=BAR_COLUMNS)
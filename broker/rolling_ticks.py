@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from broker import BrokerValidationException
+from broker.bars import NY
+import pandas as pd
+import numpy as np
+import threading
+
+TICK_COLUMNS = ['bid', 'ask', 'mid', 'spread']
+
+
+class RollingTicks:
+
+    def __init__(self, size: int):
+        """The newest `size` bid/ask quotes of an instrument, kept in preallocated ring buffers.
+
+        :param size: number of ticks to keep
+        """
+        if size < 1:
+            raise BrokerValidationException('[!] size must be at least 1.')
+
+        self.size = size
+        self._t = np.zeros(size, dtype='int64')
+        self._quotes = np.zeros((size, 2), dtype='float64')
+        self._next = 0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    def push(self, t: int, bid: float, ask: float) -> None:
+        """Add a quote, dropping the oldest one once the buffer is full.
+
+        :param t: epoch nanoseconds
+        :param bid:
+        :param ask:
+        :return:
+        """
+        with self._lock:
+            self._t[self._next] = t
+            self._quotes[self._next] = (bid, ask)
+            self._next = (self._next + 1) % self.size
+            self._count = min(self._count + 1, self.size)
+
+    def last(self) -> tuple or None:
+        """The newest quote.
+
+        :return: a (time, bid, ask) tuple
+        """
+        with self._lock:
+            if self._count == 0:
+                return None
+            i = self._next - 1
+            t, (bid, ask) = self._t[i], self._quotes[i]
+        return pd.Timestamp(int(t), tz='UTC').tz_convert(NY), float(bid), float(ask)
+
+    def df(self) -> pd.DataFrame:
+        """The buffer as a dataframe of bid, ask, mid and spread, oldest tick first.
+
+        :return:
+        """
+        with self._lock:
+            order = (np.arange(self._count) + self._next - self._count) % self.size
+            t = self._t[order]
+            quotes = self._quotes[order]
+        bid, ask = quotes[:, 0], quotes[:, 1]
+        index = pd.to_datetime(t, utc=True).tz_convert(NY)
+        return pd.DataFrame({
+            'bid':      bid,
+            'ask':      ask,
+            'mid':      (bid + ask) / 2.,
+            'spread':   ask - bid,
+        }, index=index, columns=TICK_COLUMNS)
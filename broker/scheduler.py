@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from broker import BrokerValidationException
+import threading
+import itertools
+import heapq
+import time
+
+# lower values are served first
+PRIORITY_ORDER = 0      # submitting, replacing and canceling orders, closing positions
+PRIORITY_ACCOUNT = 1    # account, position and order lookups, the clock
+PRIORITY_DATA = 2       # bars, assets, calendars and other bulk data
+
+PRIORITIES = (PRIORITY_ORDER, PRIORITY_ACCOUNT, PRIORITY_DATA)
+
+
+class RequestScheduler:
+
+    def __init__(self, capacity: float, rate: float):
+        """A thread-safe token bucket that hands out API calls by priority.
+
+        The bucket holds up to `capacity` tokens and refills at `rate` tokens per second, every call takes one token
+        (or its cost). Callers queue in priority order, so an order submission that arrives while a screen is
+        draining the bucket is served before any of the queued data requests.
+
+        :param capacity: burst size, in tokens
+        :param rate: tokens added per second
+        """
+        if capacity <= 0 or rate <= 0:
+            raise BrokerValidationException('[!] capacity and rate must be positive.')
+
+        self.capacity = float(capacity)
+        self.rate = float(rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+        self._requests = {priority: 0 for priority in PRIORITIES}
+        self._wait_total = {priority: 0. for priority in PRIORITIES}
+        self._wait_max = {priority: 0. for priority in PRIORITIES}
+
+    @classmethod
+    def alpaca(cls):
+        """Alpaca allows 200 requests per minute per account.
+
+        :return:
+        """
+        return cls(capacity=200, rate=200 / 60.)
+
+    @classmethod
+    def kraken(cls, limit: float = 15, decay: float = 1 / 3.):
+        """Kraken's private call counter, which is capped at `limit` and decays by `decay` per second.
+
+        The defaults are the Starter tier. Intermediate is 20 and 1/2, Pro is 20 and 1.
+
+        :param limit:
+        :param decay:
+        :return:
+        """
+        return cls(capacity=limit, rate=decay)
+
+    @classmethod
+    def kraken_public(cls):
+        """Kraken's public endpoints allow one call per second.
+
+        :return:
+        """
+        return cls(capacity=1, rate=1)
+
+    def acquire(self, priority: int = PRIORITY_DATA, cost: float = 1.) -> float:
+        """Block until the call may be made.
+
+        :param priority: one of PRIORITY_ORDER, PRIORITY_ACCOUNT, PRIORITY_DATA
+        :param cost: tokens the call uses
+        :return: seconds spent waiting
+        """
+        if priority not in PRIORITIES:
+            raise BrokerValidationException('[!] Invalid priority.')
+
+        if cost > self.capacity:
+            raise BrokerValidationException('[!] cost cannot exceed the bucket capacity.')
+
+        ticket = (priority, next(self._sequence))
+        started = time.monotonic()
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    self._refill()
+                    if self._waiting[0] != ticket:
+                        self._cond.wait()
+                    elif self._tokens < cost:
+                        self._cond.wait((cost - self._tokens) / self.rate)
+                    else:
+                        break
+            except BaseException as error:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+                raise error
+
+            heapq.heappop(self._waiting)
+            self._tokens -= cost
+            waited = time.monotonic() - started
+            self._requests[priority] += 1
+            self._wait_total[priority] += waited
+            self._wait_max[priority] = max(self._wait_max[priority], waited)
+            # the next caller in line may be able to go right away
+            self._cond.notify_all()
+        return waited
+
+    def call(self, method, *args, priority: int = PRIORITY_DATA, cost: float = 1., **kwargs):
+        """Wait for a turn, then make the call.
+
+        :param method: callable making the API request
+        :param args:
+        :param priority:
+        :param cost:
+        :param kwargs:
+        :return: whatever method returns
+        """
+        self.acquire(priority=priority, cost=cost)
+        return method(*args, **kwargs)
+
+    @property
+    def queue_depth(self) -> int:
+        with self._cond:
+            return len(self._waiting)
+
+    def metrics(self) -> dict:
+        """Queue depth and wait times, overall and per priority.
+
+        :return:
+        """
+        with self._cond:
+            self._refill()
+            depth = {priority: 0 for priority in PRIORITIES}
+            for priority, _ in self._waiting:
+                depth[priority] += 1
+            return {
+                'tokens':           self._tokens,
+                'queue_depth':      len(self._waiting),
+                'queued':           depth,
+                'requests':         dict(self._requests),
+                'mean_wait':        {p: self._wait_total[p] / self._requests[p] if self._requests[p] else 0.
+                                     for p in PRIORITIES},
+                'max_wait':         dict(self._wait_max),
+            }
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
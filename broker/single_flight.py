@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import threading
+
+
+class _Flight:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+
+    def __init__(self):
+        """Coalesce concurrent identical calls into one.
+
+        The first caller for a key makes the call, every caller that asks for the same key while it is in flight
+        waits for it and gets the same result, or the same exception. Nothing is kept once the call returns.
+        """
+        self.calls = 0
+        self.shared = 0
+        self._flights = dict()
+        self._lock = threading.Lock()
+
+    def do(self, key, method, *args, **kwargs):
+        """Make the call, or wait for the identical call already in flight.
+
+        :param key: hashable identity of the call
+        :param method:
+        :param args:
+        :param kwargs:
+        :return: whatever method returns
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._flights[key] = flight
+                self.calls += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = method(*args, **kwargs)
+        except BaseException as error:
+            flight.error = error
+            raise error
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result
+
+    @staticmethod
+    def key(*args, **kwargs) -> tuple:
+        """Build a hashable key from call arguments, lists and dicts included.
+
+        :param args:
+        :param kwargs:
+        :return:
+        """
+        return _freeze(args), _freeze(kwargs)
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return tuple(_freeze(v) for v in value)
+    return value
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from broker import BrokerValidationException
+from broker.bars import NY, to_timestamp
+import pandas as pd
+import numpy as np
+
+
+class TradingCalendar:
+
+    def __init__(self, dates: np.ndarray, opens: np.ndarray, closes: np.ndarray):
+        """Trading sessions as sorted int64 epoch nanosecond arrays.
+
+        Every question about market hours is a binary search over these arrays, so the live loop and backtests can
+        ask it as often as they like without calling the API or doing timezone arithmetic per symbol.
+
+        :param dates: midnight New York time of each session day
+        :param opens: session opens
+        :param closes: session closes
+        """
+        if not len(dates) == len(opens) == len(closes):
+            raise BrokerValidationException('[!] dates, opens and closes must have the same length.')
+
+        self.dates = np.asarray(dates, dtype='int64')
+        self.opens = np.asarray(opens, dtype='int64')
+        self.closes = np.asarray(closes, dtype='int64')
+
+    def __len__(self):
+        return len(self.dates)
+
+    @classmethod
+    def from_calendar(cls, calendar: list):
+        """Build the index from the calendar endpoint's Calendar entities.
+
+        :param calendar: list of Calendar entities, e.g. from Broker.get_calendar
+        :return:
+        """
+        raw = [day._raw for day in calendar]
+        days = [day['date'] for day in raw]
+        dates = pd.DatetimeIndex(pd.to_datetime(days)).tz_localize(NY)
+        opens = pd.DatetimeIndex(pd.to_datetime([d + ' ' + day['open'] for d, day in zip(days, raw)])).tz_localize(NY)
+        closes = pd.DatetimeIndex(pd.to_datetime([d + ' ' + day['close'] for d, day in zip(days, raw)])).tz_localize(NY)
+        return cls(cls._ns(dates), cls._ns(opens), cls._ns(closes))
+
+    @staticmethod
+    def _ns(index: pd.DatetimeIndex) -> np.ndarray:
+        return index.values.astype('datetime64[ns]').astype('int64')
+
+    @staticmethod
+    def _time(t) -> int:
+        if t is None:
+            return pd.Timestamp.now(tz='UTC').value
+        return to_timestamp(t).value
+
+    @staticmethod
+    def _timestamp(t: int) -> pd.Timestamp:
+        return pd.Timestamp(int(t), tz='UTC').tz_convert(NY)
+
+    def covers(self, t=None) -> bool:
+        """Whether t falls between the first and last session of the index.
+
+        :param t: time, now if not given
+        :return:
+        """
+        t = self._time(t)
+        return len(self) > 0 and self.dates[0] <= t <= self.closes[-1]
+
+    def is_open(self, t=None) -> bool:
+        """Whether the market is open at t.
+
+        :param t: time, now if not given
+        :return:
+        """
+        t = self._time(t)
+        i = np.searchsorted(self.opens, t, side='right') - 1
+        return bool(i >= 0 and t < self.closes[i])
+
+    def next_open(self, t=None) -> pd.Timestamp or None:
+        """The first session open after t.
+
+        :param t: time, now if not given
+        :return:
+        """
+        i = np.searchsorted(self.opens, self._time(t), side='right')
+        return self._timestamp(self.opens[i]) if i < len(self) else None
+
+    def next_close(self, t=None) -> pd.Timestamp or None:
+        """The first session close after t, which is today's close while the market is open.
+
+        :param t: time, now if not given
+        :return:
+        """
+        i = np.searchsorted(self.closes, self._time(t), side='right')
+        return self._timestamp(self.closes[i]) if i < len(self) else None
+
+    def previous_open(self, t=None) -> pd.Timestamp or None:
+        """The last session open at or before t, which is today's open while the market is open.
+
+        :param t: time, now if not given
+        :return:
+        """
+        i = np.searchsorted(self.opens, self._time(t), side='right') - 1
+        return self._timestamp(self.opens[i]) if i >= 0 else None
+
+    def sessions(self, start=None, end=None) -> pd.DatetimeIndex:
+        """Session days between start and end, inclusive.
+
+        :param start:
+        :param end:
+        :return: midnight New York time of each session day
+        """
+        lo = np.searchsorted(self.dates, self._time(start), side='left') if start is not None else 0
+        hi = np.searchsorted(self.dates, self._time(end), side='right') if end is not None else len(self)
+        return pd.to_datetime(self.dates[lo:hi], utc=True).tz_convert(NY)
+
+    def sessions_between(self, start, end) -> int:
+        """Number of session days after start, up to and including end.
+
+        :param start:
+        :param end:
+        :return:
+        """
+        lo = np.searchsorted(self.dates, self._time(start), side='right')
+        hi = np.searchsorted(self.dates, self._time(end), side='right')
+        return int(hi - lo)
@@ -8,8 +8,9 @@ Borrowed from https://github.com/alpacahq/example-portfolio-manager
 """
 
 class PortfolioManager():
-    def __init__(self, api):    # unlike the example, I'll pass in my own existing API reference
-        self.api = api
+    def __init__(self, broker):    # unlike the example, I'll pass in my own existing Broker reference
+        self.broker = broker
+        self.api = broker.api     # give the broker a ClientPool, the order threads below then each get a client
         self.r_positions = {}
 
     @staticmethod
@@ -21,7 +22,7 @@ class PortfolioManager():
 
     def clear_orders(self):
         try:
-            self.api.cancel_all_orders()
+            self.broker.cancel_all_orders()
             print('All open orders cancelled.')
         except Exception as e:
             print(f'Error: {str(e)}')
@@ -164,8 +165,8 @@ class PortfolioManager():
             return
         q2 = 0
         try:
-            position = self.api.get_position(sym)
-            curr_pos = int(position.qty)
+            position = self.broker.position(sym)
+            curr_pos = int(position.qty) if position is not None else 0
             if((curr_pos + qty > 0) != (curr_pos > 0)):
                 q2 = curr_pos
                 qty = curr_pos + qty
@@ -173,15 +174,15 @@ class PortfolioManager():
             pass
         try:
             if q2 != 0:
-                self.api.submit_order(sym, abs(q2), side, 'market', 'gtc')
+                self.broker.submit_order(sym, abs(q2), side, 'market', 'gtc')
                 try:
-                    self.api.submit_order(sym, abs(qty), side, 'market', 'gtc')
+                    self.broker.submit_order(sym, abs(qty), side, 'market', 'gtc')
                 except Exception as e:
                     print(
                         f'Error: {str(e)}. Order of | {abs(qty) + abs(q2)} {sym} {side} | partially sent ({abs(q2)} shares sent).')
                     return False
             else:
-                self.api.submit_order(sym, abs(qty), side, 'market', 'gtc')
+                self.broker.submit_order(sym, abs(qty), side, 'market', 'gtc')
             print(f'Order of | {abs(qty) + abs(q2)} {sym} {side} | submitted.')
             return True
         except Exception as e:
@@ -197,8 +198,8 @@ class PortfolioManager():
         executed = False
         while(not executed):
             try:
-                position = self.api.get_position(sym)
-                if int(position.qty) == int(expected_qty):
+                position = self.broker.position(sym)
+                if (int(position.qty) if position is not None else 0) == int(expected_qty):
                     executed = True
                 else:
                     print(f'Waiting on execution for {sym}...')
@@ -222,8 +223,8 @@ class PortfolioManager():
         while(not executed):
             if(len(output) == 0):
                 try:
-                    position = self.api.get_position(sym)
-                    if int(position.qty) == int(expected_qty):
+                    position = self.broker.position(sym)
+                    if (int(position.qty) if position is not None else 0) == int(expected_qty):
                         executed = True
                     else:
                         print(f'Waiting on execution for {sym}...')
@@ -234,8 +235,8 @@ class PortfolioManager():
             else:
                 timer.join()
                 try:
-                    position = self.api.get_position(sym)
-                    curr_qty = position.qty
+                    position = self.broker.position(sym)
+                    curr_qty = position.qty if position is not None else 0
                 except BaseException:
                     curr_qty = 0
                 print(
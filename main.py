@@ -2,35 +2,45 @@
 # -*- coding: utf-8 -*-
 from broker import BrokerException, BrokerValidationException
 from broker.broker import Broker
+from broker.bar_store import BarStore
+from broker.asset_universe import AssetUniverse
+from broker.bar_stream import BarStream, DATA_STREAM_URL
 from broker.krak_dealer import KrakDealer
-from broker.forex_broker import ForexBroker
+from broker.forex_broker import ForexBroker, STREAM_HOSTS
+from broker.client_pool import ClientPool
 from util import parse_configs, parse_args
-from pykrakenapi.pykrakenapi import KrakenAPI, KrakenAPIError
-from alpaca_trade_api.rest import REST, APIError
+from pykrakenapi.pykrakenapi import KrakenAPIError
+from alpaca_trade_api.rest import APIError
 from v20.errors import V20ConnectionError
 from importlib import import_module
-import krakenex
 import v20
+import os
 
 
 def main(config, args):
 
     # are we trading forex?
     if args.forex:
-        print('[-] do stuff with Oanda.')
         try:
             oanda = v20.Context(
                 config['oanda']['host'],
                 config['oanda']['port'],
                 token=config['oanda']['token']
             )
+            # prices stream from their own host
+            oanda_stream = v20.Context(
+                config['oanda'].get('stream_host', STREAM_HOSTS.get(config['oanda']['host'], config['oanda']['host'])),
+                config['oanda']['port'],
+                token=config['oanda']['token']
+            )
         except V20ConnectionError as error:
             raise error
 
-        pair = 'EUR_USD'
+        # the first instrument is traded, the others are watched
+        pairs = config['oanda'].get('pairs', 'EUR_USD')
 
         try:
-            broker = ForexBroker(oanda, pair)
+            broker = ForexBroker(oanda, pairs, account_id=config['oanda'].get('account_id'), stream_api=oanda_stream)
         except BrokerException as error:
             raise error
         else:
@@ -42,23 +52,29 @@ def main(config, args):
         if args.cash is not None:
             print('[?] ${} in simulated account balance.'.format(args.cash))
         else:
-            print('[?] ${} is available in cash.'.format(broker.trade_balance['tb']))
+            print('[?] ${} is available in margin.'.format(broker.trade_balance))
 
     # are we trading crypto?
-    if args.crypto:
+    elif args.crypto:
         print('[-] do stuff with Kraken.')
         try:
-            api = krakenex.API(
+            # one client per concurrent call, signing with a shared nonce
+            kraken = ClientPool.kraken(
                 key=config['kraken']['api_key'],
-                secret=config['kraken']['private_key'])
-            kraken = KrakenAPI(api, tier='Starter')
+                secret=config['kraken']['private_key'],
+                tier='Starter')
         except KrakenAPIError as error:
             raise error
 
-        pair = 'BATUSD'
+        # the first pair is traded, the others are watched
+        pairs = config['kraken'].get('pairs', 'BATUSD')
+
+        bar_store = None
+        if args.datadir is not None:
+            bar_store = BarStore(os.path.join(args.datadir, 'kraken'))
 
         try:
-            broker = KrakDealer(kraken, pair=pair)
+            broker = KrakDealer(kraken, pair=pairs, bar_store=bar_store)
         except BrokerException as error:
             raise error
         else:
@@ -75,7 +91,8 @@ def main(config, args):
     else:
         # we must be trading stocks
         try:
-            alpaca = REST(
+            # one client per concurrent call, the portfolio manager places orders from a thread per symbol
+            alpaca = ClientPool.alpaca(
                 base_url=config['alpaca']['APCA_API_BASE_URL'],
                 key_id=config['alpaca']['APCA_API_KEY_ID'],
                 secret_key=config['alpaca']['APCA_API_SECRET_KEY'],
@@ -83,8 +100,23 @@ def main(config, args):
         except APIError as error:
             raise error
 
+        bar_store = None
+        universe = None
+        if args.datadir is not None:
+            bar_store = BarStore(os.path.join(args.datadir, 'alpaca'))
+            universe = AssetUniverse(os.path.join(args.datadir, 'alpaca', 'assets.npz'))
+
+        stream = None
+        if args.stream:
+            stream = BarStream(
+                key_id=config['alpaca']['APCA_API_KEY_ID'],
+                secret_key=config['alpaca']['APCA_API_SECRET_KEY'],
+                url=config['alpaca'].get('DATA_STREAM_URL', DATA_STREAM_URL),
+                period='day')
+
         try:
-            broker = Broker(alpaca)
+            broker = Broker(alpaca, bar_store=bar_store, stream=stream, universe=universe, compact=args.compact,
+                            deadline=args.deadline, hedge=args.hedge)
         except (BrokerException, BrokerValidationException) as error:
             raise error
         else:
@@ -103,8 +135,18 @@ def main(config, args):
         algorithm = import_module(f'algos.{args.algorithm}', package='Algorithm')
     except ImportError as error:
         raise error
-    else:
+
+    # keep ticks and bars of every forex instrument up to date in the background
+    if isinstance(broker, ForexBroker):
+        broker.start()
+
+    try:
         algorithm.run(broker, args)
+    finally:
+        if isinstance(broker, ForexBroker):
+            broker.stop()
+        elif isinstance(broker, Broker):
+            broker.close()
 
 
 if __name__ == '__main__':
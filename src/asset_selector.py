@@ -2,14 +2,15 @@
 # -*- coding: utf-8 -*-
 from src.sentiment_analysis import SentimentAnalysis, SentimentAnalysisException
 from src.edgar_interface import EdgarInterface
-from py_trade_signal.macd import MacdSignal
-from py_trade_signal.mfi import MfiSignal
-from py_trade_signal.obv import ObvSignal
-from py_trade_signal.rsi import RsiSignal
-from py_trade_signal.vzo import VzoSignal
 from datetime import datetime, timedelta
 from util import time_from_datetime
-from broker.broker import Broker
+from src.screener import Screener, latest_bars, prefilter_mask
+from src.signal_engine import any_signal
+from broker import BrokerException
+from broker.broker import BARSET_MAX_SYMBOLS
+from broker.asset_universe import AssetUniverse
+from broker.market_data import MarketDataProvider
+from alpaca_trade_api.entity import Asset
 from argparse import Namespace
 from pytz import timezone
 import pandas as pd
@@ -29,7 +30,7 @@ class DataframeException(AssetException):
 
 class AssetSelector:
 
-    def __init__(self, broker: Broker, cli_args: Namespace, edgar_token: str = None):
+    def __init__(self, broker: MarketDataProvider, cli_args: Namespace, edgar_token: str = None):
         """Initialize the asset selector with an optional edgar token
 
         TODO: Incorporate Twitter api and trade signals
@@ -49,7 +50,7 @@ class AssetSelector:
         TODO: Predictive power score
         https://towardsdatascience.com/rip-correlation-introducing-the-predictive-power-score-3d90808b9598
 
-        :param broker:
+        :param broker: Broker, KrakDealer or ForexBroker
         :param cli_args:
         :param edgar_token:
         """
@@ -79,6 +80,9 @@ class AssetSelector:
         else:
             self.period = '1D'
 
+        # bars of self.period are built from this finer period when set
+        self.base_period = cli_args.base
+
         if cli_args.max is not None and type(cli_args.max) == int:
             self.max_stock_price = cli_args.max
         else:
@@ -89,6 +93,12 @@ class AssetSelector:
         else:
             self.min_stock_price = 0
 
+        # the band is meant for stock prices, a crypto or forex pair is screened whatever it is quoted at
+        if self.asset_class == 'equity':
+            self.price_band = (self.min_stock_price, self.max_stock_price)
+        else:
+            self.price_band = (0, float('inf'))
+
         if 'bear' in cli_args.algorithm or 'short' in cli_args.algorithm:
             self.shorts_wanted = True
         else:
@@ -99,6 +109,18 @@ class AssetSelector:
         else:
             self.poolsize = 5
 
+        # least close * volume of an asset's last daily bar to be screened at all
+        if cli_args.liquidity is not None:
+            self.min_dollar_volume = cli_args.liquidity
+        else:
+            self.min_dollar_volume = 0.
+
+        # threads fetching bars while screening, more than one also evaluates signals on as many processes
+        if cli_args.workers is not None and cli_args.workers > 1:
+            self.workers = cli_args.workers
+        else:
+            self.workers = 1
+
         self.broker = broker
 
         if edgar_token is not None:
@@ -123,123 +145,108 @@ class AssetSelector:
     def get_assets(self, asset_class: str) -> None:   # , algorithm: str) -> None:
         """ Second method of two stage init process. """
         if asset_class == 'equity':
-            raw_assets = self.broker.get_assets()
+            universe = self.broker.get_universe()
             if self.shorts_wanted:
-                self._shortable(raw_assets)
+                self._shortable(universe)
             else:
-                self._longable(raw_assets)
+                self._longable(universe)
         else:
-            raise NotImplementedError('[!] Crypto and forex asset trading is coming soon.')
+            # crypto and forex brokers watch a list of pairs, every one of them is tradeable both ways
+            self.tradeable_assets = [Asset({'symbol': pair, 'class': asset_class, 'tradable': True, 'status': 'active'})
+                                     for pair in self.broker.pairs]
+            self._screen(self.tradeable_assets, 'sell' if self.shorts_wanted else 'buy')
 
-    def _longable(self, asset_list: list, limit: int = 1000) -> None:
-        """Scrub the list of assets from the Alpaca API response and get just the longable stocks we can trade.
+    def _longable(self, universe: AssetUniverse, limit: int = 1000) -> None:
+        """Scrub the asset universe and get just the longable stocks we can trade.
 
-        :param asset_list: list
+        :param universe: AssetUniverse
         :param limit: int
         :return: None
         """
-        self.tradeable_assets = [a for a in asset_list if a.tradable and a.marginable]
+        self.tradeable_assets = universe.select(universe.mask(tradable=True, marginable=True))
+        self._screen(self.tradeable_assets, 'buy', limit=limit)
 
-        self.portfolio = []
-        for ass in self.tradeable_assets:
-            if len(self.portfolio) >= self.poolsize:
-                # exit the filter process -- we have all the stocks we want
-                return
+    def _shortable(self, universe: AssetUniverse, limit: int = 1000) -> None:
+        """Scrub the asset universe and get just the short stocks we can trade.
 
-            if self.backtesting:
-                start = time_from_datetime(self.backtest_beginning)
-                end = time_from_datetime(self.beginning)
-            else:
-                start = time_from_datetime(self.beginning)
-                end = time_from_datetime(self.now)
+        :param universe: AssetUniverse
+        :param limit: int
+        :return: None
+        """
+        self.tradeable_assets = universe.select(
+            universe.mask(tradable=True, shortable=True, marginable=True, easy_to_borrow=True))
+        self._screen(self.tradeable_assets, 'sell', limit=limit)
 
-            # get the dataframe
-            df = self.broker.get_asset_df(ass.symbol, self.period, limit=limit, start=start, end=end)
+    def _screen(self, assets: list, side: str, limit: int = 1000) -> None:
+        """Fill the portfolio with assets whose trade signals agree with the side we want to trade.
 
-            # guard clauses to make sure we have enough data to work with
-            if df is None or df.empty:
-                continue
+        Only assets passing the prefilter get their full history requested. Bars are requested in batches of
+        BARSET_MAX_SYMBOLS symbols, and batching stops as soon as the pool is full. The signals of a batch are evaluated
+        together by the signal engine. With more than one worker, batches are fetched concurrently and picks are taken
+        in the order their signals come back, see Screener.
 
+        :param assets: list of tradeable assets
+        :param side: 'buy' for longs or 'sell' for shorts
+        :param limit: int
+        :return: None
+        """
+        if self.backtesting:
+            start = time_from_datetime(self.backtest_beginning)
+            end = time_from_datetime(self.beginning)
+        else:
+            start = time_from_datetime(self.beginning)
+            end = time_from_datetime(self.now)
+        bt_end = datetime.strptime(end.split('T')[0], '%Y-%m-%d')
+
+        def fetch(symbols: list) -> dict:
+            # a batch that timed out or failed is skipped rather than stalling the screen
+            try:
+                return self.broker.bars_for(symbols, self.period, limit=limit, start=start, end=end,
+                                            base=self.base_period)
+            except BrokerException:
+                print('[!] Skipping {} assets whose bars could not be fetched.'.format(len(symbols)))
+                return {}
+
+        def keep(df: pd.DataFrame) -> bool:
             # is the most recent date in the data frame the end date?
             df_end_date = str(df.iloc[-1].name).split(' ')[0]
             # time delta between df_end_date and end
-            bt_end = datetime.strptime(end.split('T')[0], '%Y-%m-%d')
             df_end = datetime.strptime(df_end_date, '%Y-%m-%d')
             datediff = bt_end - df_end
             # if the last available data is older than 7 days, move on
-            has_end_date = abs(datediff.days) < 7
-            if not has_end_date:
-                continue
+            if abs(datediff.days) >= 7:
+                return False
 
             # throw it away if the price is out of our min-max range
             close = df["close"].iloc[-1]
-            if close > self.max_stock_price or close < self.min_stock_price:
-                continue
+            return self.price_band[0] <= close <= self.price_band[1]
 
-            # trade signal init
-            macd_sig = MacdSignal(df)
-            mfi_sig = MfiSignal(df)
-            obv_sig = ObvSignal(df)
-            rsi_sig = RsiSignal(df)
-            vzo_sig = VzoSignal(df)
+        screener = Screener(workers=self.workers, batch_size=BARSET_MAX_SYMBOLS)
+        self.portfolio = screener.screen(self._prefilter(assets, end), fetch, keep, any_signal, side, self.poolsize,
+                                         batch=True)
 
-            if macd_sig.buy() or mfi_sig.buy() or obv_sig.buy() or rsi_sig.buy() or vzo_sig.buy():
-                self.portfolio.append(ass)
+    def _prefilter(self, assets: list, end: str) -> list:
+        """First, cheap stage of the screen: drop assets that are stale, out of the price band of their asset class or
+        illiquid, judging by their last daily bar alone.
 
-    def _shortable(self, asset_list: list, limit: int = 1000) -> None:
-        """Scrub the list of assets from the Alpaca API response and get just the short stocks we can trade.
+        The last bars of the whole list come from one bulk request per BARSET_MAX_SYMBOLS symbols, and the checks
+        run over all of them at once.
 
-        :param asset_list: list
-        :param limit: int
-        :return: None
+        :param assets: list of tradeable assets
+        :param end: end of the screening window
+        :return: the assets worth requesting full history for
         """
-        self.tradeable_assets = [a for a in asset_list if
-                                 a.tradable and a.shortable and a.marginable and a.easy_to_borrow]
-        self.portfolio = []
-        for ass in self.tradeable_assets:
-            if len(self.portfolio) >= self.poolsize:
-                # exit the filter process -- we have all the stocks we want
-                return
-
-            if self.backtesting:
-                start = time_from_datetime(self.backtest_beginning)
-                end = time_from_datetime(self.beginning)
-            else:
-                start = time_from_datetime(self.beginning)
-                end = time_from_datetime(self.now)
-
-            # get the dataframe
-            df = self.broker.get_asset_df(ass.symbol, self.period, limit=limit, start=start, end=end)
-
-            # guard clauses to make sure we have enough data to work with
-            if df is None or df.empty:
-                continue
-
-            # is the most recent date in the data frame the end date?
-            df_end_date = str(df.iloc[-1].name).split(' ')[0]
-            # time delta between df_end_date and end
-            bt_end = datetime.strptime(end.split('T')[0], '%Y-%m-%d')
-            df_end = datetime.strptime(df_end_date, '%Y-%m-%d')
-            datediff = bt_end - df_end
-            # if the last available data is older than 7 days, move on
-            has_end_date = abs(datediff.days) < 7
-            if not has_end_date:
-                continue
-
-            # throw it away if the price is out of our min-max range
-            close = df["close"].iloc[-1]
-            if close > self.max_stock_price or close < self.min_stock_price:
-                continue
-
-            # trade signal init
-            macd_sig = MacdSignal(df)
-            mfi_sig = MfiSignal(df)
-            obv_sig = ObvSignal(df)
-            rsi_sig = RsiSignal(df)
-            vzo_sig = VzoSignal(df)
-
-            if macd_sig.sell() or mfi_sig.sell() or obv_sig.sell() or rsi_sig.sell() or vzo_sig.sell():
-                self.portfolio.append(ass)
+        symbols = [ass.symbol for ass in assets]
+        try:
+            frames = self.broker.bars_for(symbols, 'day', limit=1, end=end)
+        except BrokerException:
+            print('[!] Unable to get the last bars, screening every asset.')
+            return assets
+
+        mask = prefilter_mask(latest_bars(symbols, frames), end, *self.price_band,
+                              min_dollar_volume=self.min_dollar_volume)
+        print('[*] {} of {} assets pass the prefilter.'.format(int(mask.sum()), len(assets)))
+        return [ass for ass, passed in zip(assets, mask) if passed]
 
     def candle_pattern_direction(self, dataframe: pd.DataFrame) -> str:
         """Given a series, get the candlestick pattern of the last 3 periods.
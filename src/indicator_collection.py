@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 from src.finta_interface import Indicator, IndicatorException
 from broker import BrokerException
+from broker.bars import widen
 from pandas.errors import EmptyDataError
 from util import time_from_timestamp
 import pandas as pd
@@ -34,6 +35,9 @@ class Indicators:
         else:
             self.period = '1D'
 
+        # bars of self.period are built from this finer period when set
+        self.base_period = cli_args.base
+
         self.all_indicators = True
         self.broker         = broker
         self.backdate       = backdate
@@ -95,10 +99,13 @@ class Indicators:
 
         else:
             try:
-                data = self.broker.get_asset_df(ticker, period, limit=_limit)
+                data = self.broker.get_asset_df(ticker, period, limit=_limit, base=self.base_period)
             except BrokerException:
                 raise BrokerException('[!] Error getting bars.')
 
+        # indicators are computed on full precision columns, even when the broker holds compact bars
+        data = widen(data)
+
         if not self.all_indicators:
             if self.indicator_list is None or len(self.indicator_list) < 1:
                 # use a random default set of indicators
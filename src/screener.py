@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from broker.broker import BARSET_MAX_SYMBOLS
+from broker.bars import NY
+import pandas as pd
+import numpy as np
+import multiprocessing
+import os
+
+
+class ScreenerValidationException(ValueError):
+    pass
+
+
+def latest_bars(symbols: list, frames: dict) -> pd.DataFrame:
+    """The newest bar of each symbol as one row, NaN and NaT for symbols without bars.
+
+    :param symbols:
+    :param frames: symbol -> bars, e.g. from MarketDataProvider.bars_for with limit=1
+    :return: dataframe of time in New York time, close and volume indexed by symbol
+    """
+    rows = [frames.get(symbol) for symbol in symbols]
+    rows = [(df.index[-1], df['close'].iloc[-1], df['volume'].iloc[-1]) if df is not None and not df.empty
+            else (pd.NaT, np.nan, np.nan) for df in rows]
+    return pd.DataFrame({
+        'time':     pd.to_datetime([row[0] for row in rows], utc=True).tz_convert(NY),
+        'close':    np.array([row[1] for row in rows], dtype='float64'),
+        'volume':   np.array([row[2] for row in rows], dtype='float64'),
+    }, index=pd.Index(symbols, name='symbol'), columns=['time', 'close', 'volume'])
+
+
+def prefilter_mask(latest: pd.DataFrame, end, min_price: float, max_price: float, max_age: int = 7,
+                   min_dollar_volume: float = 0.) -> np.ndarray:
+    """Which symbols are worth a full history: a recent enough last bar, a price in the band, and enough liquidity.
+
+    :param latest: see latest_bars
+    :param end: the end of the screening window
+    :param min_price:
+    :param max_price:
+    :param max_age: days the last bar may be away from end
+    :param min_dollar_volume: least close * volume of the last bar
+    :return: boolean array, one entry per row of latest
+    """
+    # whole days between New York dates, like the screen's staleness check
+    dates = latest['time'].dt.tz_localize(None).values.astype('datetime64[D]')
+    age = np.abs((np.datetime64(pd.Timestamp(end).strftime('%Y-%m-%d'), 'D') - dates).astype('float64'))
+    close = latest['close'].values
+    # comparisons with NaN are False, so symbols without bars drop out
+    with np.errstate(invalid='ignore'):
+        return (age < max_age) & (close >= min_price) & (close <= max_price) & \
+               (close * latest['volume'].values >= min_dollar_volume)
+
+
+class Screener:
+
+    def __init__(self, workers: int = 1, processes: int = None, batch_size: int = BARSET_MAX_SYMBOLS):
+        """Walk a list of assets in batches, fetch their bars, and keep the ones a signal function picks.
+
+        With one worker everything runs in order on the calling thread. With more, batches are fetched on a pool of
+        `workers` threads, signals are evaluated on a pool of `processes` processes, and picks are taken in the
+        order they complete. As soon as enough are picked, fetches and evaluations that have not started yet are
+        cancelled and running ones are left to finish on their own, their results unused.
+
+        :param workers: threads fetching bars at once, 1 screens serially
+        :param processes: processes evaluating signals, min(workers, cpu count) if not given
+        :param batch_size: symbols per fetch
+        """
+        if workers < 1:
+            raise ScreenerValidationException('[!] workers must be at least 1.')
+
+        if processes is not None and processes < 1:
+            raise ScreenerValidationException('[!] processes must be at least 1.')
+
+        if batch_size < 1:
+            raise ScreenerValidationException('[!] batch_size must be at least 1.')
+
+        self.workers = workers
+        self.processes = processes if processes is not None else min(workers, os.cpu_count() or 1)
+        self.batch_size = batch_size
+        self.cancelled = 0
+
+    def _batches(self, assets: list) -> list:
+        return [assets[i:i + self.batch_size] for i in range(0, len(assets), self.batch_size)]
+
+    def screen(self, assets: list, fetch, keep, evaluate, side: str, poolsize: int, batch: bool = False) -> list:
+        """Pick up to `poolsize` assets.
+
+        :param assets: entities with a symbol attribute
+        :param fetch: callable taking a list of symbols and returning a dict of symbol -> bars or None, runs on the
+                      fetching threads
+        :param keep: cheap check of an asset's bars, run on the calling thread before the signals are
+        :param evaluate: module level function taking bars and side and returning whether to pick the asset, runs in
+                         the signal processes so it has to be picklable
+        :param side: 'buy' or 'sell'
+        :param poolsize: number of picks wanted
+        :param batch: evaluate takes the kept bars of a whole batch as a dict of symbol -> bars instead, and returns
+                      one boolean per symbol in the dict's order, e.g. signal_engine.any_signal
+        :return: the picked assets
+        """
+        if self.workers == 1:
+            return self._serial(assets, fetch, keep, evaluate, side, poolsize, batch)
+        return self._parallel(assets, fetch, keep, evaluate, side, poolsize, batch)
+
+    @staticmethod
+    def _kept(work: list, frames: dict, keep) -> list:
+        kept = []
+        for asset in work:
+            df = frames.get(asset.symbol)
+            if df is not None and not df.empty and keep(df):
+                kept.append((asset, df))
+        return kept
+
+    def _serial(self, assets: list, fetch, keep, evaluate, side: str, poolsize: int, batch: bool = False) -> list:
+        picks = []
+        for work in self._batches(assets):
+            if len(picks) >= poolsize:
+                break
+            frames = fetch([asset.symbol for asset in work])
+            if batch:
+                kept = self._kept(work, frames, keep)
+                flags = evaluate({asset.symbol: df for asset, df in kept}, side) if kept else []
+                picks.extend([asset for (asset, _), flag in zip(kept, flags) if flag][:poolsize - len(picks)])
+                continue
+            for asset in work:
+                if len(picks) >= poolsize:
+                    break
+                df = frames.get(asset.symbol)
+                if df is not None and not df.empty and keep(df) and evaluate(df, side):
+                    picks.append(asset)
+        return picks
+
+    def _parallel(self, assets: list, fetch, keep, evaluate, side: str, poolsize: int, batch: bool = False) -> list:
+        picks = []
+        # the signal processes start on demand while fetch threads are running, a process forked then can inherit a
+        # lock one of those threads holds and hang on it, so they are started from a fresh interpreter instead
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+        processes = ProcessPoolExecutor(max_workers=self.processes, mp_context=context)
+        threads = ThreadPoolExecutor(max_workers=self.workers)
+        # future -> ('fetch', the batch it fetches), ('batch', the kept assets it evaluates) or ('asset', the asset)
+        pending = dict()
+        try:
+            for work in self._batches(assets):
+                pending[threads.submit(fetch, [asset.symbol for asset in work])] = ('fetch', work)
+
+            while pending and len(picks) < poolsize:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    kind, work = pending.pop(future)
+                    if kind == 'fetch':
+                        kept = self._kept(work, future.result(), keep)
+                        if batch and kept:
+                            frames = {asset.symbol: df for asset, df in kept}
+                            pending[processes.submit(evaluate, frames, side)] = ('batch', [asset for asset, _ in kept])
+                        elif not batch:
+                            for asset, df in kept:
+                                pending[processes.submit(evaluate, df, side)] = ('asset', asset)
+                    elif kind == 'batch':
+                        picked = [asset for asset, flag in zip(work, future.result()) if flag]
+                        picks.extend(picked[:poolsize - len(picks)])
+                    elif future.result() and len(picks) < poolsize:
+                        picks.append(work)
+        finally:
+            for future in pending:
+                if future.cancel():
+                    self.cancelled += 1
+            threads.shutdown(wait=False)
+            processes.shutdown(wait=False)
+        return picks
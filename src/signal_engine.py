@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Trade signals for a whole universe at once.
+
+py_trade_signal computes its indicators with finta one symbol at a time, row by row in places. Here the bars of many
+symbols are stacked into symbols x time arrays and every indicator is computed for all of them in the same NumPy
+operations: exponential averages step through time once with the symbols as a vector, rolling sums are differences
+of cumulative sums.
+
+Indicators follow finta's definitions and the decisions follow py_trade_signal's rules, so a symbol gets the same
+buy and sell decisions here as it does from its own dataframe. Symbols with shorter histories are padded with NaN in
+front, which every indicator treats as not there yet.
+"""
+import pandas as pd
+import numpy as np
+
+BAR_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+SIGNALS = ('macd', 'mfi', 'obv', 'rsi', 'vzo')
+
+# periods finta uses by default
+MACD_FAST = 12
+MACD_SLOW = 26
+MACD_SIGNAL = 9
+MFI_PERIOD = 14
+RSI_PERIOD = 14
+VZO_PERIOD = 14
+DMI_PERIOD = 14
+VZO_EMA_PERIOD = 60
+# OBV is compared with its own exponential average, like the MACD is with its signal line
+OBV_SIGNAL = 20
+
+
+class SignalEngineException(ValueError):
+    pass
+
+
+def stack(frames: dict, symbols: list = None, length: int = None) -> tuple:
+    """Stack bars of many symbols into symbols x time arrays, newest bar last, shorter histories NaN padded in front.
+
+    :param frames: symbol -> bars with at least BAR_FIELDS, compact ones are cast to float64 on the way in
+    :param symbols: symbols to stack in this order, every symbol in frames with bars if not given
+    :param length: keep only the newest `length` bars, the longest history if not given
+    :return: a (symbols, field -> float64 array) tuple
+    """
+    if symbols is None:
+        symbols = [symbol for symbol, df in frames.items() if df is not None and not df.empty]
+    dfs = [frames.get(symbol) for symbol in symbols]
+    if length is None:
+        length = max([len(df) for df in dfs if df is not None] or [0])
+
+    bars = {field: np.full((len(symbols), length), np.nan) for field in BAR_FIELDS}
+    for i, df in enumerate(dfs):
+        if df is None or df.empty:
+            continue
+        df = df.iloc[-length:]
+        n = len(df)
+        for field in BAR_FIELDS:
+            bars[field][i, length - n:] = df[field].values
+    return symbols, bars
+
+
+"""Building blocks, along the time axis of symbols x time arrays"""
+def diff(x: np.ndarray) -> np.ndarray:
+    result = np.full(x.shape, np.nan)
+    result[:, 1:] = x[:, 1:] - x[:, :-1]
+    return result
+
+
+def ewm_mean(x: np.ndarray, alpha: float = None, span: float = None) -> np.ndarray:
+    """pandas' ewm(...).mean() with adjust=True and ignore_na=False, for every row at once.
+
+    Missing values keep their place in the decay but add no weight, so the average carries over them unchanged.
+
+    :param x:
+    :param alpha: smoothing factor
+    :param span: or the span it is derived from, alpha = 2 / (span + 1)
+    :return:
+    """
+    if alpha is None:
+        alpha = 2. / (span + 1.)
+    decay = 1. - alpha
+    valid = ~np.isnan(x)
+    values = np.where(valid, x, 0.)
+
+    # step through time with the symbols as one vector, on time-major copies so every step reads contiguous memory
+    values_t = np.ascontiguousarray(values.T)
+    valid_t = np.ascontiguousarray(valid.T, dtype='float64')
+    result = np.empty_like(values_t)
+    numerator = np.zeros(x.shape[0])
+    denominator = np.zeros(x.shape[0])
+    for t in range(values_t.shape[0]):
+        numerator *= decay
+        numerator += values_t[t]
+        denominator *= decay
+        denominator += valid_t[t]
+        result[t] = numerator
+        result[t] /= np.where(denominator > 0, denominator, np.nan)
+    return result.T
+
+
+def rolling_sum(x: np.ndarray, window: int) -> np.ndarray:
+    """pandas' rolling(window).sum(): NaN unless the whole window has values.
+
+    :param x:
+    :param window:
+    :return:
+    """
+    valid = ~np.isnan(x)
+    sums = np.cumsum(np.where(valid, x, 0.), axis=1)
+    counts = np.cumsum(valid, axis=1)
+    result = np.full(x.shape, np.nan)
+    if x.shape[1] < window:
+        return result
+    totals = sums[:, window - 1:].copy()
+    totals[:, 1:] -= sums[:, :-window]
+    filled = counts[:, window - 1:].copy()
+    filled[:, 1:] -= counts[:, :-window]
+    result[:, window - 1:] = np.where(filled == window, totals, np.nan)
+    return result
+
+
+"""Indicators, as finta defines them"""
+def ema(x: np.ndarray, period: int) -> np.ndarray:
+    return ewm_mean(x, span=period)
+
+
+def macd(close: np.ndarray, fast: int = MACD_FAST, slow: int = MACD_SLOW, signal: int = MACD_SIGNAL) -> tuple:
+    """MACD line and signal line.
+
+    :return: a (macd, signal) tuple
+    """
+    line = ema(close, fast) - ema(close, slow)
+    return line, ema(line, signal)
+
+
+def mfi(high: np.ndarray, low: np.ndarray, close: np.ndarray, volume: np.ndarray, period: int = MFI_PERIOD) -> np.ndarray:
+    tp = (high + low + close) / 3.
+    rmf = tp * volume
+    delta = diff(tp)
+    present = ~np.isnan(close)
+    # a bar without a rise or a fall, the first one included, adds no money flow to either side
+    positive = np.where(present, np.where(delta > 0, rmf, 0.), np.nan)
+    negative = np.where(present, np.where(delta < 0, rmf, 0.), np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = rolling_sum(positive, period) / rolling_sum(negative, period)
+        return 100. - 100. / (1. + ratio)
+
+
+def obv(close: np.ndarray, volume: np.ndarray) -> np.ndarray:
+    """On balance volume. Bars whose close did not change, and the first bar, are NaN like in finta.
+
+    :param close:
+    :param volume:
+    :return:
+    """
+    change = diff(close)
+    flow = np.where(change > 0, volume, np.where(change < 0, -volume, np.nan))
+    total = np.cumsum(np.where(np.isnan(flow), 0., flow), axis=1)
+    return np.where(np.isnan(flow), np.nan, total)
+
+
+def rsi(close: np.ndarray, period: int = RSI_PERIOD) -> np.ndarray:
+    delta = diff(close)
+    gain = ewm_mean(np.where(delta < 0, 0., delta), alpha=1. / period)
+    loss = ewm_mean(np.abs(np.where(delta > 0, 0., delta)), alpha=1. / period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 100. - 100. / (1. + gain / loss)
+
+
+def vzo(close: np.ndarray, volume: np.ndarray, period: int = VZO_PERIOD) -> np.ndarray:
+    present = ~np.isnan(close)
+    # the first bar has no direction, it counts as volume moving neither way
+    direction = np.sign(np.nan_to_num(diff(close)))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 100. * ewm_mean(np.where(present, direction * volume, np.nan), span=period) / ema(volume, period)
+
+
+def dmi(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int = DMI_PERIOD) -> tuple:
+    """Directional movement index.
+
+    :return: a (DI+, DI-) tuple
+    """
+    present = ~np.isnan(close)
+    up = diff(high)
+    down = -diff(low)
+    plus = np.where(present, np.where((up > down) & (up > 0), up, 0.), np.nan)
+    minus = np.where(present, np.where((down > up) & (down > 0), down, 0.), np.nan)
+
+    previous = np.full(close.shape, np.nan)
+    previous[:, 1:] = close[:, :-1]
+    # fmax skips NaN like finta's row max, so the first bar's true range is its high - low
+    true_range = np.fmax(np.fmax(np.abs(high - low), np.abs(high - previous)), np.abs(previous - low))
+    true_range = np.where(present, true_range, np.nan)
+    atr = rolling_sum(true_range, period) / period
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (100. * ewm_mean(plus / atr, alpha=1. / period),
+                100. * ewm_mean(minus / atr, alpha=1. / period))
+
+
+def adx(plus: np.ndarray, minus: np.ndarray, period: int = DMI_PERIOD) -> np.ndarray:
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 100. * ewm_mean(np.abs(plus - minus) / (plus + minus), alpha=1. / period)
+
+
+"""Decisions, as py_trade_signal takes them"""
+def _before(x: np.ndarray) -> np.ndarray:
+    # py_trade_signal looks back at the 4th and 3rd newest values, x.iloc[-4:-2]
+    return x[:, -4:-2]
+
+
+def _min_before(x: np.ndarray) -> np.ndarray:
+    # a NaN among them makes the minimum NaN, and every comparison with it False
+    return np.min(_before(x), axis=1)
+
+
+def _crossings(line: np.ndarray, signal: np.ndarray, side: str) -> np.ndarray:
+    # MacdSignal's rule: below zero and crossing above the signal line to buy, above zero and crossing below to sell
+    last, reference, earlier = line[:, -1], signal[:, -1], _min_before(line)
+    with np.errstate(invalid='ignore'):
+        if side == 'buy':
+            return (last < 0) & (earlier < reference) & (last > reference)
+        return (last > 0) & (earlier > reference) & (last < reference)
+
+
+def _band(oscillator: np.ndarray, side: str, low: float, high: float) -> np.ndarray:
+    # MfiSignal's rule: above the level now, at or below it before
+    level = low if side == 'buy' else high
+    with np.errstate(invalid='ignore'):
+        return (oscillator[:, -1] > level) & (_min_before(oscillator) <= level)
+
+
+def signals(bars: dict, side: str) -> np.ndarray:
+    """Buy or sell decisions of every signal for every symbol.
+
+    MACD, MFI and VZO follow py_trade_signal's MacdSignal, MfiSignal and VzoSignal. RSI follows MfiSignal's rule with
+    RSI's own 30 and 70 levels, and OBV follows MacdSignal's crossover rule against an OBV_SIGNAL period average of
+    the OBV, without the zero line condition an unbounded OBV has no use for.
+
+    :param bars: field -> symbols x time arrays, see stack
+    :param side: 'buy' or 'sell'
+    :return: symbols x SIGNALS boolean array
+    """
+    if side not in ('buy', 'sell'):
+        raise SignalEngineException(f'[!] Invalid side {side}.')
+
+    if bars['close'].shape[1] < 4:
+        return np.zeros((bars['close'].shape[0], len(SIGNALS)), dtype=bool)
+
+    high, low, close, volume = bars['high'], bars['low'], bars['close'], bars['volume']
+
+    macd_signal = _crossings(*macd(close), side)
+    mfi_signal = _band(mfi(high, low, close, volume), side, 10., 90.)
+    rsi_signal = _band(rsi(close), side, 30., 70.)
+
+    balance = obv(close, volume)
+    reference, last, earlier = ema(balance, OBV_SIGNAL)[:, -1], balance[:, -1], _min_before(balance)
+    with np.errstate(invalid='ignore'):
+        if side == 'buy':
+            obv_signal = (earlier < reference) & (last > reference)
+        else:
+            obv_signal = (earlier > reference) & (last < reference)
+
+    # VzoSignal: a VZO crossover of the 40 level, confirmed by the trend and a close crossing its 60 period EMA
+    zone = vzo(close, volume)
+    plus, minus = dmi(high, low, close)
+    strength = adx(plus, minus)[:, -1]
+    trend = ema(close, VZO_EMA_PERIOD)
+    zone_before = np.mean(_before(zone), axis=1)
+    close_before, trend_before = np.mean(_before(close), axis=1), np.mean(_before(trend), axis=1)
+    with np.errstate(invalid='ignore'):
+        if side == 'buy':
+            vzo_signal = (zone[:, -1] > -40) & (zone_before <= -40) & \
+                         ((strength > 20) | (plus[:, -1] > minus[:, -1])) & \
+                         (close[:, -1] > trend[:, -1]) & (close_before < trend_before)
+        else:
+            vzo_signal = (zone[:, -1] < 40) & (zone_before >= 40) & \
+                         ((strength < 20) | (minus[:, -1] > plus[:, -1])) & \
+                         (close[:, -1] < trend[:, -1]) & (close_before > trend_before)
+
+    return np.column_stack([macd_signal, mfi_signal, obv_signal, rsi_signal, vzo_signal])
+
+
+def signal_frame(frames: dict, side: str, symbols: list = None) -> pd.DataFrame:
+    """Buy or sell decisions of every signal for many symbols' bars.
+
+    :param frames: symbol -> bars
+    :param side: 'buy' or 'sell'
+    :param symbols: see stack
+    :return: dataframe of SIGNALS columns indexed by symbol
+    """
+    symbols, bars = stack(frames, symbols)
+    return pd.DataFrame(signals(bars, side), index=pd.Index(symbols, name='symbol'), columns=list(SIGNALS))
+
+
+def any_signal(frames: dict, side: str, symbols: list = None) -> np.ndarray:
+    """Whether any of the signals agrees with the side, per symbol, like AssetSelector screens.
+
+    :param frames: symbol -> bars
+    :param side: 'buy' or 'sell'
+    :param symbols: see stack
+    :return: boolean array in the order of symbols
+    """
+    symbols, bars = stack(frames, symbols)
+    return signals(bars, side).any(axis=1)
@@ -0,0 +1,602 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from broker import BrokerValidationException
+from broker.bars import NY, PERIOD_SECONDS, to_timestamp
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+from urllib.parse import urlparse, parse_qs
+from alpaca_trade_api.rest import REST
+import pandas as pd
+import numpy as np
+import threading
+import random
+import json
+import uuid
+import zlib
+import time
+import re
+
+SESSION_OPEN = '09:30'
+SESSION_CLOSE = '16:00'
+
+# status and payload of the errors the API answers with
+NOT_FOUND = (404, {'code': 40410000, 'message': 'resource not found'})
+UNAUTHORIZED = (401, {'code': 40110000, 'message': 'request is not authorized'})
+UNPROCESSABLE = (422, {'code': 42210000, 'message': 'request is invalid'})
+RATE_LIMITED = (429, {'code': 42910000, 'message': 'rate limit exceeded'})
+
+ROUTES = [
+    ('GET',     r'/v2/account',                             '_account'),
+    ('GET',     r'/v2/clock',                               '_clock'),
+    ('GET',     r'/v2/calendar',                            '_calendar'),
+    ('GET',     r'/v2/assets',                              '_list_assets'),
+    ('GET',     r'/v2/assets/(?P<symbol>[^/]+)',            '_get_asset'),
+    ('GET',     r'/v1/bars/(?P<timeframe>[^/]+)',           '_bars'),
+    ('GET',     r'/v2/orders',                              '_list_orders'),
+    ('POST',    r'/v2/orders',                              '_submit_order'),
+    ('DELETE',  r'/v2/orders',                              '_cancel_all_orders'),
+    ('GET',     r'/v2/orders:by_client_order_id',           '_get_order_by_client_order_id'),
+    ('GET',     r'/v2/orders/(?P<order_id>[^/]+)',          '_get_order'),
+    ('PATCH',   r'/v2/orders/(?P<order_id>[^/]+)',          '_replace_order'),
+    ('DELETE',  r'/v2/orders/(?P<order_id>[^/]+)',          '_cancel_order'),
+    ('GET',     r'/v2/positions',                           '_list_positions'),
+    ('DELETE',  r'/v2/positions',                           '_close_all_positions'),
+    ('GET',     r'/v2/positions/(?P<symbol>[^/]+)',         '_get_position'),
+    ('DELETE',  r'/v2/positions/(?P<symbol>[^/]+)',         '_close_position'),
+    ('GET',     r'/v2/watchlists',                          '_list_watchlists'),
+    ('POST',    r'/v2/watchlists',                          '_add_watchlist'),
+    ('GET',     r'/v2/watchlists/(?P<watchlist_id>[^/]+)',  '_get_watchlist'),
+    ('POST',    r'/v2/watchlists/(?P<watchlist_id>[^/]+)',  '_add_to_watchlist'),
+    ('PATCH',   r'/v2/watchlists/(?P<watchlist_id>[^/]+)',  '_update_watchlist'),
+    ('DELETE',  r'/v2/watchlists/(?P<watchlist_id>[^/]+)',  '_delete_watchlist'),
+    ('DELETE',  r'/v2/watchlists/(?P<watchlist_id>[^/]+)/(?P<symbol>[^/]+)', '_delete_from_watchlist'),
+]
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class FakeREST(REST):
+    """alpaca_trade_api reads the data URL from APCA_API_DATA_URL on every data request, this client has its own."""
+
+    def __init__(self, data_url: str, **kwargs):
+        super().__init__(**kwargs)
+        self._data_url = data_url.rstrip('/')
+
+    def data_get(self, path, data=None):
+        return self._request('GET', path, data, base_url=self._data_url, api_version='v1')
+
+
+class FakeAlpacaServer:
+
+    def __init__(self,
+                 symbols: list = None,
+                 universe_size: int = 100,
+                 days: int = 400,
+                 minute_days: int = 5,
+                 as_of: str = None,
+                 cash: float = 100000.,
+                 latency: float = 0.,
+                 jitter: float = 0.,
+                 rate_limit: int = None,
+                 key_id: str = None,
+                 seed: int = 0,
+                 host: str = '127.0.0.1',
+                 port: int = 0):
+        """A local stand-in for the Alpaca trading and data APIs.
+
+        Serves the endpoints Broker uses (account, clock, calendar, assets, bars, orders, positions and watchlists)
+        over HTTP on loopback, so the broker, the selectors and the algos run unchanged against it through a
+        regular REST client. Bars are a deterministic random walk per symbol, or frames loaded with load_frames.
+        Market orders fill right away at the last close and move cash and positions. Every request can be delayed
+        to mimic network latency, and requests beyond the rate limit are answered with 429 like the real API.
+
+        :param symbols: ticker symbols to list, generated names are used if not given
+        :param universe_size: number of symbols to generate when symbols is not given
+        :param days: trading days of synthetic daily bars
+        :param minute_days: trading days of synthetic intraday bars
+        :param as_of: last day of synthetic data, today if not given
+        :param cash: starting account cash
+        :param latency: seconds every request is delayed by
+        :param jitter: up to this many more seconds, drawn uniformly per request
+        :param rate_limit: requests per minute before answering 429, unlimited if not given
+        :param key_id: if given, requests with a different key id are rejected
+        :param seed: seed for the synthetic data
+        :param host:
+        :param port: 0 picks a free port
+        """
+        if universe_size < 1 or days < 1 or minute_days < 1:
+            raise BrokerValidationException('[!] universe_size, days and minute_days must be at least 1.')
+
+        if latency < 0 or jitter < 0:
+            raise BrokerValidationException('[!] latency and jitter cannot be negative.')
+
+        self.symbols = list(symbols) if symbols else ['S{:05d}'.format(i) for i in range(universe_size)]
+        self.days = days
+        self.minute_days = minute_days
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.key_id = key_id
+        self.seed = seed
+        self.host = host
+        self.port = port
+
+        as_of = pd.Timestamp(as_of) if as_of is not None else pd.Timestamp.now(tz=NY).tz_localize(None)
+        self.sessions = pd.bdate_range(end=as_of.normalize(), periods=days)
+        # the calendar runs a year past the data, like the real one does
+        self.calendar = pd.bdate_range(start=self.sessions[0], end=as_of.normalize() + pd.Timedelta(days=365))
+        self.assets = self._make_assets()
+        self.cash = float(cash)
+        self.orders = dict()
+        self.positions = dict()
+        self.watchlists = dict()
+        self.requests = dict()
+        self.throttled = 0
+
+        self._frames = dict()
+        self._lock = threading.RLock()
+        self._rng = random.Random(seed)
+        self._tokens = float(rate_limit) if rate_limit else None
+        self._updated = time.monotonic()
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return 'http://{}:{}'.format(self.host, self.port)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def start(self) -> None:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # headers and body go out as separate writes, don't let them wait on delayed acks
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                server._serve(self)
+
+            do_POST = do_PATCH = do_DELETE = do_GET
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = _ThreadingHTTPServer((self.host, self.port), Handler)
+        self.port = self._httpd.server_address[1]
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self._thread.join()
+
+    def rest(self, key_id: str = None, secret_key: str = 'secret') -> REST:
+        """A REST client pointed at this server, data requests included.
+
+        :param key_id:
+        :param secret_key:
+        :return:
+        """
+        return FakeREST(self.url, key_id=key_id or self.key_id or 'key', secret_key=secret_key, base_url=self.url,
+                        api_version='v2')
+
+    def load_frames(self, timeframe: str, frames: dict) -> None:
+        """Serve recorded bars, e.g. frames from a BarStore, instead of synthetic ones.
+
+        :param timeframe:
+        :param frames: dict of symbol -> OHLCV dataframe with a datetime index
+        :return:
+        """
+        with self._lock:
+            for symbol, df in frames.items():
+                if symbol not in self.symbols:
+                    self.symbols.append(symbol)
+                    self.assets[symbol] = self._make_asset(symbol)
+                t = df.index.values.astype('datetime64[s]').astype('int64')
+                values = df[['open', 'high', 'low', 'close', 'volume']].values
+                self._frames[(symbol, timeframe)] = (t, values)
+
+    def stats(self) -> dict:
+        """Requests served per route, and how many were answered with 429.
+
+        :return:
+        """
+        with self._lock:
+            return {'requests': dict(self.requests), 'throttled': self.throttled}
+
+    """Request handling"""
+    def _serve(self, handler: BaseHTTPRequestHandler) -> None:
+        url = urlparse(handler.path)
+        length = int(handler.headers.get('Content-Length') or 0)
+        body = handler.rfile.read(length) if length else b''
+
+        status, payload = self._dispatch(handler.command, url.path, parse_qs(url.query), body, handler.headers)
+
+        data = json.dumps(payload).encode('utf-8') if payload is not None else b''
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def _dispatch(self, method: str, path: str, query: dict, body: bytes, headers) -> tuple:
+        if self.latency or self.jitter:
+            time.sleep(self.latency + self._rng.uniform(0, self.jitter))
+
+        if self.key_id is not None and headers.get('APCA-API-KEY-ID') != self.key_id:
+            return UNAUTHORIZED
+
+        if not self._admit():
+            return RATE_LIMITED
+
+        params = {key: values[-1] for key, values in query.items()}
+        if body:
+            params.update(json.loads(body.decode('utf-8')))
+
+        for route_method, pattern, name in ROUTES:
+            match = re.fullmatch(pattern, path)
+            if route_method == method and match:
+                with self._lock:
+                    self.requests[name] = self.requests.get(name, 0) + 1
+                    return getattr(self, name)(params, **match.groupdict())
+        return NOT_FOUND
+
+    def _admit(self) -> bool:
+        if self.rate_limit is None:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.rate_limit, self._tokens + (now - self._updated) * self.rate_limit / 60.)
+            self._updated = now
+            if self._tokens < 1:
+                self.throttled += 1
+                return False
+            self._tokens -= 1
+            return True
+
+    """Synthetic data"""
+    def _make_assets(self) -> dict:
+        return {symbol: self._make_asset(symbol) for symbol in self.symbols}
+
+    def _make_asset(self, symbol: str) -> dict:
+        rng = random.Random(zlib.crc32(symbol.encode()) ^ self.seed)
+        marginable = rng.random() < .8
+        shortable = marginable and rng.random() < .8
+        return {
+            'id':               str(uuid.UUID(int=rng.getrandbits(128))),
+            'class':            'us_equity',
+            'exchange':         rng.choice(['NYSE', 'NASDAQ', 'ARCA']),
+            'symbol':           symbol,
+            'status':           'active',
+            'tradable':         rng.random() < .95,
+            'marginable':       marginable,
+            'shortable':        shortable,
+            'easy_to_borrow':   shortable and rng.random() < .8,
+        }
+
+    def _bar_arrays(self, symbol: str, timeframe: str) -> tuple:
+        key = (symbol, timeframe)
+        if key not in self._frames:
+            self._frames[key] = self._synthetic_bars(symbol, timeframe)
+        return self._frames[key]
+
+    def _synthetic_bars(self, symbol: str, timeframe: str) -> tuple:
+        period = PERIOD_SECONDS[timeframe]
+        # midnight New York time of every session, as epoch seconds
+        t = self.sessions.tz_localize(NY).values.astype('datetime64[s]').astype('int64')
+        if period != PERIOD_SECONDS['day']:
+            opens = t[-self.minute_days:] + int(pd.Timedelta(SESSION_OPEN + ':00').total_seconds())
+            t = (opens[:, None] + np.arange(0, 390 * 60, period)[None, :]).ravel()
+
+        # the same starting price for every timeframe of a symbol
+        base = random.Random(zlib.crc32(symbol.encode()) ^ self.seed).uniform(2, 400)
+        rng = np.random.RandomState((zlib.crc32((symbol + timeframe).encode()) ^ self.seed) & 0xffffffff)
+        scale = .02 * np.sqrt(period / 86400.)
+        close = base * np.exp(np.cumsum(rng.normal(0, scale, len(t))))
+        open_ = np.concatenate([[base], close[:-1]])
+        high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, scale / 2, len(t))))
+        low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, scale / 2, len(t))))
+        volume = rng.randint(100, 100000, len(t)) * max(1, period // 60)
+        return t, np.column_stack([open_, high, low, close, volume]).round(4)
+
+    def _last_price(self, symbol: str) -> float:
+        t, values = self._bar_arrays(symbol, 'minute')
+        return float(values[-1, 3])
+
+    """Account, clock and calendar"""
+    def _account(self, params: dict) -> tuple:
+        equity = self.cash + sum(float(pos['market_value']) for pos in self.positions.values())
+        return 200, {
+            'id':                   '00000000-0000-0000-0000-000000000000',
+            'account_number':       'FAKE0001',
+            'status':               'ACTIVE',
+            'currency':             'USD',
+            'cash':                 str(round(self.cash, 2)),
+            'buying_power':         str(round(self.cash * 2, 2)),
+            'regt_buying_power':    str(round(self.cash * 2, 2)),
+            'portfolio_value':      str(round(equity, 2)),
+            'equity':               str(round(equity, 2)),
+            'last_equity':          str(round(equity, 2)),
+            'pattern_day_trader':   False,
+            'trading_blocked':      False,
+            'transfers_blocked':    False,
+            'account_blocked':      False,
+            'shorting_enabled':     True,
+            'multiplier':           '2',
+        }
+
+    def _clock(self, params: dict) -> tuple:
+        now = pd.Timestamp.now(tz=NY)
+        today = now.normalize()
+        is_session = now.dayofweek < 5
+        opens = today + pd.Timedelta(SESSION_OPEN + ':00')
+        closes = today + pd.Timedelta(SESSION_CLOSE + ':00')
+        is_open = bool(is_session and opens <= now < closes)
+
+        next_day = (today + pd.offsets.BDay(1)).normalize()
+        next_open = opens if is_session and now < opens else next_day + pd.Timedelta(SESSION_OPEN + ':00')
+        next_close = closes if is_session and now < closes else next_day + pd.Timedelta(SESSION_CLOSE + ':00')
+        return 200, {
+            'timestamp':    now.isoformat(),
+            'is_open':      is_open,
+            'next_open':    next_open.isoformat(),
+            'next_close':   next_close.isoformat(),
+        }
+
+    def _calendar(self, params: dict) -> tuple:
+        sessions = self.calendar
+        if params.get('start'):
+            sessions = sessions[sessions >= pd.Timestamp(params['start'])]
+        if params.get('end'):
+            sessions = sessions[sessions <= pd.Timestamp(params['end'])]
+        return 200, [{
+            'date':             session.strftime('%Y-%m-%d'),
+            'open':             SESSION_OPEN,
+            'close':            SESSION_CLOSE,
+            'session_open':     SESSION_OPEN.replace(':', ''),
+            'session_close':    SESSION_CLOSE.replace(':', ''),
+        } for session in sessions]
+
+    """Assets and bars"""
+    def _list_assets(self, params: dict) -> tuple:
+        status = params.get('status')
+        return 200, [asset for asset in self.assets.values() if status is None or asset['status'] == status]
+
+    def _get_asset(self, params: dict, symbol: str) -> tuple:
+        if symbol not in self.assets:
+            return NOT_FOUND
+        return 200, self.assets[symbol]
+
+    def _bars(self, params: dict, timeframe: str) -> tuple:
+        if timeframe not in PERIOD_SECONDS:
+            return UNPROCESSABLE
+
+        symbols = [symbol for symbol in params.get('symbols', '').split(',') if symbol]
+        limit = int(params.get('limit', 100))
+        if not symbols or len(symbols) > 200 or not 0 < limit <= 1000:
+            return UNPROCESSABLE
+
+        bounds = [(params.get(name), side) for name, side in
+                  (('start', 'ge'), ('after', 'gt'), ('end', 'le'), ('until', 'lt'))]
+        result = dict()
+        for symbol in symbols:
+            if symbol not in self.assets:
+                result[symbol] = []
+                continue
+            t, values = self._bar_arrays(symbol, timeframe)
+            mask = np.ones(len(t), dtype=bool)
+            for value, side in bounds:
+                if value is None:
+                    continue
+                seconds = to_timestamp(value).value // 10 ** 9
+                mask &= {'ge': t >= seconds, 'gt': t > seconds, 'le': t <= seconds, 'lt': t < seconds}[side]
+            rows = np.flatnonzero(mask)[-limit:]
+            result[symbol] = [{'t': int(t[i]), 'o': values[i, 0], 'h': values[i, 1], 'l': values[i, 2],
+                               'c': values[i, 3], 'v': int(values[i, 4])} for i in rows]
+        return 200, result
+
+    """Orders and positions"""
+    def _list_orders(self, params: dict) -> tuple:
+        status = params.get('status', 'open')
+        orders = list(self.orders.values())
+        if status == 'open':
+            orders = [order for order in orders if order['status'] in ('new', 'accepted', 'partially_filled')]
+        elif status == 'closed':
+            orders = [order for order in orders if order['status'] not in ('new', 'accepted', 'partially_filled')]
+        if params.get('after'):
+            after = to_timestamp(params['after'])
+            orders = [order for order in orders if pd.Timestamp(order['submitted_at']) > after]
+        if params.get('until'):
+            until = to_timestamp(params['until'])
+            orders = [order for order in orders if pd.Timestamp(order['submitted_at']) < until]
+        orders.sort(key=lambda order: order['submitted_at'], reverse=params.get('direction', 'desc') == 'desc')
+        return 200, orders[:int(params.get('limit', 50))]
+
+    def _submit_order(self, params: dict) -> tuple:
+        symbol = params.get('symbol')
+        if symbol not in self.assets or params.get('side') not in ('buy', 'sell') or int(params.get('qty', 0)) < 1:
+            return UNPROCESSABLE
+
+        now = pd.Timestamp.now(tz='UTC').isoformat()
+        order = {
+            'id':               str(uuid.uuid4()),
+            'client_order_id':  params.get('client_order_id') or str(uuid.uuid4()),
+            'created_at':       now,
+            'updated_at':       now,
+            'submitted_at':     now,
+            'filled_at':        None,
+            'canceled_at':      None,
+            'asset_id':         self.assets[symbol]['id'],
+            'symbol':           symbol,
+            'asset_class':      'us_equity',
+            'qty':              str(params['qty']),
+            'filled_qty':       '0',
+            'filled_avg_price': None,
+            'type':             params.get('type'),
+            'side':             params['side'],
+            'time_in_force':    params.get('time_in_force'),
+            'limit_price':      params.get('limit_price'),
+            'stop_price':       params.get('stop_price'),
+            'status':           'new',
+            'extended_hours':   bool(params.get('extended_hours', False)),
+        }
+        self.orders[order['id']] = order
+        if order['type'] == 'market':
+            self._fill(order, self._last_price(symbol))
+        return 200, order
+
+    def _fill(self, order: dict, price: float) -> None:
+        qty = int(order['qty'])
+        signed = qty if order['side'] == 'buy' else -qty
+        order.update(status='filled', filled_qty=str(qty), filled_avg_price=str(price),
+                     filled_at=pd.Timestamp.now(tz='UTC').isoformat())
+        self.cash -= signed * price
+
+        symbol = order['symbol']
+        position = self.positions.get(symbol)
+        held = int(position['qty']) if position else 0
+        cost = float(position['cost_basis']) if position else 0.
+        held, cost = held + signed, cost + signed * price
+        if held == 0:
+            self.positions.pop(symbol, None)
+            return
+        self.positions[symbol] = {
+            'asset_id':         order['asset_id'],
+            'symbol':           symbol,
+            'exchange':         self.assets[symbol]['exchange'],
+            'asset_class':      'us_equity',
+            'qty':              str(held),
+            'side':             'long' if held > 0 else 'short',
+            'avg_entry_price':  str(round(cost / held, 4)),
+            'cost_basis':       str(round(cost, 4)),
+            'market_value':     str(round(held * price, 4)),
+            'current_price':    str(price),
+            'unrealized_pl':    str(round(held * price - cost, 4)),
+        }
+
+    def _get_order(self, params: dict, order_id: str) -> tuple:
+        if order_id not in self.orders:
+            return NOT_FOUND
+        return 200, self.orders[order_id]
+
+    def _get_order_by_client_order_id(self, params: dict) -> tuple:
+        for order in self.orders.values():
+            if order['client_order_id'] == params.get('client_order_id'):
+                return 200, order
+        return NOT_FOUND
+
+    def _replace_order(self, params: dict, order_id: str) -> tuple:
+        order = self.orders.get(order_id)
+        if order is None or order['status'] != 'new':
+            return UNPROCESSABLE
+        order['status'] = 'replaced'
+        replacement = dict(order, id=str(uuid.uuid4()), status='new', replaces=order_id)
+        for key in ('qty', 'time_in_force', 'limit_price', 'stop_price', 'client_order_id'):
+            if params.get(key) is not None:
+                replacement[key] = str(params[key]) if key == 'qty' else params[key]
+        order['replaced_by'] = replacement['id']
+        self.orders[replacement['id']] = replacement
+        return 200, replacement
+
+    def _cancel_order(self, params: dict, order_id: str) -> tuple:
+        order = self.orders.get(order_id)
+        if order is None:
+            return NOT_FOUND
+        if order['status'] != 'new':
+            return UNPROCESSABLE
+        order.update(status='canceled', canceled_at=pd.Timestamp.now(tz='UTC').isoformat())
+        return 204, None
+
+    def _cancel_all_orders(self, params: dict) -> tuple:
+        canceled = []
+        for order_id, order in self.orders.items():
+            if order['status'] == 'new':
+                self._cancel_order(params, order_id)
+                canceled.append({'id': order_id, 'status': 200, 'body': order})
+        return 207, canceled
+
+    def _list_positions(self, params: dict) -> tuple:
+        return 200, list(self.positions.values())
+
+    def _get_position(self, params: dict, symbol: str) -> tuple:
+        if symbol not in self.positions:
+            return 404, {'code': 40410000, 'message': 'position does not exist'}
+        return 200, self.positions[symbol]
+
+    def _close_position(self, params: dict, symbol: str) -> tuple:
+        position = self.positions.get(symbol)
+        if position is None:
+            return 404, {'code': 40410000, 'message': 'position does not exist'}
+        qty = int(position['qty'])
+        return self._submit_order({'symbol': symbol, 'qty': abs(qty), 'side': 'sell' if qty > 0 else 'buy',
+                                   'type': 'market', 'time_in_force': 'day'})
+
+    def _close_all_positions(self, params: dict) -> tuple:
+        return 207, [{'symbol': symbol, 'status': 200, 'body': self._close_position(params, symbol)[1]}
+                     for symbol in list(self.positions)]
+
+    """Watchlists"""
+    def _list_watchlists(self, params: dict) -> tuple:
+        return 200, [dict(watchlist, assets=None) for watchlist in self.watchlists.values()]
+
+    def _add_watchlist(self, params: dict) -> tuple:
+        if not params.get('name'):
+            return UNPROCESSABLE
+        now = pd.Timestamp.now(tz='UTC').isoformat()
+        watchlist = {
+            'id':           str(uuid.uuid4()),
+            'account_id':   '00000000-0000-0000-0000-000000000000',
+            'name':         params['name'],
+            'created_at':   now,
+            'updated_at':   now,
+            'assets':       [],
+        }
+        self.watchlists[watchlist['id']] = watchlist
+        return 200, watchlist
+
+    def _get_watchlist(self, params: dict, watchlist_id: str) -> tuple:
+        if watchlist_id not in self.watchlists:
+            return NOT_FOUND
+        return 200, self.watchlists[watchlist_id]
+
+    def _add_to_watchlist(self, params: dict, watchlist_id: str) -> tuple:
+        watchlist = self.watchlists.get(watchlist_id)
+        symbol = params.get('symbol')
+        if watchlist is None:
+            return NOT_FOUND
+        if symbol not in self.assets:
+            return UNPROCESSABLE
+        watchlist['assets'].append(self.assets[symbol])
+        return 200, watchlist
+
+    def _update_watchlist(self, params: dict, watchlist_id: str) -> tuple:
+        watchlist = self.watchlists.get(watchlist_id)
+        if watchlist is None:
+            return NOT_FOUND
+        if params.get('name'):
+            watchlist['name'] = params['name']
+        if params.get('symbols') is not None:
+            watchlist['assets'] = [self.assets[symbol] for symbol in params['symbols'] if symbol in self.assets]
+        return 200, watchlist
+
+    def _delete_watchlist(self, params: dict, watchlist_id: str) -> tuple:
+        if self.watchlists.pop(watchlist_id, None) is None:
+            return NOT_FOUND
+        return 204, None
+
+    def _delete_from_watchlist(self, params: dict, watchlist_id: str, symbol: str) -> tuple:
+        watchlist = self.watchlists.get(watchlist_id)
+        if watchlist is None:
+            return NOT_FOUND
+        watchlist['assets'] = [asset for asset in watchlist['assets'] if asset['symbol'] != symbol]
+        return 200, watchlist
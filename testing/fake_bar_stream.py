@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from broker.bar_stream import _text
+import websockets
+import threading
+import asyncio
+import json
+
+
+class BarReplayServer:
+
+    def __init__(self, bars: list, host: str = '127.0.0.1', port: int = 0, interval: float = 0.):
+        """A loopback stand-in for the bar stream that replays recorded minute bars.
+
+        It accepts any credentials, and after each listen message pushes the recorded bars of the newly listened
+        symbols in time order.
+
+        :param bars: AM message payloads, dicts with T, s, o, h, l, c, v
+        :param host:
+        :param port: 0 picks a free port
+        :param interval: seconds to wait between bars
+        """
+        self.bars = sorted(bars, key=lambda bar: bar['s'])
+        self.host = host
+        self.port = port
+        self.interval = interval
+        self._loop = None
+        self._server = None
+        self._thread = None
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs):
+        """Replay a file recorded with BarStream(record_path=...).
+
+        :param path:
+        :param kwargs:
+        :return:
+        """
+        bars = []
+        with open(path) as fh:
+            for line in fh:
+                msg = json.loads(line)
+                if msg.get('stream', '').startswith('AM.'):
+                    bars.append(msg['data'])
+        return cls(bars, **kwargs)
+
+    @classmethod
+    def from_frames(cls, frames: dict, **kwargs):
+        """Replay OHLCV dataframes, e.g. minute bars from Broker.get_assets_df.
+
+        :param frames: dict of symbol -> dataframe
+        :param kwargs:
+        :return:
+        """
+        bars = []
+        for symbol, df in frames.items():
+            starts = df.index.values.astype('datetime64[ms]').astype('int64')
+            for start, row in zip(starts, df[['open', 'high', 'low', 'close', 'volume']].values):
+                bars.append({'ev': 'AM', 'T': symbol, 's': int(start), 'o': row[0], 'h': row[1], 'l': row[2],
+                             'c': row[3], 'v': row[4]})
+        return cls(bars, **kwargs)
+
+    @property
+    def url(self) -> str:
+        return 'ws://{}:{}'.format(self.host, self.port)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def start(self) -> None:
+        self._loop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        def serve():
+            asyncio.set_event_loop(self._loop)
+            self._server = self._loop.run_until_complete(self._serve())
+            self.port = self._server.sockets[0].getsockname()[1]
+            ready.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=serve, daemon=True)
+        self._thread.start()
+        ready.wait()
+
+    def stop(self) -> None:
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    async def _serve(self):
+        return await websockets.serve(self._handle, self.host, self.port)
+
+    async def _shutdown(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, ws, path=None):
+        try:
+            await ws.recv()
+            await ws.send(json.dumps({'stream': 'authorization', 'data': {'action': 'authenticate', 'status': 'authorized'}}))
+            async for message in ws:
+                msg = json.loads(_text(message))
+                if msg.get('action') != 'listen':
+                    continue
+                streams = msg['data']['streams']
+                await ws.send(json.dumps({'stream': 'listening', 'data': {'streams': streams}}))
+                symbols = set(stream.split('.', 1)[1] for stream in streams)
+                for bar in self.bars:
+                    if bar['T'] in symbols:
+                        await ws.send(json.dumps({'stream': 'AM.{}'.format(bar['T']), 'data': bar}))
+                        if self.interval:
+                            await asyncio.sleep(self.interval)
+        except websockets.ConnectionClosed:
+            return
@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from broker.forex_broker import GRANULARITIES, _nanoseconds
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+from urllib.parse import urlparse, parse_qs
+import pandas as pd
+import threading
+import json
+import time
+import re
+import v20
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class PriceReplayServer:
+
+    ACCOUNT_ID = '101-001-0000000-001'
+
+    def __init__(self, prices: list, balance: float = 100000., host: str = '127.0.0.1', port: int = 0,
+                 interval: float = 0., heartbeat: float = 5.):
+        """A loopback stand-in for the v20 account and pricing stream endpoints that replays recorded prices.
+
+        Stream requests get the recorded prices of the requested instruments in time order, then heartbeats until
+        the client goes away, like the live stream between prices.
+
+        :param prices: v20 Price dicts, with instrument, time, bids and asks
+        :param balance: balance and margin available of the one account it serves
+        :param host:
+        :param port: 0 picks a free port
+        :param interval: seconds to wait between prices
+        :param heartbeat: seconds between heartbeats
+        """
+        self.prices = sorted(prices, key=lambda price: _nanoseconds(price['time']))
+        self.balance = balance
+        self.host = host
+        self.port = port
+        self.interval = interval
+        self.heartbeat = heartbeat
+        self._stopping = threading.Event()
+        self._httpd = None
+        self._thread = None
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs):
+        """Replay a file recorded with ForexBroker(record_path=...).
+
+        :param path:
+        :param kwargs:
+        :return:
+        """
+        with open(path) as fh:
+            prices = [json.loads(line) for line in fh if line.strip()]
+        return cls(prices, **kwargs)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def context(self, token: str = 'replay') -> v20.Context:
+        """A v20 Context pointed at this server, usable for both the REST and the stream side.
+
+        :param token:
+        :return:
+        """
+        return v20.Context(self.host, self.port, ssl=False, token=token, stream_timeout=max(10, 2 * self.heartbeat))
+
+    def start(self) -> None:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                server._serve(self)
+
+            def log_message(self, *args):
+                pass
+
+        self._stopping.clear()
+        self._httpd = _ThreadingHTTPServer((self.host, self.port), Handler)
+        self.port = self._httpd.server_address[1]
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self._thread.join()
+
+    def _serve(self, handler: BaseHTTPRequestHandler) -> None:
+        url = urlparse(handler.path)
+        path = url.path.rstrip('/')
+
+        if path == '/v3/accounts':
+            return self._send(handler, 200, {'accounts': [{'id': self.ACCOUNT_ID, 'tags': []}]})
+
+        query = parse_qs(url.query)
+        match = re.fullmatch(r'/v3/instruments/(?P<instrument>[^/]+)/candles', path)
+        if match is not None:
+            return self._send(handler, 200, self._candles(match.group('instrument'), query))
+
+        match = re.fullmatch(r'/v3/accounts/(?P<account>[^/]+)(?P<rest>/summary|/pricing|/pricing/stream)?', path)
+        if match is None or match.group('account') != self.ACCOUNT_ID:
+            return self._send(handler, 404, {'errorMessage': 'Not found'})
+
+        instruments = set(','.join(query.get('instruments', [''])).split(','))
+        if match.group('rest') == '/pricing/stream':
+            return self._stream(handler, instruments)
+
+        if match.group('rest') == '/pricing':
+            latest = {price['instrument']: price for price in self.prices if price['instrument'] in instruments}
+            return self._send(handler, 200, {'prices': [dict(price, type='PRICE') for price in latest.values()]})
+
+        account = {
+            'id':               self.ACCOUNT_ID,
+            'currency':         'USD',
+            'balance':          str(self.balance),
+            'NAV':              str(self.balance),
+            'marginAvailable':  str(self.balance),
+            'openTradeCount':   0,
+        }
+        return self._send(handler, 200, {'account': account, 'lastTransactionID': '1'})
+
+    def _candles(self, instrument: str, query: dict) -> dict:
+        # mid price candles aggregated from the recorded prices, tick counts as volume
+        granularity = query.get('granularity', ['S5'])[0]
+        seconds = {value: key for key, value in GRANULARITIES.items()}.get(granularity, 5)
+        prices = [price for price in self.prices if price['instrument'] == instrument]
+        mids = pd.Series([(float(p['bids'][0]['price']) + float(p['asks'][0]['price'])) / 2. for p in prices],
+                         index=pd.to_datetime([_nanoseconds(p['time']) for p in prices], utc=True), dtype='float64')
+        if 'fromTime' in query:
+            mids = mids[mids.index >= pd.Timestamp(query['fromTime'][0])]
+        if 'toTime' in query:
+            mids = mids[mids.index < pd.Timestamp(query['toTime'][0])]
+
+        resampled = mids.resample('{}s'.format(seconds))
+        ohlc = resampled.ohlc()
+        ohlc['volume'] = resampled.count()
+        ohlc = ohlc[ohlc['volume'] > 0]
+        if 'count' in query:
+            count = int(query['count'][0])
+            ohlc = ohlc.iloc[:count] if 'fromTime' in query else ohlc.iloc[-count:]
+
+        candles = [{
+            'time':     t.strftime('%Y-%m-%dT%H:%M:%S.%f000Z'),
+            'mid':      {'o': row.open, 'h': row.high, 'l': row.low, 'c': row.close},
+            'volume':   int(row.volume),
+            'complete': True,
+        } for t, row in zip(ohlc.index, ohlc.itertuples())]
+        return {'instrument': instrument, 'granularity': granularity, 'candles': candles}
+
+    @staticmethod
+    def _send(handler: BaseHTTPRequestHandler, status: int, payload: dict) -> None:
+        data = json.dumps(payload).encode('utf-8')
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def _stream(self, handler: BaseHTTPRequestHandler, instruments: set) -> None:
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'application/octet-stream')
+        handler.send_header('Transfer-Encoding', 'chunked')
+        handler.end_headers()
+
+        def send(payload: dict) -> None:
+            # one chunk per line, so the client sees every message as soon as it is written
+            data = json.dumps(payload).encode('utf-8') + b'\n'
+            handler.wfile.write('{:X}\r\n'.format(len(data)).encode('ascii') + data + b'\r\n')
+            handler.wfile.flush()
+
+        try:
+            for price in self.prices:
+                if self._stopping.is_set():
+                    break
+                if price['instrument'] in instruments:
+                    send(dict(price, type='PRICE'))
+                    if self.interval:
+                        time.sleep(self.interval)
+            while not self._stopping.wait(self.heartbeat):
+                send({'type': 'HEARTBEAT', 'time': pd.Timestamp.now(tz='UTC').strftime('%Y-%m-%dT%H:%M:%S.%fZ')})
+            handler.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            return
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from broker.account_state import AccountState
+from testing.fake_alpaca import FakeAlpacaServer
+from broker.broker import Broker
+from alpaca_trade_api.entity import Account, Order, Position
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+import time
+
+
+class TestAccountState(TestCase):
+
+    def setUp(self):
+        self.requests = {'account': 0, 'positions': 0}
+        self.state = AccountState(self.get_account, self.get_positions, ttl=60.)
+
+    def get_account(self):
+        self.requests['account'] += 1
+        time.sleep(.02)
+        return Account({'cash': str(1000 - self.requests['account'])})
+
+    def get_positions(self):
+        self.requests['positions'] += 1
+        return [Position({'symbol': 'AAA', 'qty': '5'})]
+
+    def test_reads_are_local(self):
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            accounts = list(executor.map(lambda _: self.state.account(), range(32)))
+        self.assertEqual(self.requests['account'], 1)
+        self.assertEqual(len(set(id(account) for account in accounts)), 1)
+        self.assertEqual(self.state.position('AAA').qty, '5')
+        self.assertIsNone(self.state.position('BBB'))
+        self.assertEqual(self.requests['positions'], 1)
+
+    def test_ttl(self):
+        state = AccountState(self.get_account, self.get_positions, ttl=0.)
+        state.account()
+        state.account()
+        self.assertEqual(self.requests['account'], 2)
+
+    def test_order_updates(self):
+        self.state.account()
+        # an order that was never sent from here says nothing about the cached view
+        self.state.order_update(Order({'id': 'a', 'status': 'filled', 'filled_qty': '5'}))
+        self.state.account()
+        self.assertEqual(self.requests['account'], 1)
+
+        self.state.order_update(Order({'id': 'b', 'status': 'new', 'filled_qty': '0'}), sent=True)
+        self.state.account()
+        self.assertEqual(self.requests['account'], 2)
+
+        # seen again unchanged, then partially filled
+        self.state.order_update(Order({'id': 'b', 'status': 'new', 'filled_qty': '0'}))
+        self.state.account()
+        self.assertEqual(self.requests['account'], 2)
+        self.state.order_update(Order({'id': 'b', 'status': 'partially_filled', 'filled_qty': '2'}))
+        self.state.account()
+        self.assertEqual(self.requests['account'], 3)
+
+    def test_invalidate_during_refresh(self):
+        def get_account():
+            self.state.invalidate()
+            return Account({'cash': '1'})
+
+        self.state.get_account = get_account
+        self.state.account()
+        self.assertEqual(self.state.refreshes, 1)
+        self.state.account()
+        self.assertEqual(self.state.refreshes, 2)
+
+
+class TestBrokerAccountState(TestCase):
+
+    def setUp(self):
+        self.server = FakeAlpacaServer(universe_size=5, days=30, as_of='2020-06-30')
+        self.server.start()
+        self.broker = Broker(self.server.rest())
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_consistent_after_orders(self):
+        for _ in range(10):
+            self.assertEqual(float(self.broker.cash), 100000.)
+            self.assertIsNone(self.broker.position('S00001'))
+        self.assertEqual(self.server.stats()['requests']['_account'], 1)
+
+        order = self.broker.submit_order('S00001', 10, 'buy', 'market', 'day')
+        self.assertAlmostEqual(float(self.broker.cash), 100000. - 10 * float(order.filled_avg_price), places=2)
+        self.assertEqual(int(self.broker.position('S00001').qty), 10)
+
+        self.broker.close_position('S00001')
+        self.assertIsNone(self.broker.position('S00001'))
+        self.assertAlmostEqual(float(self.broker.cash), 100000., places=2)
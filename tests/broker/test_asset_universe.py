@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from testing.fake_alpaca import FakeAlpacaServer
+from broker.asset_universe import AssetUniverse
+from broker.broker import Broker
+from unittest import TestCase
+import tempfile
+import shutil
+import os
+
+
+class TestAssetUniverse(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, 'assets.npz')
+        self.server = FakeAlpacaServer(universe_size=500)
+        self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.root)
+
+    def test_masks_match_entities(self):
+        broker = Broker(self.server.rest())
+        assets = broker.get_assets()
+        universe = broker.get_universe()
+
+        longable = [a.symbol for a in assets if a.tradable and a.marginable]
+        shortable = [a.symbol for a in assets if a.tradable and a.shortable and a.marginable and a.easy_to_borrow]
+        self.assertListEqual(list(universe.symbols[universe.mask(tradable=True, marginable=True)]), longable)
+        selected = universe.select(universe.mask(tradable=True, shortable=True, marginable=True, easy_to_borrow=True))
+        self.assertListEqual([a.symbol for a in selected], shortable)
+        self.assertEqual(selected[0].id, broker.get_asset(selected[0].symbol).id)
+
+    def test_snapshot_reused(self):
+        Broker(self.server.rest(), universe=AssetUniverse(self.path)).get_universe()
+        universe = Broker(self.server.rest(), universe=AssetUniverse(self.path)).get_universe()
+        self.assertEqual(self.server.stats()['requests']['_list_assets'], 1)
+        self.assertEqual(len(universe), 500)
+
+        Broker(self.server.rest(), universe=AssetUniverse(self.path, max_age=0)).get_universe()
+        self.assertEqual(self.server.stats()['requests']['_list_assets'], 2)
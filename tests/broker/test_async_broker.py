@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from test_bar_store import FakeBarsAPI
+from broker.async_broker import AsyncBroker
+from broker.broker import Broker
+from broker import BrokerValidationException
+from unittest import TestCase
+import threading
+import asyncio
+import time
+
+
+class SlowBarsAPI(FakeBarsAPI):
+    """Sleeps in every barset request and tracks how many ran at the same time."""
+
+    def __init__(self, delay=.05):
+        super().__init__()
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def get_barset(self, symbols, timeframe, limit=None, start=None, end=None):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        with self._lock:
+            self.in_flight -= 1
+        return super().get_barset(symbols, timeframe, limit=limit, start=start, end=end)
+
+
+class TestAsyncBroker(TestCase):
+
+    def setUp(self):
+        self.api = SlowBarsAPI()
+        self.broker = Broker(self.api)
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_requires_broker(self):
+        with self.assertRaises(BrokerValidationException):
+            AsyncBroker(None)
+
+    def test_get_account(self):
+        async_broker = AsyncBroker(self.broker)
+        res = self.loop.run_until_complete(async_broker.get_account())
+        self.assertEqual(res.cash, '1000')
+        async_broker.close()
+
+    def test_fan_out(self):
+        async_broker = AsyncBroker(self.broker, concurrency=4)
+        symbols = ['SYM{}'.format(i) for i in range(8)]
+
+        async def fetch_all():
+            return await asyncio.gather(*[async_broker.get_asset_df(symbol, 'day', limit=5) for symbol in symbols])
+
+        res = self.loop.run_until_complete(fetch_all())
+        async_broker.close()
+        self.assertEqual(len(res), 8)
+        self.assertEqual(self.api.max_in_flight, 4)
+
+    def test_get_assets_df_chunks(self):
+        async_broker = AsyncBroker(self.broker, concurrency=4)
+        symbols = ['SYM{}'.format(i) for i in range(10)]
+        res = self.loop.run_until_complete(async_broker.get_assets_df(symbols, 'day', limit=5, chunk_size=3))
+        async_broker.close()
+        self.assertListEqual(sorted(res.keys()), sorted(symbols))
+        self.assertEqual(len(self.api.calls), 4)
+        self.assertGreater(self.api.max_in_flight, 1)
+
+    def test_exit_keeps_loop_running(self):
+        self.api.delay = .2
+
+        async def run():
+            ticks = []
+
+            async def tick():
+                while True:
+                    ticks.append(time.monotonic())
+                    await asyncio.sleep(.01)
+
+            ticker = asyncio.ensure_future(tick())
+            async with AsyncBroker(self.broker, concurrency=2) as async_broker:
+                call = asyncio.ensure_future(async_broker.get_asset_df('SYM0', 'day', limit=5))
+                await asyncio.sleep(.01)
+            # leaving the block waited for the call in flight, the other coroutine kept going meanwhile
+            ticker.cancel()
+            return await call, ticks
+
+        res, ticks = self.loop.run_until_complete(run())
+        self.assertEqual(len(res), 5)
+        self.assertGreater(len(ticks), 10)
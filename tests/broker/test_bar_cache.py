@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from test_bar_store import FakeBarsAPI
+from broker.bar_cache import BarCache
+from broker.broker import Broker
+from unittest import TestCase
+import time
+
+
+class TestBarCache(TestCase):
+
+    def setUp(self):
+        self.api = FakeBarsAPI()
+        self.frame = Broker._bar_df(self.api.get_barset(['AAPL'], 'day', limit=100)['AAPL'])
+        self.nbytes = int(self.frame.memory_usage(index=True, deep=True).sum())
+
+    def test_get_put(self):
+        cache = BarCache()
+        self.assertEqual(cache.get('AAPL'), (False, None))
+        cache.put('AAPL', self.frame)
+        found, res = cache.get('AAPL')
+        self.assertTrue(found)
+        self.assertTrue(res.equals(self.frame))
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_returns_copy(self):
+        cache = BarCache()
+        cache.put('AAPL', self.frame)
+        _, res = cache.get('AAPL')
+        res['sma'] = 1.
+        _, res = cache.get('AAPL')
+        self.assertNotIn('sma', res.columns)
+
+    def test_lru_eviction(self):
+        cache = BarCache(max_bytes=self.nbytes * 2)
+        cache.put('AAPL', self.frame)
+        cache.put('MSFT', self.frame)
+        cache.get('AAPL')
+        cache.put('SPY', self.frame)
+        self.assertTrue(cache.get('AAPL')[0])
+        self.assertFalse(cache.get('MSFT')[0])
+        self.assertLessEqual(cache.size, cache.max_bytes)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_ttl(self):
+        cache = BarCache()
+        cache.put('AAPL', self.frame, ttl=.01)
+        cache.put('MSFT', self.frame)
+        time.sleep(.02)
+        self.assertFalse(cache.get('AAPL')[0])
+        self.assertTrue(cache.get('MSFT')[0])
+        self.assertEqual(cache.stats()['expirations'], 1)
+
+    def test_broker_caches_requests(self):
+        broker = Broker(self.api)
+        self.api.calls = []
+        broker.get_asset_df('AAPL', 'day', limit=50, end='2019-06-01')
+        broker.get_assets_df(['AAPL', 'MSFT'], 'day', limit=50, end='2019-06-01')
+        self.assertEqual(self.api.calls[-1][0], ('MSFT',))
+        self.assertEqual(len(self.api.calls), 2)
+
+    def test_broker_live_ttl(self):
+        broker = Broker(self.api)
+        self.assertIsNone(broker._bar_ttl('day', '2019-06-01'))
+        self.assertEqual(broker._bar_ttl('day', None), broker.bar_cache.live_ttl)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from alpaca_trade_api.entity import Account, Clock, BarSet
+from broker.bar_store import BarStore
+from broker.bar_cache import BarCache
+from broker.bars import to_timestamp
+from broker.broker import Broker
+from unittest import TestCase
+import pandas as pd
+import tempfile
+import shutil
+
+
+class FakeBarsAPI:
+    """Answers get_barset like the bars endpoint does: the last `limit` daily bars between start and end."""
+
+    def __init__(self, days=300):
+        self.start = 1546300800
+        self.days = days
+        self.calls = []
+
+    def get_account(self):
+        return Account({'cash': '1000', 'buying_power': '1000', 'trading_blocked': False})
+
+    def get_clock(self):
+        return Clock({'is_open': False})
+
+    def get_barset(self, symbols, timeframe, limit=None, start=None, end=None):
+        self.calls.append((tuple(symbols), start, end, limit))
+        times = [self.start + i * 86400 for i in range(self.days)]
+        if start is not None:
+            times = [t for t in times if t >= to_timestamp(start).value // 10**9]
+        if end is not None:
+            times = [t for t in times if t <= to_timestamp(end).value // 10**9]
+        times = times[-limit:]
+        return BarSet({symbol: [{'t': t, 'o': 1., 'h': 2., 'l': .5, 'c': 1.5, 'v': t % 1000} for t in times]
+                       for symbol in symbols})
+
+
+class TestBarStore(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.api = FakeBarsAPI()
+        # no in-process cache, so every request exercises the store
+        self.broker = Broker(self.api, bar_store=BarStore(self.root), bar_cache=BarCache(max_bytes=0))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_write_read(self):
+        store = BarStore(self.root)
+        df = Broker._bar_df(self.api.get_barset(['AAPL'], 'day', limit=10)['AAPL'])
+        store.write('AAPL', 'day', df, {'covered_from': 0, 'synced_to': 0})
+        res, meta = store.read('AAPL', 'day')
+        self.assertTrue(res.equals(df))
+        self.assertEqual(meta['covered_from'], 0)
+
+    def test_read_missing(self):
+        res, meta = BarStore(self.root).read('AAPL', 'day')
+        self.assertIsNone(res)
+        self.assertIsNone(meta)
+
+    def test_historical_hit(self):
+        end = '2019-06-01T00:00:00-04:00'
+        first = self.broker.get_asset_df('AAPL', 'day', limit=50, end=end)
+        second = self.broker.get_asset_df('AAPL', 'day', limit=50, end=end)
+        self.assertEqual(len(self.api.calls), 1)
+        self.assertTrue(first.equals(second))
+
+    def test_narrower_window_hit(self):
+        self.broker.get_asset_df('AAPL', 'day', limit=100, end='2019-06-01')
+        res = self.broker.get_asset_df('AAPL', 'day', limit=10, start='2019-03-01', end='2019-04-01')
+        self.assertEqual(len(self.api.calls), 1)
+        self.assertEqual(len(res), 10)
+        self.assertLessEqual(res.index[-1], to_timestamp('2019-04-01'))
+
+    def test_tail_only(self):
+        stored = self.broker.get_asset_df('AAPL', 'day', limit=50, end='2019-06-01')
+        res = self.broker.get_asset_df('AAPL', 'day', limit=50)
+        self.assertEqual(len(self.api.calls), 2)
+        # the second request starts from the newest stored bar instead of downloading the window again
+        self.assertEqual(to_timestamp(self.api.calls[1][1]), stored.index[-1])
+        expected = Broker._bar_df(self.api.get_barset(['AAPL'], 'day', limit=50)['AAPL'])
+        self.assertTrue(res.equals(expected))
+
+    def test_older_window_refetch(self):
+        self.broker.get_asset_df('AAPL', 'day', limit=10, end='2019-06-01')
+        res = self.broker.get_asset_df('AAPL', 'day', limit=100, end='2019-06-01')
+        self.assertEqual(len(self.api.calls), 2)
+        self.assertEqual(len(res), 100)
+
+    def test_bulk_groups_requests(self):
+        self.broker.get_assets_df(['AAPL', 'MSFT'], 'day', limit=50, end='2019-06-01')
+        res = self.broker.get_assets_df(['AAPL', 'MSFT', 'SPY'], 'day', limit=50, end='2019-06-01')
+        self.assertEqual(len(self.api.calls), 2)
+        self.assertEqual(self.api.calls[1][0], ('SPY',))
+        self.assertIsInstance(res['MSFT'], pd.DataFrame)
@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from test_bar_store import FakeBarsAPI
+from broker.bar_stream import BarStream
+from testing.fake_bar_stream import BarReplayServer
+from broker.broker import Broker
+from unittest import TestCase
+import tempfile
+import time
+import os
+
+
+def wait_for(condition, timeout=5.):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(.01)
+    return condition()
+
+
+class TestBarStream(TestCase):
+
+    def setUp(self):
+        self.broker = Broker(FakeBarsAPI())
+        self.frames = self.broker.get_assets_df(['AAPL', 'MSFT'], 'minute', limit=20)
+        self.server = BarReplayServer.from_frames(self.frames)
+        self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_windows_follow_stream(self):
+        with BarStream('key', 'secret', url=self.server.url, size=5) as stream:
+            stream.subscribe(['AAPL', 'MSFT'])
+            self.assertTrue(wait_for(lambda: stream.messages == 40))
+            frames = stream.frames(['AAPL', 'MSFT', 'TSLA'])
+
+        self.assertIsNone(frames['TSLA'])
+        for symbol in ('AAPL', 'MSFT'):
+            self.assertEqual(len(frames[symbol]), 5)
+            self.assertListEqual(frames[symbol]['close'].tolist(), self.frames[symbol]['close'].iloc[-5:].tolist())
+            self.assertTrue(frames[symbol].index.equals(self.frames[symbol].index[-5:]))
+
+    def test_record_and_replay(self):
+        path = os.path.join(tempfile.mkdtemp(), 'bars.jsonl')
+        with BarStream('key', 'secret', url=self.server.url, size=30, record_path=path) as stream:
+            stream.subscribe(['AAPL'])
+            self.assertTrue(wait_for(lambda: stream.messages == 20))
+
+        with BarReplayServer.from_file(path) as replay:
+            with BarStream('key', 'secret', url=replay.url, size=30) as stream:
+                stream.subscribe(['AAPL'])
+                self.assertTrue(wait_for(lambda: stream.messages == 20))
+                df = stream.frame('AAPL')
+        self.assertListEqual(df['volume'].tolist(), self.frames['AAPL']['volume'].tolist())
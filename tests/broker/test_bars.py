@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from benchmarks.bench_bar_df import synthetic_bars, legacy_bar_df
+from broker.bars import BAR_DTYPE, BAR_COLUMNS, bar_records, records_df
+from broker.broker import Broker
+from broker import BrokerValidationException
+from alpaca_trade_api.entity import Bars
+from unittest import TestCase
+import numpy as np
+
+
+class TestBars(TestCase):
+
+    bars = synthetic_bars(250)
+
+    def test_bar_records(self):
+        res = bar_records(self.bars._raw)
+        self.assertEqual(res.dtype, BAR_DTYPE)
+        self.assertEqual(len(res), 250)
+        self.assertEqual(res['c'][-1], self.bars[-1].c)
+
+    def test_records_df(self):
+        res = records_df(bar_records(self.bars._raw))
+        self.assertListEqual(list(res.columns), BAR_COLUMNS)
+        self.assertEqual(res.index[0], self.bars[0].t)
+        self.assertEqual(res['volume'].dtype, np.int64)
+
+    def test_bar_df_matches_legacy(self):
+        res = Broker._bar_df(self.bars)
+        legacy = legacy_bar_df(self.bars)
+        self.assertTrue((res.index == legacy.index).all())
+        self.assertTrue(np.array_equal(res.values, legacy.values))
+
+    def test_bar_df_empty(self):
+        with self.assertRaises(BrokerValidationException):
+            Broker._bar_df(Bars([]))
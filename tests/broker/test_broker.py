@@ -6,6 +6,7 @@ from alpaca_trade_api.rest import REST
 from broker.broker import Broker
 from unittest import TestCase
 import alpaca_trade_api.entity as Ent
+import pandas as pd
 import time
 import os
 
@@ -99,6 +100,13 @@ class TestBroker(TestCase):
         res = TestBroker.broker.get_asset_df()
         print('[] ')
 
+    def test_get_assets_df(self):
+        symbols = ['AAPL', 'MSFT', 'SPY']
+        res = TestBroker.broker.get_assets_df(symbols, '1D', limit=10, chunk_size=2, max_workers=2)
+        self.assertIsInstance(res, dict)
+        self.assertListEqual(sorted(res.keys()), symbols)
+        self.assertIsInstance(res['AAPL'], pd.DataFrame)
+
     def test_get_watchlists(self):
 
         res = TestBroker.broker.get_watchlists()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from broker import BrokerException, BrokerValidationException
+from broker.client_pool import ClientPool, Nonce
+from testing.fake_alpaca import FakeAlpacaServer
+from broker.broker import Broker
+from broker.async_broker import AsyncBroker
+from lib.portfolio_manager import PortfolioManager
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+import threading
+import time
+
+
+class Client:
+    """Fails the call if another thread is inside it at the same time."""
+
+    def __init__(self):
+        self.limit = 15
+        self._busy = threading.Lock()
+
+    def echo(self, value, wait=.01):
+        if not self._busy.acquire(blocking=False):
+            raise RuntimeError('client shared between threads')
+        try:
+            time.sleep(wait)
+            return value
+        finally:
+            self._busy.release()
+
+
+class TestClientPool(TestCase):
+
+    def test_one_thread_per_client(self):
+        pool = ClientPool(Client, size=3)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(pool.echo, range(40)))
+        self.assertListEqual(results, list(range(40)))
+        self.assertEqual(pool.created, 3)
+        self.assertEqual(pool.limit, 15)
+
+    def test_checkout_timeout(self):
+        pool = ClientPool(Client, size=1, timeout=.05)
+        with pool.client():
+            self.assertRaises(BrokerException, pool.checkout)
+        with pool.client() as client:
+            self.assertEqual(client.echo(1), 1)
+
+    def test_validation(self):
+        self.assertRaises(BrokerValidationException, ClientPool, None)
+        self.assertRaises(BrokerValidationException, ClientPool, Client, size=0)
+
+    def test_shared_nonce(self):
+        pool = ClientPool.kraken('key', 'c2VjcmV0', size=4)
+        clients = [pool.checkout() for _ in range(4)]
+        nonces = []
+        lock = threading.Lock()
+
+        def sign(client):
+            for _ in range(500):
+                nonce = client.api._nonce()
+                with lock:
+                    nonces.append(nonce)
+
+        threads = [threading.Thread(target=sign, args=(client,)) for client in clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(client.api.session for client in clients)), 4)
+        self.assertEqual(len(set(nonces)), len(nonces))
+
+    def test_nonce_increases(self):
+        nonce = Nonce()
+        values = [nonce() for _ in range(1000)]
+        self.assertListEqual(values, sorted(set(values)))
+
+
+class TestPooledBroker(TestCase):
+
+    def setUp(self):
+        self.server = FakeAlpacaServer(universe_size=20, days=30, as_of='2020-06-30', latency=.01)
+        self.server.start()
+        self.pool = ClientPool(self.server.rest, size=4)
+        self.broker = Broker(self.pool)
+
+    def tearDown(self):
+        self.pool.close()
+        self.server.stop()
+
+    def test_concurrent_orders(self):
+        manager = PortfolioManager(self.broker)
+        manager.add_items([['S{:05d}'.format(i), 5] for i in range(10)])
+        manager.rebalance('block')
+        self.assertEqual(len(self.broker.get_positions()), 10)
+        self.assertLessEqual(self.pool.created, 4)
+
+    def test_async_broker_sizes_every_client(self):
+        created = self.pool.checkout()
+        self.pool.checkin(created)
+        async_broker = AsyncBroker(self.broker, concurrency=8)
+        clients = [self.pool.checkout() for _ in range(4)]
+        for client in clients:
+            self.pool.checkin(client)
+        async_broker.close()
+        # the client created before the async broker and the ones created after it alike
+        self.assertIn(created, clients)
+        for client in clients:
+            self.assertEqual(client._session.get_adapter('http://localhost')._pool_maxsize, 8)
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from testing.fake_alpaca import FakeAlpacaServer
+from broker.bars import compact, widen, COMPACT_DTYPES, WIDE_DTYPES
+from broker.resample import resample_bars
+from broker.broker import Broker
+from test_resample import minute_bars
+from unittest import TestCase
+import numpy as np
+
+
+class TestCompact(TestCase):
+
+    def test_dtypes_and_size(self):
+        df = minute_bars()
+        small = compact(df)
+        self.assertDictEqual({col: str(dtype) for col, dtype in small.dtypes.items()}, COMPACT_DTYPES)
+        self.assertTrue(small.index.equals(df.index))
+        self.assertLessEqual(small.memory_usage().sum() - small.memory_usage()['Index'],
+                             (df.memory_usage().sum() - df.memory_usage()['Index']) / 2)
+
+    def test_cents_round_trip(self):
+        df = minute_bars().round({'open': 2, 'high': 2, 'low': 2, 'close': 2})
+        df['close'] = np.linspace(.01, 131071.99, len(df)).round(2)
+        back = widen(compact(df))
+        self.assertDictEqual({col: str(dtype) for col, dtype in back.dtypes.items()}, WIDE_DTYPES)
+        self.assertTrue((back[['open', 'high', 'low', 'close']].round(2) == df[['open', 'high', 'low', 'close']]).all().all())
+        self.assertTrue((back['volume'] == df['volume']).all())
+
+    def test_large_volume_keeps_64_bits(self):
+        df = minute_bars(periods=5)
+        df['volume'] = 5000000000
+        self.assertEqual(compact(df)['volume'].dtype, np.uint64)
+        self.assertEqual(compact(df)['volume'].iloc[0], 5000000000)
+
+    def test_widen_wide_frame_is_noop(self):
+        df = minute_bars(periods=5).astype(WIDE_DTYPES)
+        self.assertIs(widen(df), df)
+        self.assertIsNone(widen(None))
+
+    def test_resample_compact(self):
+        small = compact(minute_bars())
+        res = resample_bars(small, '15Min')
+        self.assertEqual(res['close'].dtype, np.float32)
+        self.assertEqual(res['volume'].dtype, np.uint32)
+        self.assertEqual(int(res['volume'].sum()), int(small['volume'].astype('int64').sum()))
+
+        small['volume'] = np.uint32(4000000000)
+        self.assertEqual(resample_bars(small, '15Min')['volume'].iloc[0], 15 * 4000000000)
+
+    def test_broker_compact(self):
+        with FakeAlpacaServer(universe_size=2, as_of='2020-06-30') as server:
+            wide = Broker(server.rest()).get_assets_df(['S00000', 'S00001'], 'day', limit=50)
+            small = Broker(server.rest(), compact=True).get_assets_df(['S00000', 'S00001'], 'day', limit=50)
+        for symbol, df in small.items():
+            self.assertEqual(df['close'].dtype, np.float32)
+            self.assertTrue(np.allclose(widen(df).values, wide[symbol].values, rtol=1e-7))
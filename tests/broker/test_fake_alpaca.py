@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from testing.fake_alpaca import FakeAlpacaServer
+from broker.broker import Broker
+from broker.bars import to_timestamp
+from alpaca_trade_api.rest import APIError
+from unittest import TestCase
+import os
+
+
+class TestFakeAlpacaServer(TestCase):
+
+    def setUp(self):
+        self.server = FakeAlpacaServer(universe_size=250, days=300, as_of='2020-06-30')
+        self.server.start()
+        self.broker = Broker(self.server.rest())
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_account_and_calendar(self):
+        self.assertEqual(float(self.broker.cash), 100000.)
+        calendar = self.broker.get_calendar('2020-06-01', '2020-06-30')
+        self.assertEqual(len(calendar), 22)
+        self.assertEqual(calendar[-1].date.strftime('%Y-%m-%d'), '2020-06-30')
+
+    def test_assets(self):
+        assets = self.broker.get_assets()
+        self.assertEqual(len(assets), 250)
+        self.assertEqual(self.broker.get_asset(assets[0].symbol).id, assets[0].id)
+
+    def test_bars(self):
+        symbols = [asset.symbol for asset in self.broker.get_assets()]
+        frames = self.broker.get_assets_df(symbols, 'day', limit=20, end='2020-06-15')
+        self.assertEqual(self.server.stats()['requests']['_bars'], 2)
+        self.assertEqual(len(frames), 250)
+        df = frames[symbols[0]]
+        self.assertEqual(len(df), 20)
+        self.assertEqual(df.index[-1], to_timestamp('2020-06-15'))
+        self.assertTrue((df['high'] >= df[['open', 'close']].max(axis=1)).all())
+
+        minutes = self.broker.get_asset_df(symbols[0], 'minute', limit=5)
+        self.assertEqual(minutes.index[-1], to_timestamp('2020-06-30T15:59:00'))
+
+    def test_orders_and_positions(self):
+        order = self.broker.submit_order('S00001', 10, 'buy', 'market', 'day')
+        self.assertEqual(order.status, 'filled')
+        position = self.broker.get_position('S00001')
+        self.assertEqual(int(position.qty), 10)
+        cash = float(self.broker.get_account().cash)
+        self.assertAlmostEqual(cash, 100000. - 10 * float(order.filled_avg_price), places=2)
+
+        limit = self.broker.submit_order('S00002', 1, 'buy', 'limit', 'day', limit_price=1.)
+        self.assertListEqual([o.id for o in self.broker.get_orders()], [limit.id])
+        self.broker.cancel_order(limit.id)
+        self.assertEqual(self.broker.get_order(limit.id).status, 'canceled')
+
+        self.broker.close_position('S00001')
+        self.assertListEqual(self.broker.get_positions(), [])
+
+    def test_cancel_order_endpoint(self):
+        # with a position in the same symbol, closing it instead of canceling the order would go through unnoticed
+        self.broker.submit_order('S00003', 5, 'buy', 'market', 'day')
+        limit = self.broker.submit_order('S00003', 1, 'buy', 'limit', 'day', limit_price=1.)
+        self.broker.cancel_order(limit.id)
+        requests = self.server.stats()['requests']
+        self.assertEqual(requests.get('_cancel_order'), 1)
+        self.assertNotIn('_close_position', requests)
+        self.assertEqual(self.broker.get_order(limit.id).status, 'canceled')
+        self.assertEqual(int(self.broker.get_position('S00003').qty), 5)
+
+    def test_watchlists(self):
+        self.broker.add_watchlist('picks')
+        watchlist = self.broker.get_watchlists()[0]
+        self.broker.add_to_watchlist(watchlist.id, 'S00003')
+        self.assertEqual(self.broker.get_watchlist(watchlist.id).assets[0]['symbol'], 'S00003')
+
+
+class TestFakeAlpacaLimits(TestCase):
+
+    def test_rate_limit(self):
+        with FakeAlpacaServer(universe_size=1, rate_limit=3) as server:
+            api = server.rest()
+            api._retry = 0
+            for _ in range(3):
+                api.get_clock()
+            with self.assertRaises(APIError) as context:
+                api.get_clock()
+        self.assertEqual(context.exception.status_code, 429)
+        self.assertEqual(server.stats()['throttled'], 1)
+
+    def test_credentials(self):
+        with FakeAlpacaServer(universe_size=1, key_id='right') as server:
+            server.rest(key_id='right').get_clock()
+            with self.assertRaises(APIError):
+                server.rest(key_id='wrong').get_clock()
+
+    def test_data_url_per_client(self):
+        # two servers at once, each client reads bars from its own, and the environment is left alone
+        before = os.environ.get('APCA_API_DATA_URL')
+        with FakeAlpacaServer(symbols=['AAA']) as first, FakeAlpacaServer(symbols=['BBB']) as second:
+            self.assertIn('AAA', first.rest().get_barset(['AAA'], 'day', limit=1))
+            self.assertIn('BBB', second.rest().get_barset(['BBB'], 'day', limit=1))
+            self.assertEqual(second.stats()['requests']['_bars'], 1)
+        self.assertEqual(os.environ.get('APCA_API_DATA_URL'), before)
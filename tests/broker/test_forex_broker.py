@@ -1,10 +1,103 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
-from pykrakenapi.pykrakenapi import KrakenAPI
-from broker.krak_dealer import KrakDealer
-from util import parse_configs
+from broker.forex_broker import ForexBroker
+from testing.fake_oanda import PriceReplayServer
+from broker.rolling_ticks import RollingTicks
 from unittest import TestCase
-import v20
+import pandas as pd
+import numpy as np
+import tempfile
+import time
+import os
+
+
+def recorded_prices(instruments=('EUR_USD', 'USD_JPY'), count=720, start='2020-06-01T12:00:00Z'):
+    # a price every 250ms, the most the stream sends per instrument
+    times = pd.date_range(start, periods=count, freq='250ms')
+    prices = []
+    for n, instrument in enumerate(instruments):
+        base = 1.1 if instrument == 'EUR_USD' else 107.5
+        mids = base * (1 + np.sin(np.arange(count) / 50.) / 1000.)
+        for t, mid in zip(times, mids):
+            prices.append({
+                'instrument':   instrument,
+                'time':         t.strftime('%Y-%m-%dT%H:%M:%S.%f000Z'),
+                'bids':         [{'price': round(mid - base / 20000., 5), 'liquidity': 1000000}],
+                'asks':         [{'price': round(mid + base / 20000., 5), 'liquidity': 1000000}],
+                'closeoutBid':  round(mid - base / 10000., 5),
+                'closeoutAsk':  round(mid + base / 10000., 5),
+                'tradeable':    True,
+            })
+    return prices
+
 
 class TestForexBroker(TestCase):
-    pass
+
+    def setUp(self):
+        self.prices = recorded_prices()
+        self.server = PriceReplayServer(self.prices, heartbeat=.05)
+        self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def wait_for(self, broker, count, timeout=10.):
+        deadline = time.time() + timeout
+        while broker.messages < count and time.time() < deadline:
+            time.sleep(.01)
+
+    def test_account(self):
+        broker = ForexBroker(self.server.context(), 'EUR_USD')
+        self.assertEqual(broker.account_id, PriceReplayServer.ACCOUNT_ID)
+        self.assertEqual(broker.trade_balance, 100000.)
+        self.assertFalse(broker.trading_blocked)
+
+    def test_stream_ticks_and_bars(self):
+        with ForexBroker(self.server.context(), 'EUR_USD,USD_JPY', tick_size=100) as broker:
+            self.wait_for(broker, len(self.prices))
+        self.assertEqual(broker.messages, len(self.prices))
+
+        eur = [p for p in self.prices if p['instrument'] == 'EUR_USD']
+        ticks = broker.tick_frame('EUR_USD')
+        self.assertEqual(len(ticks), 100)
+        self.assertTrue(np.allclose(ticks['bid'].values, [p['bids'][0]['price'] for p in eur[-100:]]))
+        self.assertTrue(np.allclose(ticks['spread'].values, ticks['ask'].values - ticks['bid'].values))
+        self.assertEqual(ticks.index[-1], pd.Timestamp(eur[-1]['time']))
+
+        # 720 ticks of 250ms are 3 minute bars of 240 ticks each
+        bars = broker.frame('EUR_USD')
+        mids = pd.Series([(p['bids'][0]['price'] + p['asks'][0]['price']) / 2. for p in eur],
+                         index=pd.to_datetime([p['time'] for p in eur]))
+        expected = mids.resample('min').ohlc()
+        self.assertEqual(len(bars), 3)
+        self.assertTrue(np.allclose(bars[['open', 'high', 'low', 'close']].values, expected.values))
+        self.assertListEqual(bars['volume'].tolist(), [240., 240., 240.])
+
+        t, bid, ask = broker.quote('USD_JPY')
+        self.assertEqual(t, pd.Timestamp(self.prices[-1]['time']))
+        self.assertEqual(bid, self.prices[-1]['bids'][0]['price'])
+        self.assertIsNone(broker.frame('GBP_USD'))
+
+    def test_record_and_replay(self):
+        path = os.path.join(tempfile.mkdtemp(), 'prices.jsonl')
+        with ForexBroker(self.server.context(), 'USD_JPY', record_path=path) as broker:
+            self.wait_for(broker, 720)
+
+        with PriceReplayServer.from_file(path, heartbeat=.05) as replay:
+            with ForexBroker(replay.context(), 'USD_JPY') as replayed:
+                self.wait_for(replayed, 720)
+        self.assertTrue(replayed.tick_frame('USD_JPY').equals(broker.tick_frame('USD_JPY')))
+        os.remove(path)
+
+
+class TestRollingTicks(TestCase):
+
+    def test_ring(self):
+        ticks = RollingTicks(3)
+        self.assertIsNone(ticks.last())
+        for i in range(5):
+            ticks.push(i * 10 ** 9, 1. + i, 1.5 + i)
+        df = ticks.df()
+        self.assertListEqual(df['bid'].tolist(), [3., 4., 5.])
+        self.assertListEqual(df['mid'].tolist(), [3.25, 4.25, 5.25])
+        self.assertEqual(ticks.last()[1:], (5., 5.5))
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from broker.krak_dealer import KrakDealer, OHLC_MAX_ROWS
+from broker import BrokerValidationException
+from broker.scheduler import RequestScheduler
+from broker.bar_store import BarStore
+from unittest import TestCase
+import pandas as pd
+import numpy as np
+import tempfile
+import time
+import shutil
+
+
+class FakeKrakenAPI:
+    """Answers like pykrakenapi's KrakenAPI, with candles from a clock the test moves forward."""
+
+    def __init__(self, now=1577836800 + 3000 * 60, latency=0.):
+        self.now = now
+        self.latency = latency
+        self.calls = []
+
+    def get_account_balance(self):
+        return pd.DataFrame({'vol': [1000.]}, index=['ZUSD'])
+
+    def get_trade_balance(self, asset='ZUSD'):
+        return 1000.
+
+    def get_ohlc_data(self, pair, interval=1, since=None, ascending=False):
+        self.calls.append(('get_ohlc_data', pair, interval, since))
+        time.sleep(self.latency)
+        step = interval * 60
+        current = self.now - self.now % step
+        times = np.arange(current - (OHLC_MAX_ROWS - 1) * step, current + step, step)
+        # committed candles after since, and always the one still forming
+        if since is not None:
+            times = times[(times > since) | (times == current)]
+        ohlc = pd.DataFrame({
+            'time': times,
+            'open': times % 97 + 1.,
+            'high': times % 97 + 2.,
+            'low': times % 97 + .5,
+            # the forming candle's close moves with the clock
+            'close': np.where(times == current, self.now % 97 + 1.5, times % 97 + 1.5),
+            'vwap': times % 97 + 1.2,
+            'volume': times % 13 + 1.,
+            'count': times % 7 + 1,
+        })
+        ohlc['dtime'] = pd.to_datetime(ohlc.time, unit='s')
+        ohlc.sort_values('dtime', ascending=ascending, inplace=True)
+        ohlc.set_index('dtime', inplace=True)
+        return ohlc, int(current - step)
+
+    def get_order_book(self, pair, count=100, ascending=False):
+        self.calls.append(('get_order_book', pair, count))
+        # like pykrakenapi, prices and volumes stay strings
+        asks = pd.DataFrame({'price': ['{:.5f}'.format(100. + i / 10.) for i in range(count)],
+                             'volume': ['{:.8f}'.format(i + 1.) for i in range(count)],
+                             'time': [self.now] * count})
+        bids = pd.DataFrame({'price': ['{:.5f}'.format(99.9 - i / 10.) for i in range(count)],
+                             'volume': ['{:.8f}'.format(2. * (i + 1)) for i in range(count)],
+                             'time': [self.now] * count})
+        return asks, bids
+
+    def trades(self):
+        # a trade every 7 seconds since midnight, 2020-01-01
+        t = np.arange(1577836800 + .25, self.now, 7.)
+        return t, 100. + (t % 89) / 10., (t % 5 + 1) / 10.
+
+    def get_recent_trades(self, pair, since=None, ascending=False):
+        self.calls.append(('get_recent_trades', pair, since))
+        t, price, volume = self.trades()
+        ns = (t * 10 ** 9).astype('int64')
+        # the oldest trades after since, or the newest ones without it
+        keep = np.flatnonzero(ns > since)[:1000] if since is not None else np.arange(len(t))[-1000:]
+        if len(keep) == 0:
+            return pd.DataFrame(), since
+        trades = pd.DataFrame({'price': price[keep], 'volume': volume[keep], 'time': t[keep],
+                               'buy_sell': 'buy', 'market_limit': 'market', 'misc': '', 'id': keep})
+        trades['dtime'] = pd.to_datetime(trades.time, unit='s')
+        trades.sort_values('dtime', ascending=ascending, inplace=True)
+        trades.set_index('dtime', inplace=True)
+        return trades, int(ns[keep[-1]])
+
+    def get_ticker_information(self, pair):
+        self.calls.append(('get_ticker_information', pair))
+        pairs = pair.split(',')
+        return pd.DataFrame({
+            'a': [[str(100.1 + i), '1', '1.0'] for i in range(len(pairs))],
+            'b': [[str(99.9 + i), '1', '1.0'] for i in range(len(pairs))],
+            'c': [[str(100. + i), '1.0'] for i in range(len(pairs))],
+        }, index=pairs)
+
+    def get_recent_spread_data(self, pair, since=None, ascending=False):
+        self.calls.append(('get_recent_spread_data', pair, since))
+        time.sleep(self.latency)
+        spread = pd.DataFrame({'time': [self.now], 'bid': [99.9], 'ask': [100.]})
+        return spread, self.now
+
+
+class TestKrakOhlc(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.api = FakeKrakenAPI()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def dealer(self, bar_store=None):
+        return KrakDealer(self.api, 'XXBTZUSD', public_scheduler=RequestScheduler(1000, 1000), bar_store=bar_store)
+
+    def test_incremental(self):
+        dealer = self.dealer()
+        ohlc, last = dealer.get_ohlc_data('XXBTZUSD')
+        self.assertEqual(len(ohlc), OHLC_MAX_ROWS)
+        self.assertTrue(ohlc.index.is_monotonic_decreasing)
+        self.assertEqual(self.api.calls[-1][3], None)
+
+        self.api.now += 3 * 60 + 30
+        ohlc, new_last = dealer.get_ohlc_data('XXBTZUSD', ascending=True)
+        self.assertEqual(self.api.calls[-1][3], last)
+        self.assertEqual(new_last, last + 3 * 60)
+        self.assertEqual(len(ohlc), OHLC_MAX_ROWS)
+        self.assertTrue(ohlc.index.is_monotonic_increasing)
+        self.assertFalse(ohlc.index.duplicated().any())
+        # the candle that was forming on the first call has been replaced by its committed version
+        expected, _ = self.api.get_ohlc_data('XXBTZUSD', ascending=True)
+        self.assertTrue(np.allclose(ohlc.values, expected.values))
+
+    def test_persists_cursor(self):
+        store = BarStore(self.root)
+        _, last = self.dealer(store).get_ohlc_data('XXBTZUSD')
+
+        self.api.now += 60
+        self.api.calls = []
+        ohlc, _ = self.dealer(store).get_ohlc_data('XXBTZUSD')
+        self.assertEqual(self.api.calls, [('get_ohlc_data', 'XXBTZUSD', 1, last)])
+        self.assertEqual(len(ohlc), OHLC_MAX_ROWS)
+        self.assertIsNone(ohlc.index.tz)
+        self.assertEqual(ohlc.index[0], pd.Timestamp(self.api.now - self.api.now % 60, unit='s'))
+
+        df, meta = store.read('XXBTZUSD', '1Min')
+        self.assertEqual(len(df), OHLC_MAX_ROWS + 1)
+        self.assertEqual(meta['last'], last + 60)
+
+    def test_retention(self):
+        store = BarStore(self.root)
+        dealer = KrakDealer(self.api, 'XXBTZUSD', public_scheduler=RequestScheduler(1000, 1000), bar_store=store,
+                            ohlc_retention=OHLC_MAX_ROWS + 10)
+        for _ in range(5):
+            dealer.get_ohlc_data('XXBTZUSD')
+            self.api.now += 5 * 60
+        self.assertEqual(len(dealer._ohlc[('XXBTZUSD', 1)][0]), OHLC_MAX_ROWS + 10)
+        self.assertEqual(len(store.read('XXBTZUSD', '1Min')[0]), OHLC_MAX_ROWS + 10)
+        self.assertRaises(BrokerValidationException, KrakDealer, self.api, 'XXBTZUSD', ohlc_retention=10)
+
+    def test_explicit_since_bypasses_cache(self):
+        dealer = self.dealer()
+        ohlc, _ = dealer.get_ohlc_data('XXBTZUSD', since=self.api.now - 10 * 60)
+        self.assertLessEqual(len(ohlc), 11)
+        self.assertDictEqual(dealer._ohlc, {})
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from broker.krak_dealer import KrakDealer, TICKER_MAX_PAIRS
+from broker.scheduler import RequestScheduler
+from broker import BrokerValidationException
+from test_krak_ohlc import FakeKrakenAPI
+from unittest import TestCase
+import time
+
+PAIRS = ['XXBTZUSD', 'XETHZUSD', 'BATUSD', 'XXRPZUSD', 'ADAUSD', 'DOTUSD', 'SOLUSD', 'LINKUSD']
+
+
+class TestKrakPairs(TestCase):
+
+    def setUp(self):
+        self.api = FakeKrakenAPI(latency=.1)
+        self.dealer = KrakDealer(self.api, ', '.join(PAIRS), public_scheduler=RequestScheduler(1000, 1000))
+
+    def test_pairs(self):
+        self.assertListEqual(self.dealer.pairs, PAIRS)
+        self.assertEqual(self.dealer.pair, 'XXBTZUSD')
+        self.dealer.add_pair('DOGEUSD')
+        self.dealer.add_pair('DOGEUSD')
+        self.assertEqual(self.dealer.pairs.count('DOGEUSD'), 1)
+        self.dealer.remove_pair('DOGEUSD')
+        self.assertNotIn('DOGEUSD', self.dealer.pairs)
+        with self.assertRaises(BrokerValidationException):
+            self.dealer.remove_pair('XXBTZUSD')
+
+    def test_tickers_in_one_request(self):
+        tickers = self.dealer.get_tickers()
+        self.assertListEqual(list(tickers.index), PAIRS)
+        requests = [call for call in self.api.calls if call[0] == 'get_ticker_information']
+        self.assertListEqual(requests, [('get_ticker_information', ','.join(PAIRS))])
+
+        many = ['P{}'.format(i) for i in range(TICKER_MAX_PAIRS + 1)]
+        self.assertEqual(len(self.dealer.get_tickers(many)), len(many))
+        self.assertEqual(len([call for call in self.api.calls if call[0] == 'get_ticker_information']), 3)
+
+    def test_concurrent_ohlc_refresh(self):
+        started = time.time()
+        frames = self.dealer.refresh_ohlc(max_workers=4)
+        elapsed = time.time() - started
+        self.assertListEqual(list(frames), PAIRS)
+        self.assertTrue(all(df.index.is_monotonic_increasing for df in frames.values()))
+        # 8 calls of 100ms each, 4 at a time
+        self.assertLess(elapsed, .6)
+
+        refreshed = self.dealer.refresh_ohlc(['XXBTZUSD'])
+        self.assertListEqual(list(refreshed), ['XXBTZUSD'])
+        self.assertIsNotNone(self.api.calls[-1][3])
+
+    def test_spreads(self):
+        spreads = self.dealer.get_spreads(max_workers=8)
+        self.assertListEqual(list(spreads), PAIRS)
+        self.assertEqual(len([call for call in self.api.calls if call[0] == 'get_recent_spread_data']), len(PAIRS))
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from broker import BrokerException, BrokerValidationException
+from broker.broker import Broker, HEDGE_MIN_SAMPLES
+from broker.circuit_breaker import CircuitBreaker, is_endpoint_failure
+from alpaca_trade_api.rest import APIError
+from requests.exceptions import HTTPError, ConnectionError
+from requests.models import Response
+from broker.latency import LatencyTracker
+from broker.scheduler import RequestScheduler
+from test_bar_store import FakeBarsAPI
+from unittest import TestCase
+import threading
+import time
+
+
+def api_error(status: int, message: str) -> APIError:
+    response = Response()
+    response.status_code = status
+    return APIError({'code': status * 1000, 'message': message}, HTTPError(response=response))
+
+
+class SlowBarsAPI(FakeBarsAPI):
+    """get_barset answers after the delays queued by the test, then right away."""
+
+    def __init__(self):
+        super().__init__()
+        self.delays = []
+        self.failures = 0
+        self.attempts = 0
+        self.orders = 0
+        self._lock = threading.Lock()
+
+    def get_position(self, symbol):
+        raise api_error(404, 'position does not exist')
+
+    def submit_order(self, *args, **kwargs):
+        self.orders += 1
+        raise api_error(403, 'insufficient buying power')
+
+    def get_barset(self, symbols, timeframe, limit=None, start=None, end=None):
+        with self._lock:
+            self.attempts += 1
+            delay = self.delays.pop(0) if self.delays else 0.
+            fail = self.failures > 0
+            self.failures -= 1
+        time.sleep(delay)
+        if fail:
+            raise api_error(503, 'bars endpoint is down')
+        return super().get_barset(symbols, timeframe, limit=limit, start=start, end=end)
+
+
+class TestLatencyTracker(TestCase):
+
+    def test_percentiles(self):
+        tracker = LatencyTracker(window=100)
+        for i in range(200):
+            tracker.record('get_barset', (i % 100 + 1) / 1000.)
+        tracker.count('get_barset', 'timeouts')
+        self.assertAlmostEqual(tracker.percentile('get_barset', 50), .0505, places=4)
+        self.assertIsNone(tracker.percentile('get_barset', 50, min_samples=201))
+        self.assertIsNone(tracker.percentile('get_clock', 50))
+
+        res = tracker.metrics()['get_barset']
+        self.assertEqual(res['calls'], 200)
+        self.assertEqual(res['timeouts'], 1)
+        self.assertLess(res['p95'], res['p99'])
+        self.assertIn('p99=99ms', tracker.report())
+
+    def test_validation(self):
+        self.assertRaises(BrokerValidationException, LatencyTracker, window=0)
+
+
+class TestCircuitBreaker(TestCase):
+
+    def test_endpoint_failures(self):
+        self.assertTrue(is_endpoint_failure(api_error(503, 'service unavailable')))
+        self.assertTrue(is_endpoint_failure(api_error(429, 'rate limit exceeded')))
+        self.assertTrue(is_endpoint_failure(ConnectionError('connection reset')))
+        self.assertFalse(is_endpoint_failure(api_error(404, 'position does not exist')))
+        self.assertFalse(is_endpoint_failure(api_error(403, 'insufficient buying power')))
+        self.assertFalse(is_endpoint_failure(ValueError('bad argument')))
+
+    def test_opens_and_resets(self):
+        breaker = CircuitBreaker(failures=2, reset=.05)
+        breaker.failure('get_barset')
+        breaker.before('get_barset')
+        breaker.failure('get_barset')
+        self.assertTrue(breaker.is_open('get_barset'))
+        self.assertRaises(BrokerException, breaker.before, 'get_barset')
+        breaker.before('get_clock')
+
+        time.sleep(.06)
+        # one trial call goes through, others are still refused until it is done
+        breaker.before('get_barset')
+        self.assertRaises(BrokerException, breaker.before, 'get_barset')
+        breaker.failure('get_barset')
+        self.assertRaises(BrokerException, breaker.before, 'get_barset')
+
+        time.sleep(.06)
+        breaker.before('get_barset')
+        breaker.success('get_barset')
+        self.assertFalse(breaker.is_open('get_barset'))
+
+
+class TestBoundedCalls(TestCase):
+
+    def setUp(self):
+        self.api = SlowBarsAPI()
+
+    def broker(self, **kwargs):
+        return Broker(self.api, scheduler=RequestScheduler(1000, 1000), **kwargs)
+
+    def test_deadline(self):
+        broker = self.broker(deadline=.05)
+        self.api.delays = [.5]
+        started = time.monotonic()
+        self.assertRaises(BrokerException, broker._get_barset_chunk, ['AAA'], 'day', 5, None, None)
+        self.assertLess(time.monotonic() - started, .3)
+        self.assertEqual(broker.latency.metrics()['get_barset']['timeouts'], 1)
+        self.assertEqual(len(broker._get_barset_chunk(['AAA'], 'day', 5, None, None)['AAA']), 5)
+
+    def test_hedge(self):
+        broker = self.broker(hedge=True)
+        for _ in range(HEDGE_MIN_SAMPLES):
+            self.api.delays.append(.01)
+            broker._get_barset_chunk(['AAA'], 'day', 5, None, None)
+
+        # the first request hangs, its duplicate is sent after about the p95 and answers right away
+        self.api.delays = [1.]
+        started = time.monotonic()
+        self.assertEqual(len(broker._get_barset_chunk(['AAA'], 'day', 5, None, None)['AAA']), 5)
+        self.assertLess(time.monotonic() - started, .5)
+        res = broker.latency.metrics()['get_barset']
+        self.assertEqual(res['hedged'], 1)
+        self.assertEqual(res['hedges_won'], 1)
+
+    def test_circuit_breaker(self):
+        broker = self.broker(circuit_breaker=CircuitBreaker(failures=2, reset=60.))
+        self.api.failures = 2
+        for _ in range(2):
+            self.assertRaises(APIError, broker._get_barset_chunk, ['AAA'], 'day', 5, None, None)
+        self.assertRaises(BrokerException, broker._get_barset_chunk, ['AAA'], 'day', 5, None, None)
+        self.assertEqual(self.api.attempts, 2)
+        self.assertEqual(broker.latency.metrics()['get_barset']['rejected'], 1)
+        # other endpoints are unaffected
+        self.assertIsNotNone(broker.get_clock())
+
+    def test_rejections_keep_the_circuit_closed(self):
+        broker = self.broker(circuit_breaker=CircuitBreaker(failures=2, reset=60.))
+        for _ in range(5):
+            self.assertRaises(APIError, broker._call, 'get_position', 'AAA')
+        self.assertFalse(broker.circuit_breaker.is_open('get_position'))
+
+        # orders are never gated
+        broker.circuit_breaker.failures = 1
+        broker.circuit_breaker.failure('submit_order')
+        for _ in range(3):
+            self.assertRaises(APIError, broker._call, 'submit_order', 'AAA', 1, 'buy', 'market', 'day')
+        self.assertEqual(self.api.orders, 3)
+
+    def test_close(self):
+        broker = self.broker(deadline=1.)
+        broker.close()
+        self.assertRaises(RuntimeError, broker._get_barset_chunk, ['AAA'], 'day', 5, None, None)
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from broker.market_data import MarketDataProvider, normalize_bars, quotes_df, BAR_DTYPES, QUOTE_COLUMNS
+from testing.fake_alpaca import FakeAlpacaServer
+from broker.forex_broker import ForexBroker
+from testing.fake_oanda import PriceReplayServer
+from broker.krak_dealer import KrakDealer
+from broker.scheduler import RequestScheduler
+from broker.bars import BAR_COLUMNS, compact
+from broker.broker import Broker
+from test_forex_broker import recorded_prices
+from test_krak_ohlc import FakeKrakenAPI
+from test_resample import minute_bars
+from unittest import TestCase
+import pandas as pd
+import numpy as np
+import time
+
+
+class TestMarketData(TestCase):
+
+    def assertNormalized(self, frames):
+        for df in frames.values():
+            self.assertListEqual(list(df.columns), BAR_COLUMNS)
+            self.assertDictEqual({col: str(dtype) for col, dtype in df.dtypes.items()}, BAR_DTYPES)
+            self.assertEqual(str(df.index.tz), 'America/New_York')
+            self.assertTrue(df.index.is_monotonic_increasing)
+
+    def test_normalize(self):
+        df = minute_bars(periods=10)
+        naive = df.tz_convert('UTC').tz_localize(None).iloc[::-1]
+        naive['vwap'] = 1.
+        normalized = normalize_bars(naive, limit=4)
+        self.assertNormalized({'X': normalized})
+        self.assertTrue(normalized.index.equals(df.index[-4:]))
+        self.assertEqual(normalize_bars(compact(df))['close'].dtype, np.float32)
+        self.assertIsNone(normalize_bars(df.iloc[:0]))
+
+    def test_quotes_df(self):
+        now = pd.Timestamp.now(tz='UTC')
+        quotes = quotes_df(['A', 'B'], {'A': (now, 1., 2., 1.5)})
+        self.assertListEqual(list(quotes.columns), QUOTE_COLUMNS)
+        self.assertEqual(quotes.loc['A', 'time'], now)
+        self.assertTrue(quotes.loc['B'].isna().all())
+
+    def test_protocol(self):
+        class BarsOnly(MarketDataProvider):
+            def _bars_for(self, symbols, period, limit, start, end):
+                return {symbol: None for symbol in symbols}
+
+        class Complete(BarsOnly):
+            def latest_quotes(self, symbols):
+                return quotes_df(symbols, {})
+
+        # a provider missing part of the interface fails when it is made, not when a screen calls it
+        self.assertRaises(TypeError, MarketDataProvider)
+        self.assertRaises(TypeError, BarsOnly)
+        self.assertDictEqual(Complete().bars_for(['A']), {'A': None})
+        self.assertTrue(Complete().latest_quotes(['A']).isna().all(axis=None))
+
+    def test_alpaca(self):
+        with FakeAlpacaServer(universe_size=3, as_of='2020-06-30') as server:
+            broker = Broker(server.rest())
+            symbols = ['S00000', 'S00001', 'S00002']
+            frames = broker.bars_for(symbols, 'day', limit=30)
+            self.assertNormalized(frames)
+            self.assertEqual(len(frames['S00000']), 30)
+            self.assertNormalized(broker.bars_for(symbols, '15Min', limit=10, base='minute'))
+
+            quotes = broker.latest_quotes(symbols + ['MISSING'])
+            minute = broker.get_asset_df('S00001', 'minute', limit=1)
+        self.assertEqual(quotes.loc['S00001', 'last'], minute['close'].iloc[-1])
+        self.assertTrue(np.isnan(quotes.loc['S00001', 'bid']))
+        self.assertTrue(np.isnan(quotes.loc['MISSING', 'last']))
+
+    def test_kraken(self):
+        api = FakeKrakenAPI()
+        dealer = KrakDealer(api, ['XXBTZUSD', 'XETHZUSD'], public_scheduler=RequestScheduler(1000, 1000))
+        frames = dealer.bars_for(dealer.pairs, 'minute', limit=100)
+        self.assertNormalized(frames)
+        self.assertEqual(len(frames['XETHZUSD']), 100)
+        self.assertEqual(frames['XETHZUSD'].index[-1], pd.Timestamp(api.now - api.now % 60, unit='s', tz='UTC'))
+
+        # 5 minute bars built from the cached minute candles instead of another candle series
+        five = dealer.bars_for(['XXBTZUSD'], '5Min', limit=10, base='minute')['XXBTZUSD']
+        self.assertEqual(len(five), 10)
+        expected = frames['XXBTZUSD'].resample('5min').agg(
+            {'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'})
+        # the oldest bucket may be cut short by the limit
+        self.assertTrue(np.allclose(five.values[1:], expected[BAR_COLUMNS].values[-9:]))
+
+        quotes = dealer.latest_quotes(dealer.pairs)
+        self.assertListEqual(quotes['bid'].tolist(), [99.9, 100.9])
+        self.assertListEqual(quotes['last'].tolist(), [100., 101.])
+
+    def test_forex(self):
+        with PriceReplayServer(recorded_prices(count=960), heartbeat=.05) as server:
+            broker = ForexBroker(server.context(), 'EUR_USD,USD_JPY')
+            candles = broker.bars_for(broker.pairs, 'minute', limit=3)
+            self.assertNormalized(candles)
+            self.assertEqual(len(candles['EUR_USD']), 3)
+            quotes = broker.latest_quotes(broker.pairs)
+
+            with broker:
+                deadline = time.time() + 10
+                while broker.messages < 1920 and time.time() < deadline:
+                    time.sleep(.01)
+                streamed = broker.bars_for(broker.pairs, 'minute', limit=3)
+                streamed_quotes = broker.latest_quotes(broker.pairs)
+
+        for instrument in broker.pairs:
+            self.assertTrue(np.allclose(streamed[instrument].values, candles[instrument].values))
+        self.assertTrue(quotes[['bid', 'ask', 'last']].equals(streamed_quotes[['bid', 'ask', 'last']]))
+        self.assertTrue((quotes['time'] == streamed_quotes['time']).all())
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from broker.order_book import OrderBook
+from broker.krak_dealer import KrakDealer
+from broker.scheduler import RequestScheduler
+from broker import BrokerValidationException
+from test_krak_ohlc import FakeKrakenAPI
+from unittest import TestCase
+import numpy as np
+import os
+
+RECORDED = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'kraken_book_xbtusd.jsonl')
+
+
+class TestOrderBook(TestCase):
+
+    def test_replay(self):
+        book = OrderBook.replay(RECORDED, 'XBT/USD', depth=10)
+        self.assertTupleEqual(book.top(), (5540.5, 2.0, 5540.9, 0.5))
+        self.assertAlmostEqual(book.spread(), .4)
+        self.assertAlmostEqual(book.mid(), 5540.7)
+        self.assertTrue(np.allclose(book.levels('ask')[:, 0], [5540.9, 5541.8, 5542.5, 5543.0, 5544.1]))
+        self.assertTrue(np.allclose(book.levels('bid', 3), [[5540.5, 2.], [5539.9, .8], [5539.5, 5.]]))
+        self.assertEqual(book.volume_at(5539.9), .8)
+        self.assertEqual(book.volume_at(5541.3), 0.)
+        self.assertAlmostEqual(book.depth_to(5542.5, 'ask'), 2.1)
+        self.assertAlmostEqual(book.depth_to(5539.5, 'bid'), 7.8)
+        self.assertAlmostEqual(book.imbalance(levels=2), (2.8 - .9) / 3.7)
+        self.assertAlmostEqual(book.updated, 1534614250.123456)
+
+    def test_depth_truncation(self):
+        book = OrderBook.replay(RECORDED, 'XBT/USD', depth=3)
+        self.assertTrue(np.allclose(book.levels('ask')[:, 0], [5540.9, 5541.8, 5542.5]))
+        self.assertTrue(np.allclose(book.levels('bid')[:, 0], [5540.5, 5539.9, 5539.5]))
+
+    def test_matches_rebuilt_book(self):
+        # random deltas against a dict rebuilt and sorted on every step
+        rng = np.random.RandomState(5)
+        book = OrderBook('X', depth=1000)
+        bids, asks = {}, {}
+        for _ in range(2000):
+            side, levels = (('bid', bids), ('ask', asks))[rng.randint(2)]
+            price = round(100. + (-1 if side == 'bid' else 1) * rng.randint(1, 200) / 100., 2)
+            volume = 0. if rng.rand() < .3 else float(rng.randint(1, 50))
+            book.update(**{side + 's': [(price, volume)]})
+            if volume == 0:
+                levels.pop(price, None)
+            else:
+                levels[price] = volume
+        expected_bids = sorted(bids.items(), reverse=True)
+        expected_asks = sorted(asks.items())
+        self.assertTrue(np.array_equal(book.levels('bid'), np.array(expected_bids).reshape(-1, 2)))
+        self.assertTrue(np.array_equal(book.levels('ask'), np.array(expected_asks).reshape(-1, 2)))
+
+    def test_empty(self):
+        book = OrderBook('X')
+        self.assertTupleEqual(book.top(), (None, None, None, None))
+        self.assertIsNone(book.spread())
+        self.assertEqual(book.imbalance(), 0.)
+        self.assertEqual(book.levels('bid').shape, (0, 2))
+        with self.assertRaises(BrokerValidationException):
+            book.depth_to(1., 'both')
+
+    def test_dealer_snapshot(self):
+        api = FakeKrakenAPI()
+        dealer = KrakDealer(api, 'XXBTZUSD', public_scheduler=RequestScheduler(1000, 1000))
+        book = dealer.get_book('XXBTZUSD', count=10)
+        self.assertTupleEqual(book.top(), (99.9, 2., 100., 1.))
+        book.update(asks=[(100., 0)])
+        self.assertEqual(book.best_ask(), (100.1, 2.))
+        self.assertIs(dealer.get_book('XXBTZUSD', count=10), book)
+        self.assertEqual(book.best_ask(), (100., 1.))
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from testing.fake_alpaca import FakeAlpacaServer
+from broker.resample import resample_bars, bars_per
+from broker.trading_calendar import TradingCalendar
+from broker import BrokerValidationException
+from broker.broker import Broker
+from alpaca_trade_api.entity import Calendar
+from unittest import TestCase
+import pandas as pd
+import numpy as np
+
+AGG = {'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'}
+
+
+def minute_bars(start='2020-06-01 09:30', periods=780, seed=3):
+    rng = np.random.RandomState(seed)
+    index = pd.date_range(start, periods=periods, freq='min', tz='America/New_York')
+    close = 100 + np.cumsum(rng.normal(0, .1, periods))
+    return pd.DataFrame({
+        'open': close + rng.normal(0, .05, periods),
+        'high': close + .2,
+        'low': close - .2,
+        'close': close,
+        'volume': rng.randint(1, 1000, periods),
+    }, index=index, columns=['open', 'high', 'low', 'close', 'volume'])
+
+
+class TestResample(TestCase):
+
+    def test_matches_pandas(self):
+        df = minute_bars()
+        for period, rule in (('5Min', '5min'), ('15Min', '15min')):
+            expected = df.resample(rule).agg(AGG).dropna()
+            res = resample_bars(df, period)
+            self.assertTrue(np.allclose(res.values, expected[res.columns].values))
+            self.assertTrue(res.index.equals(expected.index))
+        self.assertEqual(res['volume'].dtype, df['volume'].dtype)
+
+    def test_session_alignment(self):
+        # 780 minutes from 09:30 run into the evening, the calendar keeps only the session
+        calendar = TradingCalendar.from_calendar([Calendar({'date': '2020-06-01', 'open': '09:30', 'close': '16:00'})])
+        df = minute_bars()
+        days = resample_bars(df, 'day', calendar)
+        session = df.iloc[:390]
+        self.assertEqual(len(days), 1)
+        self.assertEqual(days.index[0], pd.Timestamp('2020-06-01', tz='America/New_York'))
+        self.assertListEqual(days.iloc[0].tolist(), [session['open'].iloc[0], session['high'].max(),
+                                                     session['low'].min(), session['close'].iloc[-1],
+                                                     session['volume'].sum()])
+        self.assertEqual(len(resample_bars(df, '15Min', calendar)), 26)
+
+    def test_bars_per(self):
+        self.assertEqual(bars_per('15Min', 'minute'), 15)
+        self.assertEqual(bars_per('day', '5Min'), 78)
+
+    def test_broker_builds_from_base(self):
+        with FakeAlpacaServer(universe_size=3, as_of='2020-06-30') as server:
+            broker = Broker(server.rest())
+            frames = broker.get_assets_multi_df(['S00000', 'S00001'], ['minute', '5Min', '15Min'], limit=20)
+            self.assertEqual(server.stats()['requests']['_bars'], 1)
+            minutes = broker.get_asset_df('S00000', 'minute', limit=300)
+            expected = minutes.resample('15min').agg(AGG).iloc[-20:]
+            self.assertEqual(len(frames['15Min']['S00000']), 20)
+            self.assertTrue(np.allclose(frames['15Min']['S00000'].values, expected.values))
+            self.assertEqual(len(frames['minute']['S00001']), 20)
+
+            res = broker.get_asset_df('S00000', '5Min', limit=10, base='minute')
+            self.assertTrue(res.equals(frames['5Min']['S00000'].iloc[-10:]))
+
+            with self.assertRaises(BrokerValidationException):
+                broker.get_assets_multi_df(['S00000'], ['5Min'], base='15Min')
+
+    def test_broker_pages_base_back(self):
+        with FakeAlpacaServer(universe_size=3, as_of='2020-06-30') as server:
+            broker = Broker(server.rest())
+            # 5 sessions of minutes take two requests of at most BARSET_MAX_LIMIT bars
+            frames = broker.get_assets_multi_df(['S00000', 'S00001'], ['minute', 'day'], limit=5, base='minute')
+            self.assertEqual(server.stats()['requests']['_bars'], 2)
+            self.assertEqual(len(frames['day']['S00000']), 5)
+            self.assertEqual(len(frames['day']['S00001']), 5)
+
+            minutes = broker.get_assets_multi_df(['S00000'], ['minute'], limit=1500)['minute']['S00000']
+            self.assertEqual(len(minutes), 1500)
+            self.assertTrue(minutes.index.is_monotonic_increasing and minutes.index.is_unique)
+            self.assertTrue(minutes.iloc[-1000:].equals(broker.get_asset_df('S00000', 'minute', limit=1000)))
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from broker.rolling_bars import RollingBars
+from broker import BrokerValidationException
+from unittest import TestCase
+import pandas as pd
+
+MINUTE_NS = 60 * 10 ** 9
+
+
+class TestRollingBars(TestCase):
+
+    def setUp(self):
+        self.start = pd.Timestamp('2020-06-01 09:30', tz='America/New_York').value
+
+    def test_invalid_window(self):
+        with self.assertRaises(BrokerValidationException):
+            RollingBars(0)
+        with self.assertRaises(BrokerValidationException):
+            RollingBars(10, period='fortnight')
+
+    def test_window_rolls(self):
+        window = RollingBars(3)
+        for i in range(5):
+            window.push(self.start + i * MINUTE_NS, i, i + 1, i - 1, i + .5, 100)
+
+        df = window.df()
+        self.assertEqual(len(window), 3)
+        self.assertListEqual(df['open'].tolist(), [2, 3, 4])
+        self.assertEqual(df.index[0], pd.Timestamp('2020-06-01 09:32', tz='America/New_York'))
+        self.assertEqual(window.last_time, pd.Timestamp('2020-06-01 09:34', tz='America/New_York'))
+
+    def test_updates_merge_into_bar(self):
+        window = RollingBars(5, period='5Min')
+        window.push(self.start, 10, 11, 9, 10.5, 100)
+        window.push(self.start + MINUTE_NS, 10.5, 12, 10, 11.5, 50)
+        window.push(self.start + 2 * MINUTE_NS, 11.5, 11.5, 8, 9, 25)
+        # late update for an earlier bar is dropped
+        window.push(self.start - 10 * MINUTE_NS, 1, 1, 1, 1, 1)
+
+        row = window.df().iloc[-1]
+        self.assertEqual(len(window), 1)
+        self.assertListEqual(row.tolist(), [10, 12, 8, 9, 175])
+
+    def test_minutes_build_day_bar(self):
+        window = RollingBars(5, period='day')
+        seed = pd.DataFrame(
+            [[1, 2, .5, 1.5, 1000]],
+            index=pd.DatetimeIndex([pd.Timestamp('2020-05-29', tz='America/New_York')]),
+            columns=['open', 'high', 'low', 'close', 'volume'])
+        window.seed(seed)
+        window.push(self.start, 2, 3, 1.5, 2.5, 10)
+        window.push(self.start + MINUTE_NS, 2.5, 4, 2, 3.5, 20)
+
+        df = window.df()
+        self.assertEqual(len(df), 2)
+        self.assertEqual(df.index[-1], pd.Timestamp('2020-06-01', tz='America/New_York'))
+        self.assertListEqual(df.iloc[-1].tolist(), [2, 4, 1.5, 3.5, 30])
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from broker.scheduler import RequestScheduler, PRIORITY_ORDER, PRIORITY_ACCOUNT, PRIORITY_DATA
+from broker import BrokerValidationException
+from unittest import TestCase
+import threading
+import time
+
+
+class TestRequestScheduler(TestCase):
+
+    def test_burst_then_rate(self):
+        scheduler = RequestScheduler(capacity=5, rate=50)
+        started = time.monotonic()
+        for _ in range(10):
+            scheduler.acquire()
+        elapsed = time.monotonic() - started
+        # five calls come out of the burst, the other five wait for tokens at 50 per second
+        self.assertGreaterEqual(elapsed, 5 / 50. * .9)
+        self.assertLess(elapsed, 1.)
+        self.assertEqual(scheduler.metrics()['requests'][PRIORITY_DATA], 10)
+
+    def test_orders_preempt_data(self):
+        scheduler = RequestScheduler(capacity=1, rate=20)
+        scheduler.acquire()
+        served = []
+
+        def worker(priority, name):
+            scheduler.acquire(priority=priority)
+            served.append(name)
+
+        threads = [threading.Thread(target=worker, args=(PRIORITY_DATA, 'data{}'.format(i))) for i in range(3)]
+        for thread in threads:
+            thread.start()
+        while scheduler.queue_depth < 3:
+            time.sleep(.001)
+
+        order = threading.Thread(target=worker, args=(PRIORITY_ORDER, 'order'))
+        order.start()
+        threads.append(order)
+        for thread in threads:
+            thread.join()
+        # the order arrived last, but only the data call already holding the head of the queue can beat it
+        self.assertLessEqual(served.index('order'), 1)
+
+    def test_metrics(self):
+        scheduler = RequestScheduler.alpaca()
+        scheduler.call(lambda: None, priority=PRIORITY_ACCOUNT)
+        res = scheduler.metrics()
+        self.assertEqual(res['queue_depth'], 0)
+        self.assertEqual(res['requests'][PRIORITY_ACCOUNT], 1)
+        self.assertIn(PRIORITY_ORDER, res['max_wait'])
+
+    def test_call(self):
+        scheduler = RequestScheduler.kraken()
+        self.assertEqual(scheduler.call(lambda a, b=0: a + b, 1, b=2), 3)
+
+    def test_validation(self):
+        with self.assertRaises(BrokerValidationException):
+            RequestScheduler(capacity=0, rate=1)
+        with self.assertRaises(BrokerValidationException):
+            RequestScheduler.kraken_public().acquire(cost=2)
+        with self.assertRaises(BrokerValidationException):
+            RequestScheduler.alpaca().acquire(priority=7)
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from test_async_broker import SlowBarsAPI
+from broker.single_flight import SingleFlight
+from broker.broker import Broker
+from broker.bar_cache import BarCache
+from unittest import TestCase
+import threading
+import time
+
+
+def run_together(target, count):
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+class TestSingleFlight(TestCase):
+
+    def test_concurrent_calls_share_one(self):
+        flight = SingleFlight()
+        calls = []
+        results = []
+
+        def slow(value):
+            calls.append(value)
+            time.sleep(.05)
+            return {'value': value}
+
+        run_together(lambda: results.append(flight.do('key', slow, 1)), 8)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 8)
+        self.assertTrue(all(res is results[0] for res in results))
+        self.assertEqual(flight.shared, 7)
+
+    def test_sequential_calls_are_not_cached(self):
+        flight = SingleFlight()
+        calls = []
+        flight.do('key', calls.append, 1)
+        flight.do('key', calls.append, 2)
+        self.assertListEqual(calls, [1, 2])
+
+    def test_errors_reach_every_caller(self):
+        flight = SingleFlight()
+        errors = []
+
+        def fail():
+            time.sleep(.05)
+            raise ValueError('nope')
+
+        def call():
+            try:
+                flight.do('key', fail)
+            except ValueError as error:
+                errors.append(error)
+
+        run_together(call, 4)
+        self.assertEqual(len(errors), 4)
+
+    def test_key(self):
+        self.assertEqual(SingleFlight.key(['AAPL', 'MSFT'], limit=5), SingleFlight.key(['AAPL', 'MSFT'], limit=5))
+        self.assertNotEqual(SingleFlight.key(['AAPL'], limit=5), SingleFlight.key(['AAPL'], limit=6))
+
+    def test_broker_coalesces_reads(self):
+        api = SlowBarsAPI()
+        broker = Broker(api, bar_cache=BarCache(max_bytes=0))
+        run_together(lambda: broker.get_asset_df('SPY', 'day', limit=10), 6)
+        self.assertEqual(len(api.calls), 1)
+        self.assertEqual(broker.single_flight.shared, 5)
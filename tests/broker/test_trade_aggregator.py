@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from broker.krak_dealer import KrakDealer, TradeAggregator, TRADE_BAR_COLUMNS
+from broker.scheduler import RequestScheduler
+from broker.bar_store import BarStore
+from broker import BrokerValidationException
+from test_krak_ohlc import FakeKrakenAPI
+from unittest import TestCase
+import pandas as pd
+import numpy as np
+import tempfile
+import shutil
+
+
+def expected_bars(t, price, volume, interval):
+    trades = pd.DataFrame({'price': price, 'volume': volume, 'notional': price * volume},
+                          index=pd.to_datetime((t * 10 ** 9).astype('int64'), utc=True))
+    rule = '{}s'.format(interval)
+    grouped = trades.resample(rule)
+    df = grouped['price'].ohlc()
+    df['volume'] = grouped['volume'].sum()
+    df['vwap'] = grouped['notional'].sum() / df['volume']
+    df['count'] = grouped['price'].count()
+    return df[df['count'] > 0][TRADE_BAR_COLUMNS]
+
+
+class TestTradeAggregator(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.api = FakeKrakenAPI(now=1577836800 + 5 * 3600)
+        self.dealer = KrakDealer(self.api, 'XXBTZUSD', public_scheduler=RequestScheduler(1000, 1000))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def assertBars(self, bars, t, price, volume, interval):
+        expected = expected_bars(t, price, volume, interval)
+        self.assertTrue(bars.index.equals(expected.index))
+        self.assertTrue(np.allclose(bars.values.astype('float64'), expected.values.astype('float64')))
+
+    def test_aggregate_matches_pandas(self):
+        t, price, volume = self.api.trades()
+        ns = (t * 10 ** 9).astype('int64')
+        for interval in (1, 10, 60, 3600, 86400):
+            self.assertBars(TradeAggregator.aggregate(ns, price, volume, interval), t, price, volume, interval)
+        self.assertTrue(TradeAggregator.aggregate(ns[:0], price[:0], volume[:0], 60).empty)
+
+    def test_incremental(self):
+        bars = self.dealer.get_trade_bars('XXBTZUSD', intervals=(15, 60))
+        t, price, volume = self.api.trades()
+        first = t[-1000]
+        self.assertBars(bars[60], t[-1000:], price[-1000:], volume[-1000:], 60)
+
+        # land in the middle of the newest bar, which has to be merged rather than appended
+        self.api.now += 95
+        bars = self.dealer.get_trade_bars('XXBTZUSD', intervals=(15, 60))
+        self.assertEqual(self.api.calls[-1][0], 'get_recent_trades')
+        self.assertIsNotNone(self.api.calls[-1][2])
+        t, price, volume = self.api.trades()
+        keep = t >= first
+        for interval in (15, 60):
+            self.assertBars(bars[interval], t[keep], price[keep], volume[keep], interval)
+
+    def test_persists_and_pages(self):
+        store = BarStore(self.root)
+        TradeAggregator(self.dealer, 'XXBTZUSD', intervals=(30, 86400), bar_store=store).update()
+        first = self.api.trades()[0][-1000]
+
+        # more than a page of trades while nothing was running
+        self.api.now += 2 * 3600
+        self.api.calls = []
+        bars = TradeAggregator(self.dealer, 'XXBTZUSD', intervals=(30, 86400), bar_store=store).update()
+        self.assertEqual(len(self.api.calls), 2)
+        t, price, volume = self.api.trades()
+        keep = t >= first
+        for interval in (30, 86400):
+            self.assertBars(bars[interval], t[keep], price[keep], volume[keep], interval)
+            df, meta = store.read('XXBTZUSD', TradeAggregator.period(interval))
+            self.assertTrue(np.allclose(df.values.astype('float64'), bars[interval].values.astype('float64')))
+            self.assertEqual(meta['last'], int(t[-1] * 10 ** 9))
+
+    def test_nothing_new(self):
+        aggregator = TradeAggregator(self.dealer, 'XXBTZUSD', intervals=(60,))
+        before = aggregator.update()[60]
+        after = aggregator.update()[60]
+        self.assertTrue(after.equals(before))
+
+    def test_bounded(self):
+        store = BarStore(self.root)
+        writes = []
+        write = store.write
+        store.write = lambda *args: writes.append(args[1]) or write(*args)
+        aggregator = TradeAggregator(self.dealer, 'XXBTZUSD', intervals=(60,), bar_store=store, max_bars=10)
+        bars = aggregator.update()[60]
+        t, price, volume = self.api.trades()
+        expected = expected_bars(t[-1000:], price[-1000:], volume[-1000:], 60).iloc[-10:]
+        self.assertTrue(bars.index.equals(expected.index))
+        self.assertTrue(np.allclose(bars.values.astype('float64'), expected.values.astype('float64')))
+        self.assertEqual(len(store.read('XXBTZUSD', '60S')[0]), 10)
+
+        # no new trades, nothing to write
+        aggregator.update()
+        self.assertEqual(writes, ['60S'])
+
+        self.api.now += 120
+        self.assertEqual(len(aggregator.update()[60]), 10)
+        self.assertEqual(writes, ['60S', '60S'])
+        with self.assertRaises(BrokerValidationException):
+            TradeAggregator(self.dealer, 'XXBTZUSD', max_bars=0)
+
+    def test_invalid_interval(self):
+        with self.assertRaises(BrokerValidationException):
+            TradeAggregator(self.dealer, 'XXBTZUSD', intervals=(0,))
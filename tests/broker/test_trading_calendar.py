@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from testing.fake_alpaca import FakeAlpacaServer
+from broker.trading_calendar import TradingCalendar
+from broker.broker import Broker
+from alpaca_trade_api.entity import Calendar
+from unittest import TestCase
+import pandas as pd
+
+
+def ny(value):
+    return pd.Timestamp(value, tz='America/New_York')
+
+
+class TestTradingCalendar(TestCase):
+
+    def setUp(self):
+        # the day after thanksgiving closes early, thanksgiving is a holiday
+        self.calendar = TradingCalendar.from_calendar([
+            Calendar({'date': '2020-11-25', 'open': '09:30', 'close': '16:00'}),
+            Calendar({'date': '2020-11-27', 'open': '09:30', 'close': '13:00'}),
+            Calendar({'date': '2020-11-30', 'open': '09:30', 'close': '16:00'}),
+        ])
+
+    def test_is_open(self):
+        self.assertTrue(self.calendar.is_open(ny('2020-11-25 09:30')))
+        self.assertFalse(self.calendar.is_open(ny('2020-11-25 16:00')))
+        self.assertFalse(self.calendar.is_open(ny('2020-11-26 12:00')))
+        self.assertFalse(self.calendar.is_open(ny('2020-11-27 14:00')))
+        self.assertTrue(self.calendar.is_open('2020-11-30T10:00:00-05:00'))
+
+    def test_next_and_previous(self):
+        self.assertEqual(self.calendar.next_close(ny('2020-11-27 10:00')), ny('2020-11-27 13:00'))
+        self.assertEqual(self.calendar.next_open(ny('2020-11-25 17:00')), ny('2020-11-27 09:30'))
+        self.assertEqual(self.calendar.previous_open(ny('2020-11-27 10:00')), ny('2020-11-27 09:30'))
+        self.assertIsNone(self.calendar.next_open(ny('2020-11-30 10:00')))
+
+    def test_sessions(self):
+        sessions = self.calendar.sessions('2020-11-26', '2020-11-30')
+        self.assertListEqual(list(sessions), [ny('2020-11-27'), ny('2020-11-30')])
+        self.assertEqual(self.calendar.sessions_between(ny('2020-11-25'), ny('2020-11-30 15:00')), 2)
+        self.assertEqual(self.calendar.sessions_between(ny('2020-11-27'), ny('2020-11-27 15:00')), 0)
+
+    def test_broker_requests_once(self):
+        with FakeAlpacaServer(universe_size=1, days=2000) as server:
+            broker = Broker(server.rest())
+            first = broker.get_trading_calendar()
+            second = broker.get_trading_calendar(start=pd.Timestamp.now(tz='UTC') - pd.Timedelta(days=365))
+            self.assertIs(first, second)
+            self.assertEqual(server.stats()['requests']['_calendar'], 1)
+            self.assertTrue(first.is_open() is broker.get_clock().is_open)
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from src.asset_selector import AssetSelector
+from broker.market_data import MarketDataProvider, quotes_df
+from argparse import Namespace
+from unittest import TestCase, mock
+import pandas as pd
+import numpy as np
+
+
+class FakePairsProvider(MarketDataProvider):
+    """Daily bars up to end for a few crypto pairs, each around its own price."""
+
+    def __init__(self, prices: dict):
+        self.prices = prices
+        self.pairs = list(prices)
+
+    def _bars_for(self, symbols: list, period: str, limit: int, start: str, end: str) -> dict:
+        last = pd.Timestamp(end).tz_convert('UTC') if end is not None else pd.Timestamp.now(tz='UTC')
+        index = pd.date_range(end=last.normalize(), periods=min(limit, 100), freq='D')
+        frames = dict()
+        for symbol in symbols:
+            close = self.prices[symbol] * (1 + np.linspace(0, .05, len(index)))
+            frames[symbol] = pd.DataFrame({'open': close, 'high': close * 1.01, 'low': close * .99, 'close': close,
+                                           'volume': np.full(len(index), 10.)}, index=index)
+        return frames
+
+    def latest_quotes(self, symbols: list) -> pd.DataFrame:
+        return quotes_df(symbols, {})
+
+
+def cli_args(**kwargs) -> Namespace:
+    args = dict(backtest=True, testperiods=30, crypto=True, forex=False, period='day', base=None, max=None, min=None,
+                algorithm='bullish_hold', poolsize=5, liquidity=None, workers=None)
+    args.update(kwargs)
+    return Namespace(**args)
+
+
+class TestAssetSelectorPairs(TestCase):
+
+    # every pair has a signal, so what gets picked is down to the screen's filters alone
+    @mock.patch('src.asset_selector.any_signal', lambda frames, side: [True] * len(frames))
+    @mock.patch('src.asset_selector.SentimentAnalysis')
+    def test_pairs_above_the_stock_band(self, _):
+        provider = FakePairsProvider({'XXBTZUSD': 30000., 'XETHZUSD': 2000., 'XXRPZUSD': .5})
+        selector = AssetSelector(provider, cli_args=cli_args())
+        self.assertEqual(selector.asset_class, 'crypto')
+        self.assertEqual(selector.max_stock_price, 50)
+        self.assertListEqual([asset.symbol for asset in selector.portfolio], ['XXBTZUSD', 'XETHZUSD', 'XXRPZUSD'])
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from src.screener import Screener, ScreenerValidationException, latest_bars, prefilter_mask
+from testing.fake_alpaca import FakeAlpacaServer
+from broker.broker import Broker
+from alpaca_trade_api.entity import Asset
+from unittest import TestCase
+import pandas as pd
+import numpy as np
+import threading
+import time
+
+
+def evaluate(df: pd.DataFrame, side: str) -> bool:
+    # even closes are buys, odd ones sells
+    return (int(df['close'].iloc[-1]) % 2 == 0) == (side == 'buy')
+
+
+def evaluate_batch(frames: dict, side: str) -> list:
+    return [evaluate(df, side) for df in frames.values()]
+
+
+class TestScreener(TestCase):
+
+    def setUp(self):
+        self.assets = [Asset({'symbol': 'S{:03d}'.format(i)}) for i in range(100)]
+        self.fetched = []
+        self.lock = threading.Lock()
+
+    def fetch(self, symbols: list) -> dict:
+        with self.lock:
+            self.fetched.append(symbols)
+        time.sleep(.05)
+        return {symbol: pd.DataFrame({'close': [float(symbol[1:])]}) for symbol in symbols}
+
+    @staticmethod
+    def keep(df: pd.DataFrame) -> bool:
+        return df['close'].iloc[-1] >= 10
+
+    def test_serial(self):
+        picks = Screener(batch_size=10).screen(self.assets, self.fetch, self.keep, evaluate, 'buy', 3)
+        self.assertListEqual([asset.symbol for asset in picks], ['S010', 'S012', 'S014'])
+        self.assertEqual(len(self.fetched), 2)
+
+    def test_parallel(self):
+        # enough batches to outlast the signal processes starting up
+        assets = [Asset({'symbol': 'S{:04d}'.format(i)}) for i in range(5000)]
+        screener = Screener(workers=4, processes=2, batch_size=10)
+        picks = screener.screen(assets, self.fetch, self.keep, evaluate, 'sell', 5)
+        self.assertEqual(len(picks), 5)
+        for asset in picks:
+            self.assertTrue(evaluate(pd.DataFrame({'close': [float(asset.symbol[1:])]}), 'sell'))
+            self.assertGreaterEqual(int(asset.symbol[1:]), 10)
+        # the batches still queued when the pool filled were never fetched
+        self.assertLess(len(self.fetched), 500)
+        self.assertGreater(screener.cancelled, 0)
+
+    def test_parallel_short_of_poolsize(self):
+        picks = Screener(workers=4, processes=2, batch_size=10).screen(
+            self.assets, self.fetch, self.keep, evaluate, 'buy', 100)
+        self.assertEqual(sorted(asset.symbol for asset in picks), ['S{:03d}'.format(i) for i in range(10, 100, 2)])
+
+    def test_batch(self):
+        picks = Screener(batch_size=10).screen(self.assets, self.fetch, self.keep, evaluate_batch, 'buy', 3, batch=True)
+        self.assertListEqual([asset.symbol for asset in picks], ['S010', 'S012', 'S014'])
+        self.assertEqual(len(self.fetched), 2)
+
+        picks = Screener(workers=4, processes=2, batch_size=10).screen(
+            self.assets, self.fetch, self.keep, evaluate_batch, 'buy', 100, batch=True)
+        self.assertEqual(sorted(asset.symbol for asset in picks), ['S{:03d}'.format(i) for i in range(10, 100, 2)])
+
+    def test_validation(self):
+        self.assertRaises(ScreenerValidationException, Screener, workers=0)
+        self.assertRaises(ScreenerValidationException, Screener, processes=0)
+
+
+class TestPrefilter(TestCase):
+
+    def frame(self, day: str, close: float, volume: float) -> pd.DataFrame:
+        return pd.DataFrame({'close': [close], 'volume': [volume]},
+                            index=pd.DatetimeIndex([day]).tz_localize('America/New_York'))
+
+    def test_mask(self):
+        frames = {
+            'FRESH':    self.frame('2020-06-29', 10., 1e6),
+            'PRICEY':   self.frame('2020-06-29', 100., 1e6),
+            'CHEAP':    self.frame('2020-06-29', .5, 1e6),
+            'STALE':    self.frame('2020-06-19', 10., 1e6),
+            'THIN':     self.frame('2020-06-29', 10., 10.),
+        }
+        symbols = list(frames) + ['MISSING']
+        latest = latest_bars(symbols, frames)
+        self.assertTrue(np.isnan(latest.loc['MISSING', 'close']))
+        mask = prefilter_mask(latest, '2020-06-30T00:00:00-04:00', 1, 50, min_dollar_volume=1000.)
+        self.assertListEqual(latest.index[mask].tolist(), ['FRESH'])
+
+    def test_bulk_last_bars(self):
+        with FakeAlpacaServer(universe_size=500, days=30, as_of='2020-06-30') as server:
+            broker = Broker(server.rest())
+            symbols = [asset.symbol for asset in broker.get_assets()]
+            latest = latest_bars(symbols, broker.bars_for(symbols, 'day', limit=1, end='2020-06-30'))
+            # one small request per BARSET_MAX_SYMBOLS symbols
+            self.assertEqual(server.stats()['requests']['_bars'], 3)
+
+        self.assertFalse(latest['close'].isna().any())
+        mask = prefilter_mask(latest, '2020-06-30', 10, 50)
+        self.assertGreater(mask.sum(), 0)
+        self.assertLess(mask.sum(), len(symbols))
+        self.assertTrue(((latest['close'][mask] >= 10) & (latest['close'][mask] <= 50)).all())
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from src import signal_engine as engine
+from src.signal_engine import SignalEngineException, SIGNALS
+from py_trade_signal.macd import MacdSignal
+from py_trade_signal.mfi import MfiSignal
+from py_trade_signal.vzo import VzoSignal
+from broker.bars import compact
+from unittest import TestCase
+from finta import TA
+import pandas as pd
+import numpy as np
+
+
+def random_walk(length: int, seed: int) -> pd.DataFrame:
+    rng = np.random.RandomState(seed)
+    close = np.round(20 * np.exp(np.cumsum(rng.normal(0, .02, length))), 2)
+    return pd.DataFrame({
+        'open':     close,
+        'high':     close * (1 + rng.uniform(0, .02, length)),
+        'low':      close * (1 - rng.uniform(0, .02, length)),
+        'close':    close,
+        'volume':   rng.randint(1000, 100000, length).astype('float64'),
+    }, index=pd.date_range('2020-01-01', periods=length, tz='America/New_York'))
+
+
+class TestBuildingBlocks(TestCase):
+
+    def setUp(self):
+        self.x = np.random.RandomState(0).normal(size=(3, 50))
+        self.x[1, :10] = np.nan
+        self.x[2, 20] = np.nan
+
+    def test_ewm_mean(self):
+        for span in (9, 60):
+            expected = np.vstack([pd.Series(row).ewm(span=span).mean().values for row in self.x])
+            np.testing.assert_allclose(engine.ewm_mean(self.x, span=span), expected, rtol=1e-12)
+
+    def test_rolling_sum(self):
+        expected = np.vstack([pd.Series(row).rolling(14).sum().values for row in self.x])
+        np.testing.assert_allclose(engine.rolling_sum(self.x, 14), expected, rtol=1e-12)
+        self.assertTrue(np.isnan(engine.rolling_sum(self.x[:, :10], 14)).all())
+
+
+class TestSignalEngine(TestCase):
+
+    def setUp(self):
+        self.frames = {'S{}'.format(seed): random_walk(length, seed) for seed, length in enumerate([120, 100, 80, 150])}
+        self.symbols, self.bars = engine.stack(self.frames)
+
+    def assertMatches(self, ours: np.ndarray, indicator):
+        # shorter histories sit at the end of their row, NaN in front
+        for i, symbol in enumerate(self.symbols):
+            expected = np.asarray(indicator(self.frames[symbol].copy()), dtype='float64')
+            self.assertTrue(np.isnan(ours[i, :ours.shape[1] - len(expected)]).all())
+            np.testing.assert_allclose(ours[i, -len(expected):], expected, rtol=1e-9, atol=1e-9)
+
+    def test_indicators_match_finta(self):
+        b = self.bars
+        line, signal = engine.macd(b['close'])
+        self.assertMatches(line, lambda df: TA.MACD(df)['MACD'])
+        self.assertMatches(signal, lambda df: TA.MACD(df)['SIGNAL'])
+        self.assertMatches(engine.mfi(b['high'], b['low'], b['close'], b['volume']), TA.MFI)
+        self.assertMatches(engine.obv(b['close'], b['volume']), TA.OBV)
+        self.assertMatches(engine.rsi(b['close']), TA.RSI)
+        self.assertMatches(engine.vzo(b['close'], b['volume']), TA.VZO)
+        plus, minus = engine.dmi(b['high'], b['low'], b['close'])
+        self.assertMatches(plus, lambda df: TA.DMI(df)['DI+'])
+        self.assertMatches(minus, lambda df: TA.DMI(df)['DI-'])
+        self.assertMatches(engine.adx(plus, minus), TA.ADX)
+        self.assertMatches(engine.ema(b['close'], 60), lambda df: TA.EMA(df, 60))
+
+    def test_decisions_match_py_trade_signal(self):
+        # every prefix of a walk is a symbol of its own, so the signals get to fire
+        frames = dict()
+        for seed in range(2):
+            df = random_walk(160, seed)
+            for length in range(70, 160):
+                frames['{}:{}'.format(seed, length)] = df.iloc[:length]
+        decisions = {side: engine.signal_frame(frames, side) for side in ('buy', 'sell')}
+        self.assertGreater(decisions['buy']['macd'].sum(), 0)
+
+        checks = [('macd', 'buy', MacdSignal.buy), ('mfi', 'buy', MfiSignal.buy), ('mfi', 'sell', MfiSignal.sell),
+                  ('vzo', 'buy', VzoSignal.buy), ('vzo', 'sell', VzoSignal.sell)]
+        for symbol, df in frames.items():
+            for signal, side, decide in checks:
+                try:
+                    expected = bool(decide(df.copy()))
+                except ValueError:
+                    # VzoSignal tests a whole DMI series for truth when the ADX does not confirm the trend
+                    continue
+                self.assertEqual(bool(decisions[side].loc[symbol, signal]), expected, (symbol, signal, side))
+
+    def test_mfi_leaving_oversold(self):
+        close = np.concatenate([np.linspace(40, 20, 30), [20.5, 21.]])
+        volume = np.concatenate([np.full(30, 1000.), [1000., 1e6]])
+        df = pd.DataFrame({'open': close, 'high': close + .1, 'low': close - .1, 'close': close, 'volume': volume})
+        self.assertTrue(MfiSignal.buy(df.copy()))
+        self.assertTrue(engine.signal_frame({'AAA': df}, 'buy').loc['AAA', 'mfi'])
+
+    def test_any_signal(self):
+        frames = dict(self.frames)
+        frames['SHORT'] = random_walk(3, 9)
+        # compact frames give the same decisions as full precision ones
+        frames['COMPACT'] = compact(frames['S0'])
+        symbols = list(frames) + ['MISSING']
+        for side in ('buy', 'sell'):
+            table = engine.signal_frame(frames, side, symbols=symbols)
+            self.assertListEqual(table.columns.tolist(), list(SIGNALS))
+            np.testing.assert_array_equal(engine.any_signal(frames, side, symbols=symbols), table.any(axis=1).values)
+            self.assertFalse(table.loc[['SHORT', 'MISSING']].values.any())
+            self.assertListEqual(table.loc['COMPACT'].tolist(), table.loc['S0'].tolist())
+
+    def test_validation(self):
+        self.assertRaises(SignalEngineException, engine.signals, self.bars, 'hold')
@@ -213,6 +213,10 @@ def parse_args():
         type=str,
         required=False,
         help='A period of time between candlestick bars, choices supported by Alpaca API are:  ')
+    parser.add_argument('-B', '--base',
+        type=str,
+        required=False,
+        help='A finer period to request bars in and build --period bars from locally, e.g. -p 15Min -B minute')
     parser.add_argument('-r', '--risk_pct',
         type=float,
         required=False,
@@ -225,4 +229,32 @@ def parse_args():
         type=int,
         required=False,
         help='Number of stocks we want in our pool to choose from.')
+    parser.add_argument('-D', '--datadir',
+        type=str,
+        required=False,
+        help='Directory to keep a local bar store in. Bars are only fetched from the API when missing locally.')
+    parser.add_argument('-M', '--compact',
+        required=False,
+        action='store_true',
+        help='Hold bars in memory as float32 prices and uint32 volumes, half the memory for sub-cent price errors.')
+    parser.add_argument('-S', '--stream',
+        required=False,
+        action='store_true',
+        help='In live mode, keep rolling bar windows up to date from the market data stream instead of polling for bars.')
+    parser.add_argument('-T', '--deadline',
+        type=float,
+        required=False,
+        help='Seconds to wait for a data request before giving up on it.')
+    parser.add_argument('-H', '--hedge',
+        required=False,
+        action='store_true',
+        help='Send a data request again when it is slower than 95%% of recent ones, and use the first answer.')
+    parser.add_argument('-L', '--liquidity',
+        type=float,
+        required=False,
+        help='Least dollar volume of an asset\'s last daily bar for it to be screened.')
+    parser.add_argument('-w', '--workers',
+        type=int,
+        required=False,
+        help='Screen assets with this many threads fetching bars and as many processes evaluating signals.')
     return parser.parse_args()